@@ -1,14 +1,14 @@
+import time
 from typing import List, Dict
 
 from .config import settings
-from .cache import load_chunks, build_or_load_chunk_vectors
+from .cache import load_chunks, build_or_load_chunk_vectors, build_or_load_lexical
 from .retrieve import top_k_retrieve
-from .prompt import build_prompt
-from .llm import chat
-from .eval import evaluate, log_metrics, is_vague_query
-
-def threshold_for(query: str) -> float:
-    return settings.confident_score_vague if is_vague_query(query) else settings.confident_score
+from .prompt import build_prompt, fit_history
+from .llm import chat_stream
+from .eval import evaluate, log_metrics, threshold_for, is_confident
+from .clients import close_clients
+from .tracing import start_trace
 
 def main():
     print("NVIDIA RAG Agent (type 'exit' to quit)\n")
@@ -17,6 +17,7 @@ def main():
     _ = build_or_load_chunk_vectors(chunks)
     
     chunk_vecs = build_or_load_chunk_vectors(chunks)
+    lexical = build_or_load_lexical(chunks)
     
     chat_history: List[Dict[str, str]] = [] # list of {"role":..., "content":...}
     
@@ -28,16 +29,16 @@ def main():
             print("Bye!")
             break
         
-        retrieved = top_k_retrieve(query, chunks, chunk_vecs, k=settings.top_k)
+        trace = start_trace()  # stage timings + token usage for this turn's metrics record
+        retrieved = top_k_retrieve(query, chunks, chunk_vecs, k=settings.top_k, lexical=lexical)
         
         print("\n=== TOP RESULTS (retrieval) ===")
         for r in retrieved:
             print(f"-[{r['doc_id']}#{r['chunk_id']}] score={r['score']: .3f}")
         
         thr = threshold_for(query)
-        top_score = retrieved[0]['score'] if retrieved else 0.0
         # Clarify if retrieval weak
-        if not retrieved or top_score < thr:
+        if not is_confident(query, retrieved):
             msg = (
                 "I’m not confident I found the right information.\n"
                 "Please clarify (e.g., name, topic, or what exactly you want), or rephrase your question."
@@ -52,7 +53,7 @@ def main():
         
         prompt = build_prompt(query, retrieved)
         
-        memory = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in chat_history[-6:]])
+        memory = "\n".join([f"{m['role'].capitalize()}: {m['content']}" for m in fit_history(chat_history[-6:])])
         final_prompt = f"""
         Conversation context (for resolving references like he/his/that):
         {memory}
@@ -61,12 +62,26 @@ def main():
         """.strip()
 
         
-        answer = chat(final_prompt)
-        
+        # Stream tokens to the terminal as they arrive.
         print("\nAssistant:")
-        print(answer)
+        t0 = time.perf_counter()
+        ttft_ms = None
+        parts: List[str] = []
+        usage: Dict[str, int] = {}
+        for delta in chat_stream(final_prompt, usage):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000
+            parts.append(delta)
+            print(delta, end="", flush=True)
+        print()
+        answer = "".join(parts) or "ERROR: Empty model response."
+        total_ms = (time.perf_counter() - t0) * 1000
+        if trace is not None:
+            trace.add("chat", total_ms)
+            trace.add_usage(usage)
         
         metrics = evaluate(query, retrieved, answer=answer, threshold_used=thr)
+        metrics.update({"stream": True, "ttft_ms": ttft_ms, "total_ms": total_ms})
         out = log_metrics(settings.metrics_dir, metrics)
         print(f"(metrics saved to {out})")
 
@@ -74,4 +89,7 @@ def main():
         chat_history.append({"role": "assistant", "content": answer})
         
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        close_clients()
\ No newline at end of file
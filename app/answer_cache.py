@@ -0,0 +1,166 @@
+import itertools
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .index import normalize_rows
+
+
+@dataclass
+class CachedAnswer:
+    scope: str
+    query: str
+    query_vec: np.ndarray  # unit-normalized, shape (D,)
+    answer: str
+    top_sources: List[Dict[str, Any]]
+    top_score: float
+    nbytes: int = field(default=0)
+
+
+class _ScopeVectors:
+    """
+    One scope's query vectors as rows of a preallocated matrix (grown by
+    doubling), so a lookup is one matmul instead of a fresh np.stack. Removal
+    moves the last row into the freed slot.
+    """
+
+    def __init__(self, dim: int, capacity: int = 16):
+        self.matrix = np.empty((capacity, dim), dtype=np.float32)
+        self.ids: List[int] = []        # row -> entry id
+        self.rows: Dict[int, int] = {}  # entry id -> row
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, entry_id: int, vec: np.ndarray) -> None:
+        n = len(self.ids)
+        if n == len(self.matrix):
+            grown = np.empty((2 * n, self.matrix.shape[1]), dtype=np.float32)
+            grown[:n] = self.matrix
+            self.matrix = grown
+        self.matrix[n] = vec
+        self.ids.append(entry_id)
+        self.rows[entry_id] = n
+
+    def remove(self, entry_id: int) -> None:
+        row = self.rows.pop(entry_id)
+        last_id = self.ids.pop()
+        if last_id != entry_id:
+            self.matrix[row] = self.matrix[len(self.ids)]
+            self.ids[row] = last_id
+            self.rows[last_id] = row
+
+    def best(self, q: np.ndarray) -> Tuple[int, float]:
+        sims = self.matrix[: len(self.ids)] @ q
+        row = int(np.argmax(sims))
+        return self.ids[row], float(sims[row])
+
+
+class AnswerCache:
+    """
+    Semantic answer cache. A new query reuses a previous answer from the same
+    scope (session + index fingerprint + k) when the cosine similarity of the
+    query embeddings is >= threshold. Entries are evicted LRU once their
+    approximate size exceeds max_bytes.
+    """
+
+    def __init__(self, threshold: float = 0.95, max_bytes: int = 32 * 2**20):
+        self.threshold = threshold
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_scope: Dict[str, _ScopeVectors] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def lookup(self, scope: str, query_vec: np.ndarray) -> Optional[CachedAnswer]:
+        q = normalize_rows(query_vec)[0]
+        with self._lock:
+            vectors = self._by_scope.get(scope)
+            if not vectors:
+                self.misses += 1
+                return None
+            entry_id, sim = vectors.best(q)
+            if sim < self.threshold:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return self._entries[entry_id]
+
+    def put(
+        self,
+        scope: str,
+        query: str,
+        query_vec: np.ndarray,
+        answer: str,
+        top_sources: List[Dict[str, Any]],
+        top_score: float,
+    ) -> None:
+        vec = normalize_rows(query_vec)[0]
+        nbytes = vec.nbytes + len(query) + len(answer) + len(json.dumps(top_sources)) + 200  # + object overhead
+        entry = CachedAnswer(scope, query, vec, answer, top_sources, top_score, nbytes)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            vectors = self._by_scope.get(scope)
+            if vectors is None:
+                vectors = self._by_scope[scope] = _ScopeVectors(len(vec))
+            vectors.add(entry_id, vec)
+            self.bytes += nbytes
+            while self.bytes > self.max_bytes and self._entries:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, prefix: str) -> int:
+        """
+        Drops every scope starting with prefix (e.g. a session id). Returns entries dropped.
+        """
+        with self._lock:
+            ids = [i for scope, vectors in self._by_scope.items() if scope.startswith(prefix) for i in vectors.ids]
+            for i in ids:
+                self._drop(i)
+            return len(ids)
+
+    def _drop(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        vectors = self._by_scope[entry.scope]
+        vectors.remove(entry_id)
+        if not vectors:
+            del self._by_scope[entry.scope]
+        self.bytes -= entry.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+answer_cache = AnswerCache(threshold=settings.answer_cache_threshold, max_bytes=settings.answer_cache_bytes)
+
+
+def _session_prefix(session_id: str) -> str:
+    # Trailing ":" so one session id never matches another that merely starts with it.
+    return f"{session_id or '__global__'}:"
+
+
+def answer_scope(session_id: str, fingerprint: str, k: int) -> str:
+    return f"{_session_prefix(session_id)}{fingerprint}:k={k}"
+
+
+def invalidate_session(session_id: str) -> int:
+    return answer_cache.invalidate(_session_prefix(session_id))
@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+from .embed import embed_texts
+
+EmbedFn = Callable[[List[str], str], np.ndarray]
+
+
+class QueryBatcher:
+    """
+    Coalesces concurrent query embeddings into one embeddings call.
+
+    Requests that arrive within max_wait_ms of the first waiting one (or until
+    max_batch are waiting) are sent together; each caller gets its own row back.
+    max_wait_ms is the latency-vs-throughput knob: every request may wait up
+    to that long, in exchange for fewer calls against the rate-limited API.
+
+    stop() fails whatever is still queued; a later embed() starts a fresh
+    worker and pool (another app lifespan in the same process).
+    """
+
+    def __init__(
+        self,
+        embed_fn: EmbedFn = embed_texts,
+        max_wait_ms: float = 5.0,
+        max_batch: int = 32,
+        max_in_flight: int = 4,
+        result_timeout: float = 120.0,
+    ):
+        self.embed_fn = embed_fn
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max_batch
+        self.max_in_flight = max_in_flight
+        self.result_timeout = result_timeout
+        # Batches are sent from a small pool so collecting the next batch
+        # doesn't wait for the previous embeddings call to return.
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._queue: "queue.Queue[Optional[Tuple[str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def _ensure_started(self) -> None:
+        # Caller holds _lock.
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="query-batch")
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, args=(self._pool,), name="query-batcher", daemon=True)
+            self._thread.start()
+
+    def embed(self, texts: List[str], input_type: str) -> np.ndarray:
+        """
+        EmbedFn-compatible entry point. Only "query" embeddings are coalesced.
+        """
+        if input_type != "query":
+            return self.embed_fn(texts, input_type)
+
+        futures: List[Future] = []
+        # Enqueue under the lock so nothing lands behind stop()'s sentinel.
+        with self._lock:
+            self._ensure_started()
+            for t in texts:
+                f: Future = Future()
+                self._queue.put((t, f))
+                futures.append(f)
+        deadline = time.monotonic() + self.result_timeout
+        return np.vstack([f.result(timeout=max(deadline - time.monotonic(), 0.0)) for f in futures])
+
+    def _run(self, pool: ThreadPoolExecutor) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # finish this batch, then stop
+                    break
+                batch.append(item)
+
+            self.batches += 1
+            self.requests += len(batch)
+            try:
+                pool.submit(self._send, batch)
+            except RuntimeError as e:  # pool already shut down
+                self._fail(batch, e)
+
+    @staticmethod
+    def _fail(batch: List[Tuple[str, Future]], error: BaseException) -> None:
+        for _, f in batch:
+            if not f.done():
+                f.set_exception(error)
+
+    def _send(self, batch: List[Tuple[str, Future]]) -> None:
+        try:
+            vecs = self.embed_fn([t for t, _ in batch], "query")
+            for (_, f), v in zip(batch, vecs):
+                f.set_result(v[None, :])
+        except Exception as e:
+            self._fail(batch, e)
+
+    def stop(self) -> None:
+        """
+        Flushes what is queued and stops the worker and pool. Anything the
+        worker didn't pick up in time fails with RuntimeError rather than hang.
+        """
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join(timeout=5)
+            self._thread = None
+            leftover: List[Tuple[str, Future]] = []
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    leftover.append(item)
+            self._fail(leftover, RuntimeError("Query batcher stopped."))
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "avg_batch": round(self.requests / self.batches, 2) if self.batches else 0.0,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_batch": self.max_batch,
+        }
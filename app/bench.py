@@ -0,0 +1,401 @@
+"""
+Offline benchmark suite: no API key, no network. Embeddings and chat come from
+app.fake_backend, started locally on a free port.
+
+  chunking    chunk_by_paragraphs throughput on synthetic documents
+  retrieval   exact search latency at 10k / 100k / 1M synthetic chunk vectors
+  build       /upload + /build of a synthetic corpus on a real server process
+  ask         end-to-end /ask latency (p50/p99) at a fixed concurrency
+
+The server and fake backend run as subprocesses with caches, metrics and
+sessions under a temporary directory, so a run never touches (or benefits
+from) the project's own caches. The report is JSON; compare() flags
+regressions against a saved baseline.
+
+    rag bench --out bench.json
+    rag bench --baseline bench.json --tolerance 0.25
+"""
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import httpx
+import numpy as np
+
+from .config import settings
+from .chunk import chunk_by_paragraphs
+from .index import VectorIndex
+
+BENCH_VERSION = 1
+SUITES = ("chunking", "retrieval", "build", "ask")
+
+
+@dataclass
+class BenchConfig:
+    suites: List[str] = field(default_factory=lambda: list(SUITES))
+    seed: int = 0
+    # chunking
+    chunk_mb: float = 8.0
+    # retrieval
+    sizes: List[int] = field(default_factory=lambda: [10_000, 100_000, 1_000_000])
+    dim: int = 256
+    queries: int = 200
+    k: int = 5
+    # build / ask (server + fake backend)
+    docs: int = 50
+    doc_words: int = 2000
+    embed_dim: int = 1024
+    embed_latency_ms: float = 0.0
+    chat_ttft_ms: float = 0.0
+    chat_token_ms: float = 0.0
+    ask_requests: int = 200
+    concurrency: int = 8
+
+
+def percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    if not samples_ms:
+        return {}
+    a = np.asarray(samples_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(a, 50)), 3),
+        "p90_ms": round(float(np.percentile(a, 90)), 3),
+        "p99_ms": round(float(np.percentile(a, 99)), 3),
+        "mean_ms": round(float(a.mean()), 3),
+        "max_ms": round(float(a.max()), 3),
+    }
+
+
+# ----------------------------
+# Synthetic corpus
+# ----------------------------
+_SYLLABLES = ["ka", "lo", "mi", "re", "tu", "sa", "ne", "vo", "di", "pa", "zu", "gri", "mon", "tel", "bar", "quin"]
+
+
+def make_vocab(rng: np.random.Generator, size: int = 5000) -> List[str]:
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(_SYLLABLES, size=int(rng.integers(2, 5)))))
+    return sorted(words)
+
+
+def synthetic_doc(rng: np.random.Generator, vocab: List[str], words: int) -> str:
+    """
+    Paragraphs of 40-160 words in sentences of 6-20, Zipf-ish word frequencies.
+    """
+    ranks = np.minimum(rng.zipf(1.3, size=words), len(vocab)) - 1
+    tokens = [vocab[r] for r in ranks]
+    paragraphs: List[str] = []
+    i = 0
+    while i < len(tokens):
+        para_len = int(rng.integers(40, 160))
+        para = tokens[i:i + para_len]
+        i += para_len
+        sentences = []
+        j = 0
+        while j < len(para):
+            n = int(rng.integers(6, 20))
+            s = " ".join(para[j:j + n])
+            sentences.append(s[:1].upper() + s[1:] + ".")
+            j += n
+        paragraphs.append(" ".join(sentences))
+    return "\n\n".join(paragraphs)
+
+
+def clustered_unit_vectors(rng: np.random.Generator, n: int, dim: int, clusters: int = 64, block: int = 65536) -> np.ndarray:
+    """
+    (n, dim) unit-norm float32 rows around random centers, generated in blocks
+    so a 1M-row corpus needs no temporaries of its own size.
+    """
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        part = out[start:stop]
+        rng.standard_normal(part.shape, dtype=np.float32, out=part)
+        part *= 0.5
+        part += centers[rng.integers(0, clusters, size=stop - start)]
+        part /= np.linalg.norm(part, axis=1, keepdims=True)
+    return out
+
+
+# ----------------------------
+# Suites
+# ----------------------------
+def bench_chunking(cfg: BenchConfig, rng: np.random.Generator) -> Dict[str, Any]:
+    vocab = make_vocab(rng)
+    docs: List[str] = []
+    size = 0
+    while size < cfg.chunk_mb * 2**20:
+        docs.append(synthetic_doc(rng, vocab, 5000))
+        size += len(docs[-1].encode("utf-8"))
+
+    t0 = time.perf_counter()
+    chunks = sum(len(chunk_by_paragraphs(d)) for d in docs)
+    seconds = time.perf_counter() - t0
+    return {
+        "input_mb": round(size / 2**20, 2),
+        "docs": len(docs),
+        "chunks": chunks,
+        "seconds": round(seconds, 4),
+        "mb_per_s": round(size / 2**20 / seconds, 2),
+        "chunks_per_s": round(chunks / seconds, 1),
+    }
+
+
+def bench_retrieval(cfg: BenchConfig, rng: np.random.Generator) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for n in cfg.sizes:
+        t0 = time.perf_counter()
+        index = VectorIndex(clustered_unit_vectors(rng, n, cfg.dim), normalized=True)
+        setup_s = time.perf_counter() - t0
+        queries = rng.standard_normal((cfg.queries, cfg.dim), dtype=np.float32)
+
+        index.search(queries[:1], cfg.k)  # warm-up (page in, BLAS threads)
+        samples: List[float] = []
+        for q in queries:
+            t0 = time.perf_counter()
+            index.search(q[None, :], cfg.k)
+            samples.append((time.perf_counter() - t0) * 1000)
+        t0 = time.perf_counter()
+        index.search(queries, cfg.k)
+        batched_s = time.perf_counter() - t0
+
+        out[str(n)] = {
+            "chunks": n,
+            "dim": cfg.dim,
+            "backend": "exact",
+            "index_mb": round(index.nbytes / 2**20, 1),
+            "setup_seconds": round(setup_s, 3),
+            **percentiles(samples),
+            "batched_qps": round(cfg.queries / batched_s, 1),
+        }
+        del index
+    return out
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(app_path: str, env: Dict[str, str], cwd: Path, ready_path: str = "/", timeout: float = 60.0) -> Iterator[str]:
+    """
+    Runs `uvicorn app_path` on a free local port; yields its base URL once it answers.
+    """
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app_path, "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env,
+        cwd=str(cwd),
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"{app_path} exited with code {proc.returncode} before it was ready")
+            try:
+                httpx.get(url + ready_path, timeout=1.0)
+                break
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{app_path} not ready after {timeout:.0f}s")
+                time.sleep(0.1)
+        yield url
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+@contextmanager
+def bench_stack(
+    workdir: Path,
+    embed_dim: int = 1024,
+    embed_latency_ms: float = 0.0,
+    chat_ttft_ms: float = 0.0,
+    chat_token_ms: float = 0.0,
+) -> Iterator[str]:
+    """
+    Fake NVIDIA backend + API server wired to it. Yields the server URL.
+    """
+    env = dict(os.environ)
+    env.update(
+        {
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(settings.project_root), env.get("PYTHONPATH", "")])),
+            "FAKE_EMBED_DIM": str(embed_dim),
+            "FAKE_EMBED_LATENCY_MS": str(embed_latency_ms),
+            "FAKE_CHAT_TTFT_MS": str(chat_ttft_ms),
+            "FAKE_CHAT_TOKEN_MS": str(chat_token_ms),
+            "NVIDIA_API_KEY": "bench",
+            "RAG_CACHE_DIR": str(workdir / "cache"),
+            "RAG_METRICS_DIR": str(workdir / "metrics"),
+        }
+    )
+    with serve("app.fake_backend:app", env, workdir, ready_path="/v1/models") as fake_url:
+        env["NVIDIA_BASE_URL"] = f"{fake_url}/v1"
+        with serve("app.server:app", env, workdir, ready_path="/health") as server_url:
+            yield server_url
+
+
+def bench_build(cfg: BenchConfig, rng: np.random.Generator, client: httpx.Client, session: str) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Returns (results, the corpus vocabulary) for generating /ask queries.
+    """
+    vocab = make_vocab(rng)
+    files = [
+        ("files", (f"doc_{i:04d}.txt", synthetic_doc(rng, vocab, cfg.doc_words).encode("utf-8"), "text/plain"))
+        for i in range(cfg.docs)
+    ]
+    headers = {"x-session-id": session}
+
+    t0 = time.perf_counter()
+    r = client.post("/upload", files=files, headers=headers)
+    r.raise_for_status()
+    upload_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    r = client.post("/build", params={"wait": "true"}, headers=headers)
+    r.raise_for_status()
+    build_s = time.perf_counter() - t0
+    built = r.json()
+
+    # Unchanged docs: measures the incremental (nothing to embed) path.
+    t0 = time.perf_counter()
+    client.post("/build", params={"wait": "true"}, headers=headers).raise_for_status()
+    rebuild_s = time.perf_counter() - t0
+
+    return {
+        "docs": cfg.docs,
+        "input_mb": round(sum(len(f[1][1]) for f in files) / 2**20, 2),
+        "chunks": built["chunks"],
+        "upload_seconds": round(upload_s, 3),
+        "build_seconds": round(build_s, 3),
+        "chunks_per_s": round(built["chunks"] / build_s, 1),
+        "rebuild_unchanged_seconds": round(rebuild_s, 3),
+    }, vocab
+
+
+def bench_ask(cfg: BenchConfig, rng: np.random.Generator, client: httpx.Client, session: str, vocab: List[str]) -> Dict[str, Any]:
+    # Distinct queries, so neither the query-embedding nor the answer cache serves them.
+    queries = [
+        "what is " + " ".join(vocab[int(r)] for r in rng.integers(0, len(vocab), size=5)) + "?"
+        for i in range(cfg.ask_requests)
+    ]
+    headers = {"x-session-id": session}
+    client.post("/ask", json={"query": "warm up"}, headers=headers)
+
+    def one(query: str) -> Tuple[float, bool]:
+        t0 = time.perf_counter()
+        try:
+            r = client.post("/ask", json={"query": query}, headers=headers)
+            ok = r.status_code == 200 and not r.json().get("answer", "").startswith("ERROR:")
+        except httpx.HTTPError:
+            ok = False
+        return (time.perf_counter() - t0) * 1000, ok
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=cfg.concurrency) as pool:
+        results = list(pool.map(one, queries))
+    wall = time.perf_counter() - t0
+
+    return {
+        "requests": len(results),
+        "concurrency": cfg.concurrency,
+        "errors": sum(not ok for _, ok in results),
+        "throughput_rps": round(len(results) / wall, 1),
+        **percentiles([ms for ms, _ in results]),
+    }
+
+
+def run_bench(cfg: BenchConfig, log=print) -> Dict[str, Any]:
+    rng = np.random.default_rng(cfg.seed)
+    results: Dict[str, Any] = {}
+
+    if "chunking" in cfg.suites:
+        log("chunking ...")
+        results["chunking"] = bench_chunking(cfg, rng)
+    if "retrieval" in cfg.suites:
+        log(f"retrieval at {', '.join(map(str, cfg.sizes))} chunks ...")
+        results["retrieval"] = bench_retrieval(cfg, rng)
+    if "build" in cfg.suites or "ask" in cfg.suites:
+        with tempfile.TemporaryDirectory(prefix="rag-bench-") as tmp:
+            stack = bench_stack(Path(tmp), cfg.embed_dim, cfg.embed_latency_ms, cfg.chat_ttft_ms, cfg.chat_token_ms)
+            limits = httpx.Limits(max_connections=cfg.concurrency + 2)
+            with stack as url, httpx.Client(base_url=url, timeout=300.0, limits=limits) as client:
+                session = "bench-session"
+                log(f"build: {cfg.docs} docs x {cfg.doc_words} words ...")
+                build, vocab = bench_build(cfg, rng, client, session)
+                if "build" in cfg.suites:
+                    results["build"] = build
+                if "ask" in cfg.suites:
+                    log(f"ask: {cfg.ask_requests} requests, concurrency {cfg.concurrency} ...")
+                    results["ask"] = bench_ask(cfg, rng, client, session, vocab)
+
+    return {
+        "bench_version": BENCH_VERSION,
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "config": asdict(cfg),
+        "results": results,
+    }
+
+
+def _flatten(d: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    out: Dict[str, float] = {}
+    for key, value in d.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            out.update(_flatten(value, path + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[path] = float(value)
+    return out
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.25) -> List[str]:
+    """
+    Regressions of report against baseline: any rise in error counts (*errors),
+    latencies (*_ms, *_seconds) more than `tolerance` higher, throughputs
+    (*_per_s, *_qps, *_rps) more than `tolerance` lower. Error counts missing
+    from the baseline count as 0; other metrics missing from either side are ignored.
+    """
+    new, old = _flatten(report.get("results", {})), _flatten(baseline.get("results", {}))
+    regressions: List[str] = []
+    # Failing fast is not getting faster: errors are checked before any latency.
+    for key in sorted(k for k in new if k.endswith("errors")):
+        if new[key] > old.get(key, 0):
+            regressions.append(f"{key}: {old.get(key, 0):g} -> {new[key]:g}")
+    for key in sorted(new.keys() & old.keys()):
+        a, b = new[key], old[key]
+        if b <= 0:
+            continue
+        if key.endswith(("_ms", "_seconds")) and a > b * (1 + tolerance):
+            regressions.append(f"{key}: {b:g} -> {a:g} (+{(a / b - 1) * 100:.0f}%)")
+        elif key.endswith(("_per_s", "_qps", "_rps")) and a < b * (1 - tolerance):
+            regressions.append(f"{key}: {b:g} -> {a:g} ({(a / b - 1) * 100:.0f}%)")
+    return regressions
+
+
+def write_report(report: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
@@ -0,0 +1,165 @@
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from .index import atomic_write, top_k_indices
+
+# Words plus identifier-like compounds ("ERR-4012", "v2.1.0", "E_TIMEOUT", "/v1/embeddings").
+TOKEN_RE = re.compile(r"\w+(?:[-.:/]\w+)*")
+PART_RE = re.compile(r"[-.:/_]")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased tokens. Compound identifiers are kept whole and also split into
+    their parts, so "ERR-4012" matches both "err-4012" and "4012".
+    """
+    out: List[str] = []
+    for tok in TOKEN_RE.findall(text.lower()):
+        out.append(tok)
+        if PART_RE.search(tok):
+            out.extend(p for p in PART_RE.split(tok) if p)
+    return out
+
+
+class BM25Index:
+    """
+    Okapi BM25 over chunk texts as a CSR inverted index:
+      postings of term t are docs[indptr[t]:indptr[t+1]] (ascending doc ids)
+      with weights[...] = the term's full BM25 contribution for that doc.
+    Weights are precomputed at build time, so scoring a query is one
+    scatter-add per query term. search() follows the vector backends:
+    (scores, ids) of shape (Q, k), ids padded with -1.
+    """
+
+    def __init__(
+        self,
+        terms: List[str],
+        indptr: np.ndarray,
+        docs: np.ndarray,
+        weights: np.ndarray,
+        num_docs: int,
+        fingerprint: str = "",
+    ):
+        self.terms = terms
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.indptr = indptr
+        self.docs = docs
+        self.weights = weights
+        self.num_docs = num_docs
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, texts: List[str], k1: float = 1.2, b: float = 0.75, fingerprint: str = "") -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(texts), dtype=np.float32)
+
+        for d, text in enumerate(texts):
+            toks = tokenize(text)
+            doc_len[d] = len(toks)
+            for tok, tf in Counter(toks).items():
+                term_ids.append(vocab.setdefault(tok, len(vocab)))
+                doc_ids.append(d)
+                tfs.append(tf)
+
+        tid = np.asarray(term_ids, dtype=np.int64)
+        did = np.asarray(doc_ids, dtype=np.int32)
+        tf = np.asarray(tfs, dtype=np.float32)
+
+        # Stable sort by term keeps each posting list in ascending doc order.
+        order = np.argsort(tid, kind="stable")
+        tid, did, tf = tid[order], did[order], tf[order]
+        counts = np.bincount(tid, minlength=len(vocab))
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        df = counts.astype(np.float32)
+
+        n = len(texts)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(doc_len.mean()) if n else 0.0
+        norm = k1 * (1.0 - b + b * doc_len[did] / (avgdl or 1.0))
+        weights = (idf[tid] * tf * (k1 + 1.0) / (tf + norm)).astype(np.float32)
+
+        terms = [""] * len(vocab)
+        for t, i in vocab.items():
+            terms[i] = t
+        return cls(terms, indptr, did, weights, n, fingerprint)
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.indptr.nbytes + self.docs.nbytes + self.weights.nbytes + sum(len(t) for t in self.terms))
+
+    def __len__(self) -> int:
+        return self.num_docs
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        (N,) BM25 scores; 0 for docs sharing no term with the query.
+        """
+        out = np.zeros(self.num_docs, dtype=np.float32)
+        for tok in set(tokenize(query)):
+            t = self.vocab.get(tok)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            out[self.docs[lo:hi]] += self.weights[lo:hi]  # doc ids within a posting list are unique
+        return out
+
+    def search(self, queries: List[str], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        all_scores = np.zeros((len(queries), k), dtype=np.float32)
+        all_ids = np.full((len(queries), k), -1, dtype=np.int64)
+        for qi, query in enumerate(queries):
+            scores = self.scores(query)
+            ids = top_k_indices(scores, k)
+            ids = ids[scores[ids] > 0]
+            all_scores[qi, :len(ids)] = scores[ids]
+            all_ids[qi, :len(ids)] = ids
+        return all_scores, all_ids
+
+    def save(self, path: Path) -> None:
+        blob = np.frombuffer("\n".join(self.terms).encode("utf-8"), dtype=np.uint8)
+
+        def write(f):
+            np.savez(
+                f,
+                terms=blob,
+                indptr=self.indptr,
+                docs=self.docs,
+                weights=self.weights,
+                num_docs=np.int64(self.num_docs),
+                fingerprint=np.array(self.fingerprint),
+            )
+
+        atomic_write(path, write)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path) as z:
+            raw = z["terms"].tobytes().decode("utf-8")
+            terms = raw.split("\n") if raw else []
+            return cls(terms, z["indptr"], z["docs"], z["weights"], int(z["num_docs"]), str(z["fingerprint"]))
+
+
+def build_or_load_bm25(
+    get_texts: Callable[[], List[str]], path: Path, fingerprint: str, k1: float = 1.2, b: float = 0.75
+) -> BM25Index:
+    """
+    Loads the index at path if it was built for the same chunks (fingerprint),
+    else builds it from get_texts() and saves it. Texts are only read for a build.
+    """
+    if path.exists():
+        try:
+            index = BM25Index.load(path)
+            if index.fingerprint == fingerprint:
+                return index
+        except (OSError, ValueError, KeyError):
+            pass
+    index = BM25Index.build(get_texts(), k1=k1, b=b, fingerprint=fingerprint)
+    index.save(path)
+    return index
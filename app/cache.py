@@ -1,15 +1,21 @@
 import hashlib
 import json
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
 
 import numpy as np
 
 from .config import settings
-from .embed import embed_texts
+from .embed import embed_texts_bulk, ProgressFn
+from .embed_store import embed_with_store
+from .index import VectorIndex, load_index, save_index
 
 
 def chunks_fingerprint(chunks: List[Dict]) -> str:
+    # A ChunkStore knows its fingerprint; don't read every text back to recompute it.
+    stored = getattr(chunks, "fingerprint", "")
+    if stored:
+        return stored
     payload = [{"doc_id": c["doc_id"], "chunk_id": c["chunk_id"], "text": c["text"]} for c in chunks]
     raw = json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")
     return hashlib.sha256(raw).hexdigest()
@@ -22,23 +28,119 @@ def cache_paths(chunks_fp: str) -> Tuple[Path, Path]:
     return vec_path, meta_path
 
 
+def backend_path(chunks_fp: str, backend: str) -> Path:
+    vec_path, _ = cache_paths(chunks_fp)
+    return vec_path.with_suffix(f".{backend}.npz")
+
+
+def load_vectors(vec_path: Path, meta_path: Path) -> VectorIndex:
+    """
+    Loads saved vectors memory-mapped when configured. Quantized storage always
+    maps them: only the codes are meant to be resident.
+    """
+    mmap = settings.mmap_vectors or settings.vector_storage != "float32"
+    return load_index(vec_path, meta_path, mmap=mmap)
+
+
+def with_storage(index: VectorIndex, vec_path: Path, rebuild: bool = False) -> VectorIndex:
+    """
+    Wraps the index in quantized codes when settings.vector_storage asks for it.
+    Codes live next to the vectors as <name>.<mode>.npz; rebuild=True discards
+    existing codes (for paths that are rewritten in place, like session indexes).
+    """
+    if settings.vector_storage == "float32":
+        return index
+    from .quant import build_or_load_quantized
+
+    path = vec_path.with_suffix(f".{settings.vector_storage}.npz")
+    if rebuild and path.exists():
+        path.unlink()
+    return build_or_load_quantized(index, path, settings.vector_storage, rescore_factor=settings.rescore_factor)
+
+
+def with_backend(index: VectorIndex, chunks_fp: str) -> VectorIndex:
+    """
+    Wraps the exact index in the backend chosen by settings.index_backend.
+    """
+    if settings.index_backend == "exact":
+        return with_storage(index, cache_paths(chunks_fp)[0])
+    if settings.index_backend == "ivf":
+        from .ivf import build_or_load_ivf
+
+        path = backend_path(chunks_fp, "ivf")
+        return build_or_load_ivf(index, path, nlist=settings.ivf_nlist, nprobe=settings.ivf_nprobe)
+    raise ValueError(f"Unknown index backend: {settings.index_backend}")
+
+
+def build_or_load_lexical(chunks: List[Dict], fp: Optional[str] = None):
+    """
+    BM25 index over the chunk texts, cached next to the vectors as <name>.bm25.npz.
+    """
+    from .bm25 import build_or_load_bm25
+
+    settings.cache_dir.mkdir(parents=True, exist_ok=True)
+    fp = fp or chunks_fingerprint(chunks)
+    return build_or_load_bm25(
+        lambda: [c["text"] for c in chunks], backend_path(fp, "bm25"), fp, k1=settings.bm25_k1, b=settings.bm25_b
+    )
+
+
 def load_chunks() -> List[Dict]:
-    return json.loads(settings.chunks_file.read_text(encoding="utf-8"))
+    """
+    The chunks in settings.chunks_file. With settings.chunk_store they come
+    from the compact memory-mapped store next to it (chunks.bin), which is
+    (re)converted whenever chunks.json changes.
+    """
+    src = settings.chunks_file
+    if not settings.chunk_store:
+        return json.loads(src.read_text(encoding="utf-8"))
+
+    from .chunk_store import ChunkStore
 
+    st = src.stat()
+    stamp = f"{st.st_size}:{st.st_mtime_ns}"
+    store_path = src.with_suffix(".bin")
+    if store_path.exists():
+        try:
+            store = ChunkStore(store_path)
+            if store.source_stamp == stamp:
+                return store  # type: ignore[return-value]
+        except (OSError, ValueError):
+            pass
+    chunks = json.loads(src.read_text(encoding="utf-8"))
+    ChunkStore.write(chunks, store_path, fingerprint=chunks_fingerprint(chunks), source_stamp=stamp)
+    return ChunkStore(store_path)  # type: ignore[return-value]
 
-def build_or_load_chunk_vectors(chunks: List[Dict]) -> np.ndarray:
+
+def build_or_load_chunk_vectors(
+    chunks: List[Dict],
+    concurrency: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+) -> VectorIndex:
+    """
+    concurrency / progress are passed to the bulk embedding pipeline
+    (embed_texts_bulk) when chunks have to be embedded.
+    """
     settings.cache_dir.mkdir(parents=True, exist_ok=True)
 
     fp = chunks_fingerprint(chunks)
     vec_path, meta_path = cache_paths(fp)
 
     if vec_path.exists():
-        return np.load(vec_path)
+        return with_backend(load_vectors(vec_path, meta_path), fp)
+
+    def embed_fn(batch: List[str], input_type: str) -> np.ndarray:
+        return embed_texts_bulk(batch, input_type, concurrency=concurrency, progress=progress)
 
-    print("Cache missing — embedding chunks once (passage mode)...")
     texts = [c["text"] for c in chunks]
-    vectors = embed_texts(texts, input_type="passage")
-    np.save(vec_path, vectors)
+    if settings.embed_store:
+        # Only chunks whose text is not in the store yet cost an embeddings call.
+        vectors, embedded = embed_with_store(texts, input_type="passage", embed_fn=embed_fn)
+        print(f"Cache missing — embedded {embedded} new/changed chunks, reused {len(texts) - embedded}.")
+    else:
+        print("Cache missing — embedding chunks once (passage mode)...")
+        vectors = embed_fn(texts, "passage")
+    index = VectorIndex(vectors)
 
     meta = {
         "fingerprint": fp,
@@ -46,5 +148,6 @@ def build_or_load_chunk_vectors(chunks: List[Dict]) -> np.ndarray:
         "dim": int(vectors.shape[1]),
         "embed_model": settings.embed_model,
     }
-    meta_path.write_text(json.dumps(meta, indent=2), encoding="utf-8")
-    return vectors
+    save_index(index, vec_path, meta_path, meta)
+    # Reload from disk so a fresh build ends up mapped like every later load.
+    return with_backend(load_vectors(vec_path, meta_path), fp)
@@ -1,6 +1,7 @@
 from typing import List, Dict
 
 from .ingest import Document
+from .extract_cache import cached_pieces, chunker_key
 
 
 def chunk_by_paragraphs(text: str, chunk_size: int = 500, overlap: int = 80) -> List[str]:
@@ -44,9 +45,14 @@ def chunk_by_paragraphs(text: str, chunk_size: int = 500, overlap: int = 80) ->
 
 def make_chunks(docs: List[Document], chunk_size: int = 500, overlap: int = 80) -> List[Dict]:
     all_chunks: List[Dict] = []
+    chunker = chunker_key("chunk.paragraphs", chunk_size, overlap)
 
     for doc in docs:
-        pieces = chunk_by_paragraphs(doc.text, chunk_size=chunk_size, overlap=overlap)
+        # Unchanged files (same content hash) reuse their chunks from the extraction cache.
+        pieces = cached_pieces(
+            doc.content_hash, chunker, doc.text,
+            lambda text: chunk_by_paragraphs(text, chunk_size=chunk_size, overlap=overlap),
+        )
         for i, piece in enumerate(pieces):
             all_chunks.append(
                 {
@@ -0,0 +1,145 @@
+import json
+import struct
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, List, Union
+
+import numpy as np
+
+from .index import atomic_write
+
+MAGIC = b"RAGCHNK1"
+_ALIGN = 8
+
+
+def _pad(n: int) -> int:
+    return (-n) % _ALIGN
+
+
+class ChunkStore(Sequence):
+    """
+    Read-only, memory-mapped chunk list in one binary file:
+
+      MAGIC | u64 header length | JSON header (doc_id / source tables, sections)
+      doc_idx int32[N] | chunk_id int32[N] | source_idx int32[N]
+      offsets int64[N+1] | utf-8 text blob
+
+    Only the small columnar metadata is touched when the store is opened;
+    a chunk's text is decoded from the mapped blob when that row is read, so a
+    query that returns k chunks reads k texts. Indexing gives the same dicts
+    as chunks.json ({"doc_id", "chunk_id", "text", "source"}); slices give lists.
+    One file, replaced atomically, so readers never see a half-written store.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        if raw[: len(MAGIC)].tobytes() != MAGIC:
+            raise ValueError(f"Not a chunk store: {path}")
+        (header_len,) = struct.unpack("<Q", raw[len(MAGIC):len(MAGIC) + 8].tobytes())
+        start = len(MAGIC) + 8
+        header = json.loads(raw[start:start + header_len].tobytes().decode("utf-8"))
+
+        self.doc_ids: List[str] = header["doc_ids"]
+        self.sources: List[str] = header["sources"]
+        self.fingerprint: str = header.get("fingerprint", "")
+        self.source_stamp: str = header.get("source_stamp", "")
+        sections = header["sections"]
+        n = header["num_chunks"]
+
+        def view(name: str, dtype: Any, count: int) -> np.ndarray:
+            off = sections[name]
+            return raw[off:off + count * np.dtype(dtype).itemsize].view(dtype)
+
+        self.doc_idx = view("doc_idx", np.int32, n)
+        self.chunk_ids = view("chunk_id", np.int32, n)
+        self.source_idx = view("source_idx", np.int32, n)
+        self.offsets = view("offsets", np.int64, n + 1)
+        self._blob = raw[sections["text"]:]
+        self._raw = raw
+
+    def __len__(self) -> int:
+        return int(self.chunk_ids.shape[0])
+
+    def text(self, i: int) -> str:
+        return self._blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __getitem__(self, i: Union[int, slice]) -> Any:
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return {
+            "doc_id": self.doc_ids[self.doc_idx[i]],
+            "chunk_id": int(self.chunk_ids[i]),
+            "text": self.text(i),
+            "source": self.sources[self.source_idx[i]],
+        }
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Resident metadata only; the text blob stays in the (shared) page cache.
+        """
+        tables = sum(len(s) for s in self.doc_ids) + sum(len(s) for s in self.sources)
+        return int(self.doc_idx.nbytes + self.chunk_ids.nbytes + self.source_idx.nbytes + self.offsets.nbytes) + tables
+
+    @staticmethod
+    def write(chunks: List[Dict[str, Any]], path: Path, fingerprint: str = "", source_stamp: str = "") -> None:
+        """
+        fingerprint: chunks_fingerprint of the chunks (saves re-reading every text to compute it).
+        source_stamp: identifies the file the store was converted from, if any.
+        """
+        doc_table: Dict[str, int] = {}
+        source_table: Dict[str, int] = {}
+        doc_idx = np.array([doc_table.setdefault(str(c["doc_id"]), len(doc_table)) for c in chunks], dtype=np.int32)
+        source_idx = np.array([source_table.setdefault(str(c["source"]), len(source_table)) for c in chunks], dtype=np.int32)
+        chunk_ids = np.array([int(c["chunk_id"]) for c in chunks], dtype=np.int32)
+        encoded = [c["text"].encode("utf-8") for c in chunks]
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+
+        arrays = [("doc_idx", doc_idx), ("chunk_id", chunk_ids), ("source_idx", source_idx), ("offsets", offsets)]
+        header = {
+            "num_chunks": len(chunks),
+            "fingerprint": fingerprint,
+            "source_stamp": source_stamp,
+            "doc_ids": list(doc_table),
+            "sources": list(source_table),
+            "sections": {},
+        }
+
+        # Section offsets depend on the header length, which depends on the offsets:
+        # size the header with placeholder offsets of the final width, then pad it.
+        def layout(header_len: int) -> Dict[str, int]:
+            pos = len(MAGIC) + 8 + header_len
+            pos += _pad(pos)
+            sections = {}
+            for name, arr in arrays:
+                sections[name] = pos
+                pos += arr.nbytes
+                pos += _pad(pos)
+            sections["text"] = pos
+            return sections
+
+        header["sections"] = {name: 10**15 for name, _ in arrays + [("text", None)]}
+        header_len = len(json.dumps(header).encode("utf-8"))
+        header["sections"] = layout(header_len)
+        header_bytes = json.dumps(header).encode("utf-8").ljust(header_len, b" ")
+
+        def write_file(f) -> None:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            f.write(b"\0" * _pad(f.tell()))
+            for _, arr in arrays:
+                f.write(arr.tobytes())
+                f.write(b"\0" * _pad(f.tell()))
+            for b in encoded:
+                f.write(b)
+
+        atomic_write(path, write_file)
+
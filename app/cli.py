@@ -6,6 +6,9 @@
 #   rag ask "question" --k 5
 #   rag run
 #   rag metrics -n 10
+#   rag metrics --stats --window 24h
+#   rag bench --out bench.json
+#   rag loadtest --sessions 200 --users 32
 #   rag doctor
 
 from __future__ import annotations
@@ -14,25 +17,48 @@ import argparse
 import json
 import os
 import sys
+from datetime import datetime
 from typing import Any, List, Dict
 
 from .config import settings
-from .cache import load_chunks, build_or_load_chunk_vectors
+from .cache import load_chunks, build_or_load_chunk_vectors, build_or_load_lexical
 from .retrieve import top_k_retrieve
 from .prompt import build_prompt
 from .llm import chat
+from .clients import close_clients
 
 
-def cmd_ingest(_: argparse.Namespace) -> None:
-    # Reuse existing script entrypoint
-    from nvidia_rag.scripts.ingest_and_chunk import main as ingest_main  # type: ignore
-    ingest_main()
+def cmd_ingest(args: argparse.Namespace) -> None:
+    import time
 
+    from .ingest import load_documents, default_workers
+    from .chunk import make_chunks
 
-def cmd_build(_: argparse.Namespace) -> None:
+    workers = args.workers or default_workers()
+    t0 = time.perf_counter()
+    docs = load_documents(workers=workers)
+    wall = time.perf_counter() - t0
+    cpu = sum(d.extract_seconds for d in docs)
+    print(f"Loaded documents: {len(docs)} in {wall:.2f}s with {workers} worker(s) (extraction time {cpu:.2f}s)")
+    for d in sorted(docs, key=lambda d: d.extract_seconds, reverse=True)[: args.timings]:
+        print(f"  {d.extract_seconds * 1000:9.1f} ms  {d.source}")
+
+    chunks = make_chunks(docs, chunk_size=500, overlap=80)
+    print(f"Created chunks: {len(chunks)}")
+    settings.chunks_file.parent.mkdir(parents=True, exist_ok=True)
+    settings.chunks_file.write_text(json.dumps(chunks, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Saved: {settings.chunks_file}")
+
+
+def print_progress(done: int, total: int) -> None:
+    print(f"\rEmbedded {done}/{total} chunks", end="\n" if done >= total else "", file=sys.stderr, flush=True)
+
+
+def cmd_build(args: argparse.Namespace) -> None:
     chunks = load_chunks()
-    vecs = build_or_load_chunk_vectors(chunks)
-    print(f"Cache ready. chunk_vectors shape = {vecs.shape}")
+    vecs = build_or_load_chunk_vectors(chunks, concurrency=args.concurrency, progress=print_progress)
+    lexical = build_or_load_lexical(chunks)
+    print(f"Cache ready. chunk_vectors shape = {vecs.shape}, bm25 terms = {len(lexical.terms)}")
 
 
 def cmd_ask(args: argparse.Namespace) -> None:
@@ -43,8 +69,9 @@ def cmd_ask(args: argparse.Namespace) -> None:
 
     chunks = load_chunks()
     chunk_vecs = build_or_load_chunk_vectors(chunks)
+    lexical = build_or_load_lexical(chunks)
 
-    retrieved = top_k_retrieve(query, chunks, chunk_vecs, k=args.k)
+    retrieved = top_k_retrieve(query, chunks, chunk_vecs, k=args.k, lexical=lexical)
 
     if not retrieved:
         print("No chunks retrieved.")
@@ -67,18 +94,27 @@ def cmd_run(_: argparse.Namespace) -> None:
 
 
 def cmd_metrics(args: argparse.Namespace) -> None:
-    path = settings.metrics_dir / "rag_metrics.jsonl"
-    if not path.exists():
+    from .metrics_log import METRICS_FILE, aggregate, count_records, iter_records, parse_window, rotated_files, tail_records
+
+    path = settings.metrics_dir / METRICS_FILE
+    rotated = rotated_files(settings.metrics_dir)
+    if not path.exists() and not rotated:
         print("No metrics file found yet.")
         return
 
-    lines = path.read_text(encoding="utf-8").splitlines()
-    total = len(lines)
-    n = min(args.n, total)
+    if args.stats:
+        since = datetime.now() - parse_window(args.window)
+        agg = aggregate(iter_records(settings.metrics_dir, since=since))
+        print(f"Last {args.window} ({agg['first'] or '-'} .. {agg['last'] or '-'}): {agg['records']} records\n")
+        for key in ("top_score_p50", "top_score_p95", "citation_rate", "error_rate", "prompt_tokens_mean", "prompt_tokens_saved"):
+            value = agg[key]
+            print(f"{key:19s} {'-' if value is None else value}")
+        return
 
-    print(f"Total records: {total} | Showing last {n}\n")
+    last = tail_records(settings.metrics_dir, args.n)
+    total = count_records(path)
+    print(f"Records in {path.name}: {total} (+{len(rotated)} rotated files) | Showing last {len(last)}\n")
 
-    last = [json.loads(x) for x in lines[-n:]]
     for rec in last:
         ts = rec.get("timestamp", "?")
         score = float(rec.get("top_score", 0.0))
@@ -87,6 +123,75 @@ def cmd_metrics(args: argparse.Namespace) -> None:
         print(f"- {ts} | score={score:.3f} | cite={cite} | q={q}")
 
 
+def cmd_bench(args: argparse.Namespace) -> None:
+    from pathlib import Path
+
+    from .bench import SUITES, BenchConfig, compare, run_bench, write_report
+
+    suites = [s for s in args.suites.split(",") if s] if args.suites else list(SUITES)
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        raise SystemExit(f"Unknown suites: {', '.join(sorted(unknown))} (choose from {', '.join(SUITES)})")
+
+    cfg = BenchConfig(
+        suites=suites,
+        sizes=args.sizes,
+        dim=args.dim,
+        queries=args.queries,
+        docs=args.docs,
+        embed_latency_ms=args.embed_latency_ms,
+        chat_ttft_ms=args.chat_ttft_ms,
+        ask_requests=args.requests,
+        concurrency=args.concurrency,
+    )
+    report = run_bench(cfg)
+    out = Path(args.out or settings.metrics_dir / f"bench-{datetime.now():%Y%m%d-%H%M%S}.json")
+    write_report(report, out)
+
+    print()
+    print(json.dumps(report["results"], indent=2))
+    print(f"\nReport written to {out}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions vs {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%}).")
+
+
+def cmd_loadtest(args: argparse.Namespace) -> None:
+    from pathlib import Path
+
+    from .bench import write_report
+    from .loadtest import LoadConfig, format_report, parse_mix, run_load
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    cfg = LoadConfig(
+        url=args.url,
+        sessions=args.sessions,
+        users=args.users,
+        docs=args.docs,
+        questions=args.questions,
+        mix=mix,
+        embed_latency_ms=args.embed_latency_ms,
+        chat_ttft_ms=args.chat_ttft_ms,
+    )
+    report = run_load(cfg)
+    out = Path(args.out or settings.metrics_dir / f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json")
+    write_report(report, out)
+
+    print()
+    print(format_report(report))
+    print(f"\nReport written to {out}")
+
+
 def cmd_doctor(_: argparse.Namespace) -> None:
     print("== RAG Doctor ==")
 
@@ -113,8 +218,13 @@ def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(prog="rag", description="Production RAG CLI")
     sub = parser.add_subparsers(dest="cmd", required=True)
 
-    sub.add_parser("ingest", help="Ingest and chunk documents").set_defaults(func=cmd_ingest)
-    sub.add_parser("build", help="Build embedding cache").set_defaults(func=cmd_build)
+    ingest = sub.add_parser("ingest", help="Ingest and chunk documents")
+    ingest.add_argument("--workers", type=int, default=0, help="Text-extraction processes (default: settings.ingest_workers, else CPU count)")
+    ingest.add_argument("--timings", type=int, default=10, help="Show per-file extraction time for the N slowest files")
+    ingest.set_defaults(func=cmd_ingest)
+    build = sub.add_parser("build", help="Build embedding cache")
+    build.add_argument("--concurrency", type=int, default=settings.embed_concurrency, help="Embedding requests in flight (default: settings.embed_concurrency)")
+    build.set_defaults(func=cmd_build)
 
     ask = sub.add_parser("ask", help="Ask a question (single-shot)")
     ask.add_argument("query", type=str, help="Your question in quotes")
@@ -125,8 +235,37 @@ def build_parser() -> argparse.ArgumentParser:
 
     m = sub.add_parser("metrics", help="Show recent evaluation metrics")
     m.add_argument("-n", type=int, default=10, help="How many recent records to show")
+    m.add_argument("--stats", action="store_true", help="Aggregates (p50/p95 top_score, citation and error rate) instead of records")
+    m.add_argument("--window", default="24h", help="Time window for --stats, e.g. 30m, 24h, 7d (default: 24h)")
     m.set_defaults(func=cmd_metrics)
 
+    bench = sub.add_parser("bench", help="Offline benchmarks against a local fake NVIDIA backend (JSON report)")
+    bench.add_argument("--suites", default="", help="Comma-separated subset of chunking,retrieval,build,ask (default: all)")
+    bench.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Synthetic corpus sizes for retrieval")
+    bench.add_argument("--dim", type=int, default=256, help="Vector dimension for retrieval")
+    bench.add_argument("--queries", type=int, default=200, help="Queries per retrieval size")
+    bench.add_argument("--docs", type=int, default=50, help="Synthetic documents for build / ask")
+    bench.add_argument("--requests", type=int, default=200, help="/ask requests")
+    bench.add_argument("--concurrency", type=int, default=8, help="Concurrent /ask requests")
+    bench.add_argument("--embed-latency-ms", type=float, default=0.0, help="Injected latency per fake embeddings call")
+    bench.add_argument("--chat-ttft-ms", type=float, default=0.0, help="Injected fake chat time to first token")
+    bench.add_argument("--out", default="", help="Report path (default: metrics/bench-<time>.json)")
+    bench.add_argument("--baseline", default="", help="Earlier report; exit 1 if anything regressed")
+    bench.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown vs --baseline")
+    bench.set_defaults(func=cmd_bench)
+
+    load = sub.add_parser("loadtest", help="Concurrent multi-session upload/build/ask load against the server")
+    load.add_argument("--url", default="", help="Running server (default: start one on a local fake backend)")
+    load.add_argument("--sessions", type=int, default=100, help="Session workflows to run")
+    load.add_argument("--users", type=int, default=16, help="Sessions in flight at once")
+    load.add_argument("--docs", type=int, default=3, help="Documents uploaded per session")
+    load.add_argument("--questions", type=int, default=5, help="Questions per session")
+    load.add_argument("--mix", default="ask=0.5,ask_stream=0.2,chat=0.3", help="Question mix over ask, ask_stream, chat")
+    load.add_argument("--embed-latency-ms", type=float, default=20.0, help="Fake backend latency per embeddings call")
+    load.add_argument("--chat-ttft-ms", type=float, default=100.0, help="Fake backend chat time to first token")
+    load.add_argument("--out", default="", help="Report path (default: metrics/loadtest-<time>.json)")
+    load.set_defaults(func=cmd_loadtest)
+
     sub.add_parser("doctor", help="Check environment + files").set_defaults(func=cmd_doctor)
 
     return parser
@@ -135,7 +274,11 @@ def build_parser() -> argparse.ArgumentParser:
 def main(argv: List[str] | None = None) -> None:
     parser = build_parser()
     args = parser.parse_args(argv)
-    args.func(args)
+    try:
+        args.func(args)
+    finally:
+        # Every command shares one pooled HTTP client; close it on the way out.
+        close_clients()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,72 @@
+import threading
+from typing import Optional
+
+import httpx
+
+from .config import settings
+
+# HTTP/2 needs the optional "h2" package (pip install "httpx[http2]").
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_client: Optional[httpx.Client] = None
+_async_client: Optional[httpx.AsyncClient] = None
+_lock = threading.Lock()
+
+
+def _pool_kwargs() -> dict:
+    return {
+        "timeout": httpx.Timeout(settings.http_timeout, connect=settings.http_connect_timeout),
+        "limits": httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive,
+            keepalive_expiry=settings.http_keepalive_expiry,
+        ),
+        "http2": settings.http2 and HTTP2_AVAILABLE,
+    }
+
+
+def get_client() -> httpx.Client:
+    """
+    Process-wide pooled client for the NVIDIA endpoints. Connections (and their
+    TLS sessions) are kept alive and reused across embedding and chat calls.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        with _lock:
+            if _client is None or _client.is_closed:
+                _client = httpx.Client(**_pool_kwargs())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """
+    Async counterpart of get_client(). It is bound to the event loop that first
+    uses it, so only use it from one loop (the server's).
+    """
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        with _lock:
+            if _async_client is None or _async_client.is_closed:
+                _async_client = httpx.AsyncClient(**_pool_kwargs())
+    return _async_client
+
+
+def close_clients() -> None:
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+async def aclose_clients() -> None:
+    global _async_client
+    close_clients()
+    with _lock:
+        client, _async_client = _async_client, None
+    if client is not None:
+        await client.aclose()
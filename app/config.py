@@ -2,11 +2,26 @@ from dataclasses import dataclass
 from typing import Dict, Any
 from pathlib import Path
 import json
+import os
 
 @dataclass(frozen=True)
 class Settings:
     # --- NVIDIA endpoints ---
-    base_url: str = "https://integrate.api.nvidia.com/v1"
+    base_url: str = os.getenv("NVIDIA_BASE_URL", "https://integrate.api.nvidia.com/v1")
+    
+    # --- HTTP client pool (shared by embeddings + chat) ---
+    http_timeout: float = 60.0
+    http_connect_timeout: float = 10.0
+    http_max_connections: int = 20
+    http_max_keepalive: int = 10
+    http_keepalive_expiry: float = 30.0
+    http2: bool = True
+    
+    # --- Bulk embedding (index builds) ---
+    embed_batch_size: int = 32      # texts per embeddings request
+    embed_concurrency: int = 4      # requests in flight
+    embed_max_retries: int = 5      # on 429 / 5xx / transport errors
+    embed_backoff_base: float = 0.5  # seconds; doubled per attempt
     
     # --- Models ---
     embed_model: str = "nvidia/nv-embedqa-e5-v5"
@@ -15,15 +30,87 @@ class Settings:
     # --- Retrieval ---
     top_k: int = 3
     
+    # --- Hybrid lexical retrieval (BM25) ---
+    retrieval_mode: str = "hybrid"   # "hybrid" (dense + BM25 via reciprocal-rank fusion) or "dense"
+    rrf_k: int = 60                  # RRF constant: score = sum 1 / (rrf_k + rank)
+    hybrid_candidates: int = 50      # candidates taken from each ranking before fusion
+    lexical_fast_path: bool = True   # identifier-like queries (codes, IDs) skip the embeddings call
+    bm25_k1: float = 1.2
+    bm25_b: float = 0.75
+    
+    # --- Index backend ---
+    index_backend: str = "exact"  # "exact" (brute force) or "ivf" (approximate)
+    ivf_nlist: int = 0            # 0 = auto (~4*sqrt(num_chunks))
+    ivf_nprobe: int = 8           # lists scanned per query; higher = better recall, slower
+    
+    # --- Vector storage (exact backend) ---
+    vector_storage: str = "float32"  # "float32", or "float16"/"int8" to score on compact codes
+    rescore_factor: int = 10         # k * rescore_factor candidates rescored in float32
+    mmap_vectors: bool = True        # memory-map vector files (shared page cache across workers)
+    
     # Confidence thresholds
     confident_score : float = 0.25
     confident_score_vague: float = 0.35  # for "he/his/she" type queries
     
     # --- Paths ---
     project_root = Path(__file__).resolve().parents[1]
+    cache_root = Path(os.getenv("RAG_CACHE_DIR", project_root / "cache"))  # env: isolate benchmark / load-test runs
     data_dir: Path = project_root / "data"/ "public_docs"
-    cache_dir: Path = project_root / "cache"
-    metrics_dir: Path = project_root / "metrics"
-    chunks_file: Path = project_root / "cache" / "chunks.json"
+    cache_dir: Path = cache_root
+    metrics_dir: Path = Path(os.getenv("RAG_METRICS_DIR", project_root / "metrics"))
+    chunks_file: Path = cache_root / "chunks.json"
+    chunk_store: bool = True         # serve chunks from a memory-mapped binary store (texts read lazily)
+    
+    # --- Embedding store (content-addressed, per chunk) ---
+    embed_store: bool = True
+    embed_store_path: Path = cache_root / "embeddings.sqlite"
+    
+    # --- Extraction cache (cleaned text + chunks per file content hash) ---
+    extract_cache: bool = True
+    extract_cache_path: Path = cache_root / "extract.sqlite"
+    
+    # --- Query embedding cache ---
+    query_cache_size: int = 1024     # in-process LRU entries; 0 disables
+    query_cache_ttl: float = 0.0     # seconds; 0 = no expiry
+    query_cache_disk: bool = False   # also persist query vectors in the embedding store
+    
+    # --- Query embedding micro-batching (server) ---
+    query_batch_window_ms: float = 5.0   # max wait to coalesce concurrent queries; 0 = off
+    query_batch_max: int = 32            # flush early once this many are waiting
+    query_batch_in_flight: int = 4       # coalesced embeddings calls running at once
+    
+    # --- Semantic answer cache (/ask) ---
+    answer_cache: bool = True
+    answer_cache_threshold: float = 0.95   # min cosine between query embeddings to reuse an answer
+    answer_cache_bytes: int = 32 * 2**20   # LRU size budget
+    
+    # --- Ingestion ---
+    ingest_workers: int = 0        # text-extraction processes; 0 = os.cpu_count()
+    pdf_pages_per_task: int = 64   # PDFs longer than this are extracted in page ranges in parallel
+    
+    # --- Background index builds (server) ---
+    build_workers: int = 2   # concurrent /build jobs; the rest queue
+    
+    # --- Session stores (server) ---
+    session_cache_bytes: int = 1 * 2**30   # resident (chunks + vectors) budget; evicted sessions reload from disk
+    session_ttl: float = 0.0               # seconds idle before a session is evicted; 0 = never
+    session_chat_bytes: int = 64 * 2**20   # chat history budget (not persisted: evicted history is gone)
+    session_chat_ttl: float = 24 * 3600.0
+    
+    # --- Prompt packing (estimated tokens, see prompt.estimate_tokens) ---
+    prompt_packing: bool = True        # merge adjacent chunks, drop repeated overlap, best hits first
+    prompt_token_budget: int = 3000    # whole RAG prompt (rules + sources + question); 0 = no limit
+    history_token_budget: int = 1000   # chat history sent with /chat and the agent; 0 = no limit
+    
+    # --- Request tracing (per-stage timings in rag_metrics.jsonl) ---
+    tracing: bool = True        # off: spans are no-ops and records carry no stages_ms
+    stream_usage: bool = True   # ask for token usage on streamed answers (stream_options.include_usage)
+    
+    # --- Metrics log (rag_metrics.jsonl) ---
+    metrics_flush_seconds: float = 1.0      # background writer batches records this long; 0 = write inline
+    metrics_max_bytes: int = 64 * 2**20     # rotate past this size; 0 = no size limit
+    metrics_rotate_seconds: float = 0.0     # also rotate after this long; 0 = never
+    metrics_compress: bool = True           # gzip rotated files
+    metrics_keep: int = 10                  # rotated files kept; 0 = keep all
     
 settings = Settings()
\ No newline at end of file
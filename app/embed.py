@@ -1,17 +1,20 @@
+import asyncio
 import os
-from typing import List
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Tuple, Dict, Any, Callable, Optional
 import numpy as np
 import httpx
 
 from .config import settings
+from .clients import get_client, get_async_client
+from .tracing import record_usage
+from .telemetry import EMBED_ERRORS, EMBED_LATENCY, EMBED_RETRIES
 
 
-def embed_texts(texts: List[str], input_type: str) -> np.ndarray:
-    """
-    NVIDIA embeddings wrapper.
-    input_type: "query" or "passage"
-    Returns: np.ndarray shape (N, D)
-    """
+def _embed_request(texts: List[str], input_type: str) -> Tuple[Dict[str, str], Dict[str, Any]]:
     api_key = os.getenv("NVIDIA_API_KEY")
     if not api_key:
         raise RuntimeError("NVIDIA_API_KEY is not set in environment.")
@@ -22,12 +25,140 @@ def embed_texts(texts: List[str], input_type: str) -> np.ndarray:
         "input": texts,
         "input_type": input_type,
     }
+    return headers, payload
 
-    with httpx.Client(timeout=60) as client:
-        r = client.post(f"{settings.base_url}/embeddings", headers=headers, json=payload)
-        if r.status_code != 200:
-            raise RuntimeError(f"Embeddings error {r.status_code}: {r.text}")
-        data = r.json()
 
+def _parse_embeddings(data: Dict[str, Any]) -> np.ndarray:
     vectors = [item["embedding"] for item in data["data"]]
     return np.array(vectors, dtype=np.float32)
+
+
+def _is_retryable(status_code: int) -> bool:
+    return status_code == 429 or status_code >= 500
+
+
+def _retry_reason(r: Optional[httpx.Response]) -> str:
+    if r is None:
+        return "transport"
+    return "429" if r.status_code == 429 else "5xx"
+
+
+def _backoff_delay(attempt: int, r: Optional[httpx.Response]) -> float:
+    # Honour Retry-After when the server sends one, else exponential backoff with jitter.
+    if r is not None and r.headers.get("retry-after", "").isdigit():
+        return float(r.headers["retry-after"])
+    return settings.embed_backoff_base * (2 ** attempt) * (0.5 + random.random())
+
+
+def embed_texts(texts: List[str], input_type: str) -> np.ndarray:
+    """
+    NVIDIA embeddings wrapper.
+    input_type: "query" or "passage"
+    Retries 429/5xx and transport errors with backoff (settings.embed_max_retries).
+    Returns: np.ndarray shape (N, D)
+    """
+    headers, payload = _embed_request(texts, input_type)
+
+    for attempt in range(settings.embed_max_retries + 1):
+        r: Optional[httpx.Response] = None
+        t0 = time.perf_counter()
+        try:
+            r = get_client().post(f"{settings.base_url}/embeddings", headers=headers, json=payload)
+        except httpx.TransportError:
+            if attempt == settings.embed_max_retries:
+                EMBED_ERRORS.labels("transport").inc()
+                raise
+        finally:
+            EMBED_LATENCY.labels(input_type).observe(time.perf_counter() - t0)
+        if r is not None and not _is_retryable(r.status_code):
+            break
+        if attempt < settings.embed_max_retries:
+            EMBED_RETRIES.labels(_retry_reason(r)).inc()
+            time.sleep(_backoff_delay(attempt, r))
+
+    return _embed_result(r)
+
+
+def _embed_result(r: httpx.Response) -> np.ndarray:
+    if r.status_code != 200:
+        EMBED_ERRORS.labels(str(r.status_code)).inc()
+        raise RuntimeError(f"Embeddings error {r.status_code}: {r.text}")
+    data = r.json()
+    record_usage(data.get("usage"), prefix="embed_")
+    return _parse_embeddings(data)
+
+
+ProgressFn = Callable[[int, int], None]
+
+
+def embed_texts_bulk(
+    texts: List[str],
+    input_type: str,
+    batch_size: Optional[int] = None,
+    concurrency: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+) -> np.ndarray:
+    """
+    Embeds a large list of texts in batches with up to `concurrency` batches
+    in flight on the pooled client. Output rows are in input order no matter
+    which batch finishes first. Each batch retries like embed_texts.
+    progress(done_texts, total_texts) is called after every finished batch.
+    Returns: np.ndarray shape (N, D)
+    """
+    batch_size = batch_size or settings.embed_batch_size
+    concurrency = concurrency or settings.embed_concurrency
+    batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+    results: List[Optional[np.ndarray]] = [None] * len(batches)
+
+    done = 0
+    done_lock = threading.Lock()
+
+    def run(i: int) -> int:
+        nonlocal done
+        results[i] = embed_texts(batches[i], input_type)
+        with done_lock:
+            done += len(batches[i])
+            if progress is not None:
+                progress(done, len(texts))
+        return i
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency))
+    try:
+        futures = [pool.submit(run, i) for i in range(len(batches))]
+        for f in as_completed(futures):
+            f.result()  # surface the first failure
+    except BaseException:
+        # Don't keep paying for batches of a build that has already failed.
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+    pool.shutdown()
+
+    if not batches:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(results).astype(np.float32, copy=False)
+
+
+async def aembed_texts(texts: List[str], input_type: str) -> np.ndarray:
+    """
+    Async embed_texts on the shared async client, with the same retry policy.
+    """
+    headers, payload = _embed_request(texts, input_type)
+
+    for attempt in range(settings.embed_max_retries + 1):
+        r: Optional[httpx.Response] = None
+        t0 = time.perf_counter()
+        try:
+            r = await get_async_client().post(f"{settings.base_url}/embeddings", headers=headers, json=payload)
+        except httpx.TransportError:
+            if attempt == settings.embed_max_retries:
+                EMBED_ERRORS.labels("transport").inc()
+                raise
+        finally:
+            EMBED_LATENCY.labels(input_type).observe(time.perf_counter() - t0)
+        if r is not None and not _is_retryable(r.status_code):
+            break
+        if attempt < settings.embed_max_retries:
+            EMBED_RETRIES.labels(_retry_reason(r)).inc()
+            await asyncio.sleep(_backoff_delay(attempt, r))
+
+    return _embed_result(r)
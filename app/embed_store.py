@@ -0,0 +1,125 @@
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .embed import embed_texts_bulk
+
+EmbedFn = Callable[[List[str], str], np.ndarray]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """
+    Content-addressed embedding cache: (embed_model, input_type, sha256(text)) -> vector.
+    Backed by SQLite so rows are added incrementally and shared between processes.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                input_type TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vec BLOB NOT NULL,
+                PRIMARY KEY (model, input_type, text_hash)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get_many(self, model: str, input_type: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit.
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vec FROM embeddings WHERE model=? AND input_type=? AND text_hash IN ({marks})",
+                    [model, input_type, *part],
+                ).fetchall()
+                for h, blob in rows:
+                    found[h] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def put_many(self, model: str, input_type: str, hashes: List[str], vectors: np.ndarray) -> None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        rows = [(model, input_type, h, int(v.shape[0]), v.tobytes()) for h, v in zip(hashes, vectors)]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[EmbeddingStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> EmbeddingStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = EmbeddingStore(settings.embed_store_path)
+        return _store
+
+
+def embed_with_store(
+    texts: List[str],
+    input_type: str,
+    embed_fn: EmbedFn = embed_texts_bulk,
+    store: Optional[EmbeddingStore] = None,
+) -> Tuple[np.ndarray, int]:
+    """
+    Embeds texts, reusing stored vectors and calling embed_fn only for texts
+    not seen before (each distinct text is embedded once).
+    Returns: (vectors (N, D) in input order, number of texts actually embedded)
+    """
+    store = store or get_store()
+    model = settings.embed_model
+    hashes = [text_hash(t) for t in texts]
+    found = store.get_many(model, input_type, sorted(set(hashes)))
+
+    missing: Dict[str, str] = {}
+    for h, t in zip(hashes, texts):
+        if h not in found and h not in missing:
+            missing[h] = t
+
+    if missing:
+        new_hashes = list(missing)
+        new_vecs = embed_fn([missing[h] for h in new_hashes], input_type)
+        store.put_many(model, input_type, new_hashes, new_vecs)
+        for h, v in zip(new_hashes, np.asarray(new_vecs, dtype=np.float32)):
+            found[h] = v
+
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32), 0
+    return np.vstack([found[h] for h in hashes]).astype(np.float32, copy=False), len(missing)
+
+
+def embed_cached(texts: List[str], input_type: str, embed_fn: EmbedFn = embed_texts_bulk) -> np.ndarray:
+    """
+    Bulk embedding with the content-addressed store in front (or straight
+    through when settings.embed_store is off).
+    """
+    if not settings.embed_store:
+        return embed_fn(texts, input_type)
+    vectors, _ = embed_with_store(texts, input_type, embed_fn=embed_fn)
+    return vectors
@@ -1,7 +1,10 @@
-import json
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from .config import settings
+from .tracing import Trace, current_trace
+from .metrics_log import get_writer
 
 
 def is_vague_query(q: str) -> bool:
@@ -10,6 +13,21 @@ def is_vague_query(q: str) -> bool:
     return any(t in tokens for t in ["he", "his", "she", "her", "him", "they", "their", "this", "that"])
 
 
+def threshold_for(query: str) -> float:
+    return settings.confident_score_vague if is_vague_query(query) else settings.confident_score
+
+
+def is_exact_match(retrieved: List[Dict]) -> bool:
+    # Lexical fast path hits (retrieve.lexical_only_retrieve): no cosine score to threshold.
+    return bool(retrieved) and retrieved[0].get("match") == "exact"
+
+
+def is_confident(query: str, retrieved: List[Dict]) -> bool:
+    if is_exact_match(retrieved):
+        return True
+    return bool(retrieved) and float(retrieved[0]["score"]) >= threshold_for(query)
+
+
 def evaluate(query: str, retrieved: List[Dict], answer: str, threshold_used: float) -> Dict:
     top_score = float(retrieved[0]["score"]) if retrieved else 0.0
     answer_text = answer if isinstance(answer, str) else ""
@@ -22,6 +40,7 @@ def evaluate(query: str, retrieved: List[Dict], answer: str, threshold_used: flo
         "num_chunks": len(retrieved),
         "threshold_used": threshold_used,
         "vague_query": is_vague_query(query),
+        "exact_match": is_exact_match(retrieved),
         "has_citation": has_citation,
         "error": error,
         "answer_len": len(answer_text),
@@ -29,12 +48,17 @@ def evaluate(query: str, retrieved: List[Dict], answer: str, threshold_used: flo
     }
 
 
-def log_metrics(metrics_dir: Path, record: Dict) -> Path:
-    metrics_dir.mkdir(parents=True, exist_ok=True)
-    out_path = metrics_dir / "rag_metrics.jsonl"
+def log_metrics(metrics_dir: Path, record: Dict, trace: Optional[Trace] = None) -> Path:
+    """
+    Queues record for rag_metrics.jsonl (written in batches by a background
+    thread, see metrics_log.MetricsWriter), with the stage timings and token usage
+    of trace (default: the current request's trace, if tracing is on).
+    """
+    trace = trace or current_trace()
+    if trace is not None:
+        record.update(trace.to_record())
     record["timestamp"] = datetime.now().isoformat(timespec="seconds")
 
-    with out_path.open("a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
-
-    return out_path
+    writer = get_writer(metrics_dir)
+    writer.write(record)
+    return writer.path
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from .config import settings
+
+# Bump when clean_text / read_file_text change, so cached text is re-extracted.
+EXTRACT_VERSION = 1
+
+
+def file_hash(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    """
+    Content-addressed cache of document extraction results:
+      sha256(file bytes) -> cleaned text
+      (sha256, chunker, chunk_size, overlap) -> chunk texts
+    plus a (path, size, mtime) -> sha256 table so unchanged files aren't even re-hashed.
+    SQLite, like the embedding store, so CLI runs and server builds share it.
+    """
+
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS file_hashes (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                file_hash TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS texts (
+                file_hash TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (file_hash, version)
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                file_hash TEXT NOT NULL,
+                chunker TEXT NOT NULL,
+                pieces TEXT NOT NULL,
+                PRIMARY KEY (file_hash, chunker)
+            );
+            """
+        )
+        self._conn.commit()
+
+    def hash_file(self, path: Path) -> str:
+        st = path.stat()
+        key = str(path.resolve())
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT file_hash FROM file_hashes WHERE path=? AND size=? AND mtime_ns=?",
+                (key, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row:
+            return row[0]
+        h = file_hash(path)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)", (key, st.st_size, st.st_mtime_ns, h))
+            self._conn.commit()
+        return h
+
+    def get_texts(self, hashes: List[str]) -> Dict[str, str]:
+        found: Dict[str, str] = {}
+        with self._lock:
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT file_hash, text FROM texts WHERE version=? AND file_hash IN ({marks})",
+                    [EXTRACT_VERSION, *part],
+                ).fetchall()
+                found.update(rows)
+        return found
+
+    def put_texts(self, items: List[Tuple[str, str]]) -> None:
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO texts VALUES (?, ?, ?)", [(h, EXTRACT_VERSION, t) for h, t in items]
+            )
+            self._conn.commit()
+
+    def get_pieces(self, hash_: str, chunker: str) -> Optional[List[str]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT pieces FROM chunks WHERE file_hash=? AND chunker=?", (hash_, chunker)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_pieces(self, hash_: str, chunker: str, pieces: List[str]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks VALUES (?, ?, ?)", (hash_, chunker, json.dumps(pieces, ensure_ascii=False))
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[ExtractionCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_extract_cache() -> Optional[ExtractionCache]:
+    """
+    The shared cache, or None when settings.extract_cache is off.
+    """
+    global _cache
+    if not settings.extract_cache:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExtractionCache(settings.extract_cache_path)
+        return _cache
+
+
+def chunker_key(name: str, chunk_size: int, overlap: int) -> str:
+    return f"{name}:v{EXTRACT_VERSION}:{chunk_size}:{overlap}"
+
+
+def cached_pieces(hash_: str, chunker: str, text: str, chunk_fn: Callable[[str], List[str]]) -> List[str]:
+    """
+    chunk_fn(text), memoized on (file hash, chunker key) when the cache is on.
+    """
+    cache = get_extract_cache()
+    if cache is None or not hash_:
+        return chunk_fn(text)
+    pieces = cache.get_pieces(hash_, chunker)
+    if pieces is None:
+        pieces = chunk_fn(text)
+        cache.put_pieces(hash_, chunker, pieces)
+    return pieces
+
+
+def cached_file_hash(path: Path) -> str:
+    """
+    sha256 of the file, memoized on (path, size, mtime) when the cache is on.
+    """
+    cache = get_extract_cache()
+    return cache.hash_file(path) if cache is not None else file_hash(path)
@@ -0,0 +1,153 @@
+# app/fake_backend.py
+# Local stand-in for the NVIDIA Integrate API, for tests and benchmarks without an API key.
+#
+#   uvicorn app.fake_backend:app --port 9000
+#   NVIDIA_BASE_URL=http://127.0.0.1:9000/v1 NVIDIA_API_KEY=fake rag build
+#
+# Knobs (env):
+#   FAKE_EMBED_DIM          embedding dimension (default 1024)
+#   FAKE_EMBED_LATENCY_MS   added latency per embeddings request (default 0)
+#   FAKE_ERROR_RATE         fraction of requests answered with 429 (default 0)
+#   FAKE_CHAT_TTFT_MS       delay before the first chat token (default 0)
+#   FAKE_CHAT_TOKEN_MS      delay between streamed chat tokens (default 0)
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "1024"))
+EMBED_LATENCY_MS = float(os.getenv("FAKE_EMBED_LATENCY_MS", "0"))
+ERROR_RATE = float(os.getenv("FAKE_ERROR_RATE", "0"))
+CHAT_TTFT_MS = float(os.getenv("FAKE_CHAT_TTFT_MS", "0"))
+CHAT_TOKEN_MS = float(os.getenv("FAKE_CHAT_TOKEN_MS", "0"))
+
+TOKEN_RE = re.compile(r"\w+")
+SOURCE_TAG_RE = re.compile(r"^\[([^\]\n]+#\d+)\]$", re.MULTILINE)
+
+app = FastAPI(title="Fake NVIDIA API")
+
+
+def fake_embedding(text: str, dim: int = EMBED_DIM) -> np.ndarray:
+    """
+    Deterministic hashed bag-of-words vector: texts sharing words get similar
+    vectors, so retrieval over fake embeddings still behaves sensibly.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for tok in TOKEN_RE.findall(text.lower()):
+        h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += 1.0 if (h >> 63) else -1.0
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+def count_tokens(text: str) -> int:
+    return len(TOKEN_RE.findall(text))
+
+
+def chat_usage(messages: List[Dict[str, str]], answer: str) -> Dict[str, int]:
+    prompt_tokens = sum(count_tokens(m.get("content", "")) for m in messages)
+    completion_tokens = count_tokens(answer)
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def maybe_rate_limited() -> JSONResponse | None:
+    if ERROR_RATE and random.random() < ERROR_RATE:
+        return JSONResponse(status_code=429, content={"error": "rate limited (fake)"}, headers={"retry-after": "0"})
+    return None
+
+
+@app.get("/v1/models")
+async def models():
+    # Also the readiness probe of app.bench.
+    return {"object": "list", "data": [{"id": "fake-embed", "object": "model"}, {"id": "fake-chat", "object": "model"}]}
+
+
+@app.post("/v1/embeddings")
+async def embeddings(payload: Dict[str, Any]):
+    limited = maybe_rate_limited()
+    if limited is not None:
+        return limited
+    if EMBED_LATENCY_MS:
+        await asyncio.sleep(EMBED_LATENCY_MS / 1000)
+
+    texts: List[str] = payload.get("input", [])
+    data = [{"index": i, "embedding": fake_embedding(t).tolist()} for i, t in enumerate(texts)]
+    tokens = sum(count_tokens(t) for t in texts)
+    return {
+        "object": "list",
+        "model": payload.get("model"),
+        "data": data,
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+def canned_answer(messages: List[Dict[str, str]]) -> str:
+    """
+    A citation-shaped answer built from the first source tag in the prompt,
+    so citation checks in evaluate() see realistic output.
+    """
+    prompt = messages[-1]["content"] if messages else ""
+    tags = SOURCE_TAG_RE.findall(prompt)
+    if not tags:
+        return "I don't know."
+    return f"This is a canned answer from the local fake backend [{tags[0]}]."
+
+
+def _chunk(content: str, model: str, finish: str | None = None) -> str:
+    data = {
+        "object": "chat.completion.chunk",
+        "model": model,
+        "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(data)}\n\n"
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(payload: Dict[str, Any]):
+    limited = maybe_rate_limited()
+    if limited is not None:
+        return limited
+
+    model = payload.get("model", "fake")
+    messages = payload.get("messages", [])
+    answer = canned_answer(messages)
+    words = answer.split(" ")
+
+    if not payload.get("stream"):
+        await asyncio.sleep((CHAT_TTFT_MS + CHAT_TOKEN_MS * len(words)) / 1000)
+        return {
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}],
+            "usage": chat_usage(messages, answer),
+        }
+
+    async def events():
+        await asyncio.sleep(CHAT_TTFT_MS / 1000)
+        for i, w in enumerate(words):
+            if i and CHAT_TOKEN_MS:
+                await asyncio.sleep(CHAT_TOKEN_MS / 1000)
+            yield _chunk(w if i == 0 else " " + w, model)
+        yield _chunk("", model, finish="stop")
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            usage = {"object": "chat.completion.chunk", "model": model, "choices": [], "usage": chat_usage(messages, answer)}
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
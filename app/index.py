@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple, Union
+
+import numpy as np
+
+# Row buffers are aligned to a cache line so BLAS can use aligned loads.
+ALIGNMENT = 64
+
+
+def aligned_empty(shape: Tuple[int, ...], dtype: Any = np.float32, align: int = ALIGNMENT) -> np.ndarray:
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    raw = np.empty(nbytes + align, dtype=np.uint8)
+    offset = (-raw.ctypes.data) % align
+    return raw[offset:offset + nbytes].view(dtype).reshape(shape)
+
+
+def normalize_rows(vecs: np.ndarray) -> np.ndarray:
+    """
+    Returns a C-contiguous, aligned float32 copy of vecs with unit-length rows.
+    """
+    vecs = np.asarray(vecs, dtype=np.float32)
+    if vecs.ndim == 1:
+        vecs = vecs[None, :]
+    out = aligned_empty(vecs.shape, np.float32)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    np.divide(vecs, norms + 1e-12, out=out)
+    return out
+
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores along the last axis, best first.
+    argpartition selects the winners in O(N); only those k get sorted.
+    Works for (N,) and (Q, N) score arrays.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.intp)
+
+    if k < n:
+        part = np.argpartition(scores, n - k, axis=-1)[..., n - k:]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+
+    top = np.take_along_axis(scores, part, axis=-1)
+    order = np.argsort(-top, axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+class VectorIndex:
+    """
+    Chunk vectors stored once as unit-normalized float32 rows.
+    Cosine scoring against a query is then a single matmul/GEMV.
+    """
+
+    def __init__(self, vectors: np.ndarray, normalized: bool = False, fingerprint: str = ""):
+        if normalized:
+            self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        else:
+            self.vectors = normalize_rows(vectors)
+        # Content fingerprint of the indexed chunks ("" if unknown); identifies the index version.
+        self.fingerprint = fingerprint
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.vectors.shape
+
+    @property
+    def dim(self) -> int:
+        return int(self.vectors.shape[1])
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.vectors.nbytes)
+
+    def __len__(self) -> int:
+        return int(self.vectors.shape[0])
+
+    def scores(self, query_vecs: np.ndarray) -> np.ndarray:
+        """
+        query_vecs: (Q, D) raw query embeddings.
+        Returns: (Q, N) cosine scores.
+        """
+        q = normalize_rows(query_vecs)
+        return q @ self.vectors.T
+
+    def search(self, query_vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Exact brute-force search. This is the interface every backend implements.
+        Returns: (scores, ids), both (Q, k), best first. Backends that find
+        fewer than k candidates pad ids with -1.
+        """
+        scores = self.scores(query_vecs)
+        ids = top_k_indices(scores, k)
+        return np.take_along_axis(scores, ids, axis=-1), ids
+
+
+def as_index(vecs: Union[np.ndarray, VectorIndex]) -> VectorIndex:
+    if isinstance(vecs, VectorIndex):
+        return vecs
+    return VectorIndex(vecs)
+
+
+def atomic_write(path: Path, write) -> None:
+    """
+    write(f) into a sibling temp file, then rename it over path: readers see
+    the old file or the new one, never a partial write.
+    """
+    # Never truncate a file in place: other processes may have it memory-mapped,
+    # and shrinking a mapped file under them is a SIGBUS. Write a sibling and swap.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp.open("wb") as f:
+        write(f)
+    os.replace(tmp, path)
+
+
+def save_index(index: VectorIndex, vec_path: Path, meta_path: Path, meta: Optional[Dict[str, Any]] = None) -> None:
+    atomic_write(vec_path, lambda f: np.save(f, index.vectors))
+    meta = dict(meta or {})
+    meta.update({"normalized": True, "num_vectors": len(index), "dim": index.dim})
+    if index.fingerprint:
+        meta.setdefault("fingerprint", index.fingerprint)
+    atomic_write(meta_path, lambda f: f.write(json.dumps(meta, indent=2).encode("utf-8")))
+
+
+def load_index(vec_path: Path, meta_path: Path, mmap: bool = False) -> VectorIndex:
+    """
+    Loads a saved index. Caches written before vectors were stored normalized
+    have no "normalized" flag in their meta; those are normalized once and
+    rewritten in place so later loads skip the work.
+    mmap=True maps the file read-only instead of reading it into RAM: loading
+    is O(1) in the index size and every process on the host shares the same
+    page-cached copy.
+    """
+    meta: Dict[str, Any] = {}
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+
+    fingerprint = meta.get("fingerprint", "")
+    if not meta.get("normalized"):
+        index = VectorIndex(np.load(vec_path), fingerprint=fingerprint)
+        save_index(index, vec_path, meta_path, meta)
+        if not mmap:
+            return index
+
+    vecs = np.load(vec_path, mmap_mode="r" if mmap else None)
+    return VectorIndex(vecs, normalized=True, fingerprint=fingerprint)
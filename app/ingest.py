@@ -1,15 +1,31 @@
+import multiprocessing
+import os
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional, Tuple
 
 from .config import settings
+from .extract_cache import get_extract_cache
 
 @dataclass
 class Document:
     doc_id: str
     source: str
     text: str   
+    extract_seconds: float = 0.0
+    content_hash: str = ""
+
+@dataclass
+class ExtractedFile:
+    path: Path
+    text: str        # cleaned
+    seconds: float   # extraction time summed over all of the file's tasks
+    tasks: int = 1   # >1 when a big PDF was split into page ranges
+    content_hash: str = ""   # sha256 of the file bytes ("" when the extraction cache is off)
+    cached: bool = False     # text came from the extraction cache
     
 def clean_text(text: str) -> str:
     """Basic text cleaning."""
@@ -33,7 +49,111 @@ def read_file_text(file_path: Path)-> str:
         return clean_text("\n".join(pages))
     raise ValueError(f"Unsupported file type: {ext}")
 
-def load_documents() -> List[Document]:
+def read_pdf_pages(file_path: Path, start: int, stop: int) -> str:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return "\n".join(doc[i].get_text("text") for i in range(start, stop))
+
+def pdf_page_count(file_path: Path) -> int:
+    import fitz
+    with fitz.open(file_path) as doc:
+        return len(doc)
+
+# Below this much input, starting worker processes costs more than it saves.
+PARALLEL_MIN_BYTES = 4 * 2**20
+
+# (path, first page, stop page); pages are None for whole-file tasks
+Task = Tuple[Path, Optional[int], Optional[int]]
+
+def _run_task(task: Task) -> Tuple[str, float]:
+    path, start, stop = task
+    t0 = time.perf_counter()
+    if start is None:
+        text = read_file_text(path)
+    else:
+        text = read_pdf_pages(path, start, stop)
+    return text, time.perf_counter() - t0
+
+def _plan_tasks(files: List[Path], pages_per_task: int) -> List[Tuple[int, Task]]:
+    """
+    One task per file, except PDFs with more than pages_per_task pages, which
+    are split into page ranges so one huge PDF doesn't serialize the pool.
+    """
+    tasks: List[Tuple[int, Task]] = []
+    for i, p in enumerate(files):
+        n_pages = pdf_page_count(p) if p.suffix.lower() == ".pdf" and pages_per_task > 0 else 0
+        if n_pages > pages_per_task:
+            for start in range(0, n_pages, pages_per_task):
+                tasks.append((i, (p, start, min(start + pages_per_task, n_pages))))
+        else:
+            tasks.append((i, (p, None, None)))
+    return tasks
+
+def default_workers() -> int:
+    return settings.ingest_workers or os.cpu_count() or 1
+
+def extract_files(files: List[Path], workers: Optional[int] = None, pages_per_task: Optional[int] = None) -> List[ExtractedFile]:
+    """
+    Cleaned text for each file, in the order of `files`. Files whose content
+    hash is in the extraction cache are not parsed again; the rest go through
+    _extract_uncached and are added to the cache.
+    """
+    cache = get_extract_cache()
+    if cache is None:
+        return _extract_uncached(files, workers, pages_per_task)
+
+    hashes = [cache.hash_file(p) for p in files]
+    known = cache.get_texts(sorted(set(hashes)))
+    todo = [i for i, h in enumerate(hashes) if h not in known]
+    fresh = _extract_uncached([files[i] for i in todo], workers, pages_per_task)
+    if fresh:
+        cache.put_texts(list({hashes[i]: f.text for i, f in zip(todo, fresh)}.items()))
+
+    out: List[Optional[ExtractedFile]] = [None] * len(files)
+    for i, f in zip(todo, fresh):
+        f.content_hash = hashes[i]
+        out[i] = f
+    for i, (p, h) in enumerate(zip(files, hashes)):
+        if out[i] is None:
+            out[i] = ExtractedFile(path=p, text=known[h], seconds=0.0, tasks=0, content_hash=h, cached=True)
+    return out
+
+def _extract_uncached(files: List[Path], workers: Optional[int] = None, pages_per_task: Optional[int] = None) -> List[ExtractedFile]:
+    """
+    Extracts and cleans text from files on a process pool (parsing PDFs is
+    CPU-bound). Results are in the order of `files` regardless of which
+    worker finishes first; page ranges of a split PDF are rejoined in order.
+    workers <= 1, a single task or less than PARALLEL_MIN_BYTES of input runs in-process.
+    """
+    if not files:
+        return []
+    workers = workers or default_workers()
+    pages_per_task = settings.pdf_pages_per_task if pages_per_task is None else pages_per_task
+    tasks = _plan_tasks(files, pages_per_task)
+
+    if workers <= 1 or len(tasks) <= 1 or sum(p.stat().st_size for p in files) < PARALLEL_MIN_BYTES:
+        results = [_run_task(t) for _, t in tasks]
+    else:
+        # forkserver: forking a process that already runs threads (the API server,
+        # HTTP pools) can deadlock the child; spawn would re-import per worker.
+        method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), mp_context=multiprocessing.get_context(method)) as pool:
+            results = list(pool.map(_run_task, [t for _, t in tasks], chunksize=max(1, len(tasks) // (workers * 4))))
+
+    parts: List[List[str]] = [[] for _ in files]
+    seconds = [0.0] * len(files)
+    for (i, _), (text, secs) in zip(tasks, results):
+        parts[i].append(text)
+        seconds[i] += secs
+
+    out: List[ExtractedFile] = []
+    for i, p in enumerate(files):
+        # Whole-file tasks come back cleaned; page ranges are joined raw, then cleaned.
+        text = parts[i][0] if len(parts[i]) == 1 else clean_text("\n".join(parts[i]))
+        out.append(ExtractedFile(path=p, text=text, seconds=seconds[i], tasks=len(parts[i])))
+    return out
+
+def load_documents(workers: Optional[int] = None) -> List[Document]:
     data_dir = settings.data_dir
     if not data_dir.exists() or not data_dir.is_dir():
         raise ValueError(f"Data directory not found: {data_dir}")
@@ -42,10 +162,9 @@ def load_documents() -> List[Document]:
     files = [p for p in data_dir.rglob("*") if p.is_file() and p.suffix.lower() in exts]
 
     docs: List[Document] = []
-    for p in sorted(files):
-        text = read_file_text(p)
-        if len(text) < 50:
+    for f in extract_files(sorted(files), workers=workers):
+        if len(f.text) < 50:
             continue
-        docs.append(Document(doc_id=p.stem, source=str(p), text=text))
+        docs.append(Document(doc_id=f.path.stem, source=str(f.path), text=f.text, extract_seconds=f.seconds, content_hash=f.content_hash))
 
     return docs
\ No newline at end of file
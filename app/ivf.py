@@ -0,0 +1,135 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .index import VectorIndex, atomic_write, normalize_rows, top_k_indices
+
+# Rows scored per block when assigning vectors to centroids (bounds temp memory).
+ASSIGN_BLOCK = 65536
+
+
+def default_nlist(n: int) -> int:
+    """~4*sqrt(N) lists, the usual IVF starting point."""
+    return max(1, min(n, int(4 * np.sqrt(n))))
+
+
+def assign(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    out = np.empty(vectors.shape[0], dtype=np.int64)
+    for start in range(0, vectors.shape[0], ASSIGN_BLOCK):
+        block = vectors[start:start + ASSIGN_BLOCK]
+        out[start:start + ASSIGN_BLOCK] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iters: int = 10, sample: int = 64, seed: int = 0) -> np.ndarray:
+    """
+    k-means on unit vectors (cosine). Trains on at most nlist*sample rows.
+    Returns: (nlist, D) unit-normalized centroids.
+    """
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    train = vectors
+    if n > nlist * sample:
+        train = vectors[np.sort(rng.choice(n, nlist * sample, replace=False))]
+
+    centroids = train[rng.choice(train.shape[0], nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = assign(train, centroids)
+        counts = np.bincount(labels, minlength=nlist)
+        starts = np.cumsum(counts) - counts
+        nonempty = counts > 0
+        sums = np.zeros_like(centroids)
+        sums[nonempty] = np.add.reduceat(train[np.argsort(labels, kind="stable")], starts[nonempty], axis=0)
+
+        # Re-seed empty lists from random training rows.
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = train[rng.choice(train.shape[0], len(empty), replace=False)]
+        centroids = normalize_rows(sums)
+
+    return centroids
+
+
+class IVFIndex(VectorIndex):
+    """
+    Inverted-file index: a k-means coarse quantizer plus one inverted list of
+    row ids per centroid. A query is scored exactly against the rows of its
+    nprobe closest lists only, so cost is ~N*nprobe/nlist instead of N.
+
+    Lists are stored CSR-style: list_ids sorted by list, list_offsets[l] is
+    where list l starts.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        centroids: np.ndarray,
+        list_offsets: np.ndarray,
+        list_ids: np.ndarray,
+        nprobe: int = 8,
+    ):
+        super().__init__(vectors, normalized=True)
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(cls, base: VectorIndex, nlist: int = 0, nprobe: int = 8, iters: int = 10) -> "IVFIndex":
+        nlist = min(nlist or default_nlist(len(base)), len(base))
+        centroids = spherical_kmeans(base.vectors, nlist, iters=iters)
+        labels = assign(base.vectors, centroids)
+        list_ids = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        ivf = cls(base.vectors, centroids, list_offsets, list_ids, nprobe=nprobe)
+        ivf.fingerprint = base.fingerprint
+        return ivf
+
+    def search(self, query_vecs: np.ndarray, k: int, nprobe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        q = normalize_rows(query_vecs)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        probes = top_k_indices(q @ self.centroids.T, nprobe)
+
+        scores = np.full((q.shape[0], k), -np.inf, dtype=np.float32)
+        ids = np.full((q.shape[0], k), -1, dtype=np.int64)
+        for qi in range(q.shape[0]):
+            cand = np.concatenate(
+                [self.list_ids[self.list_offsets[l]:self.list_offsets[l + 1]] for l in probes[qi]]
+            )
+            cand_scores = self.vectors[cand] @ q[qi]
+            top = top_k_indices(cand_scores, k)
+            scores[qi, :len(top)] = cand_scores[top]
+            ids[qi, :len(top)] = cand[top]
+        return scores, ids
+
+    def save(self, path: Path) -> None:
+        atomic_write(
+            path, lambda f: np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids)
+        )
+
+    @classmethod
+    def load(cls, path: Path, base: VectorIndex, nprobe: int = 8) -> "IVFIndex":
+        data = np.load(path)
+        ivf = cls(base.vectors, data["centroids"], data["list_offsets"], data["list_ids"], nprobe=nprobe)
+        ivf.fingerprint = base.fingerprint
+        return ivf
+
+
+def build_or_load_ivf(base: VectorIndex, path: Path, nlist: int = 0, nprobe: int = 8) -> IVFIndex:
+    """
+    Loads the IVF structure saved at path if it matches base, else trains and saves it.
+    """
+    if path.exists():
+        ivf = IVFIndex.load(path, base, nprobe=nprobe)
+        if int(ivf.list_offsets[-1]) == len(base) and (not nlist or ivf.nlist == nlist):
+            return ivf
+
+    ivf = IVFIndex.build(base, nlist=nlist, nprobe=nprobe)
+    ivf.save(path)
+    return ivf
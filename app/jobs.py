@@ -0,0 +1,394 @@
+import json
+import os
+import re
+import socket
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore[assignment]
+    import msvcrt
+
+from .index import atomic_write
+from .telemetry import BUILD_DURATION
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+HOST = socket.gethostname()
+
+
+def _lock_file(f: Any) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:  # LK_LOCK gives up after ~10 s; keep waiting
+            continue
+
+
+def _unlock_file(f: Any) -> None:
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class FileLock:
+    """
+    Exclusive lock on a file, held across processes (uvicorn workers) as well
+    as threads: flock on POSIX, msvcrt.locking on Windows. Blocks until taken.
+    One instance per acquisition; the OS drops the lock if the holder dies.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._f: Any = None
+
+    def __enter__(self) -> "FileLock":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        f = self.path.open("a+b")
+        try:
+            _lock_file(f)
+        except BaseException:
+            f.close()
+            raise
+        self._f = f
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        f, self._f = self._f, None
+        try:
+            _unlock_file(f)
+        finally:
+            f.close()
+
+
+def _owner_alive(host: str, pid: int) -> bool:
+    """
+    Whether the process that owns a job may still run it. Only checkable for
+    this host on POSIX; anything else is assumed alive.
+    """
+    if host != HOST or fcntl is None or not pid:
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:  # exists, not ours to signal
+        return True
+    return True
+
+
+@dataclass
+class BuildJob:
+    job_id: str
+    session_id: str
+    key: str                       # what is being built (e.g. docs signature); equal keys share a job
+    status: str = QUEUED
+    stage: str = ""
+    done: int = 0                  # chunks embedded (or reused) so far
+    total: int = 0                 # chunks to embed
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    stage_started_at: Optional[float] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    host: str = HOST               # owning worker process
+    pid: int = field(default_factory=os.getpid)
+    finished: threading.Event = field(default_factory=threading.Event, repr=False, compare=False)
+    on_change: Optional[Callable[["BuildJob", bool], None]] = field(default=None, repr=False, compare=False)
+
+    def set_stage(self, stage: str, total: int = 0) -> None:
+        self.stage = stage
+        self.done = 0
+        self.total = total
+        self.stage_started_at = time.time()
+        if self.on_change is not None:
+            self.on_change(self, True)
+
+    def progress(self, done: int, total: int) -> None:
+        self.done = done
+        self.total = total
+        if self.on_change is not None:
+            self.on_change(self, False)
+
+    @property
+    def active(self) -> bool:
+        return self.status in (QUEUED, RUNNING)
+
+    def eta_seconds(self) -> Optional[float]:
+        """
+        Remaining time for the current stage at the rate seen so far.
+        """
+        if self.status != RUNNING or not self.stage_started_at or not self.done or not self.total:
+            return None
+        elapsed = time.time() - self.stage_started_at
+        return round(elapsed * (self.total - self.done) / self.done, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        end = self.finished_at or time.time()
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "progress": round(self.done / self.total, 4) if self.total else (1.0 if self.status == DONE else 0.0),
+            "eta_seconds": self.eta_seconds(),
+            "elapsed_seconds": round(end - self.started_at, 2) if self.started_at else 0.0,
+            "result": self.result,
+            "error": self.error,
+        }
+
+    def to_state(self) -> Dict[str, Any]:
+        return {f.name: getattr(self, f.name) for f in fields(self) if f.name not in ("finished", "on_change")}
+
+    @classmethod
+    def from_state(cls, state: Dict[str, Any]) -> "BuildJob":
+        names = {f.name for f in fields(cls)} - {"finished", "on_change"}
+        job = cls(**{k: v for k, v in state.items() if k in names})
+        if job.active and not _owner_alive(job.host, job.pid):
+            # The worker that owned it exited (restart, crash) before finishing.
+            job.status = FAILED
+            job.error = job.error or "Build worker exited before the build finished."
+            job.finished_at = job.finished_at or time.time()
+        if not job.active:
+            job.finished.set()
+        return job
+
+
+BuildFn = Callable[[BuildJob], Dict[str, Any]]
+
+
+class BuildJobManager:
+    """
+    Runs index builds in the background on a small, capped pool so builds
+    can't take over the threads serving /ask.
+
+    Job state is written to state_dir(session)/jobs/<job_id>.json, so any
+    uvicorn worker can answer GET /build/{job_id} and see another worker's
+    builds. submit() de-duplicates per session: while a job for the same
+    (session, key) is queued or running in any worker, that job is returned
+    instead of starting another. Builds of one session never run
+    concurrently: they hold a file lock (state_dir(session)/build.lock), so
+    a build for newer docs waits for the older one, whichever worker runs it.
+    Finished jobs are kept for lookup, up to max_finished in memory and
+    keep_per_session files per session.
+    """
+
+    def __init__(
+        self,
+        state_dir: Callable[[str], Path],
+        max_workers: int = 2,
+        max_finished: int = 256,
+        keep_per_session: int = 20,
+        progress_interval: float = 1.0,
+    ):
+        self.state_dir = state_dir
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._jobs: "OrderedDict[str, BuildJob]" = OrderedDict()
+        self._active: Dict[Tuple[str, str], BuildJob] = {}
+        self._saved_at: Dict[str, float] = {}
+        self._futures: Dict[str, Future] = {}  # jobs not finished yet
+        self._lock = threading.Lock()
+        self.max_workers = max(1, max_workers)
+        self.max_finished = max_finished
+        self.keep_per_session = keep_per_session
+        self.progress_interval = progress_interval
+
+    def submit(self, session_id: str, key: str, fn: BuildFn) -> Tuple[BuildJob, bool]:
+        """
+        Returns (job, created). created is False when an identical build is already active.
+        """
+        with self._lock:
+            existing = self._active.get((session_id, key))
+            if existing is not None and existing.active:
+                return existing, False
+
+        # Check and register under the session's jobs lock, so two workers
+        # submitting the same build at once end up with one job.
+        with FileLock(self.state_dir(session_id) / "jobs.lock"):
+            for other in self._load_all(session_id):
+                if other.key == key and other.active:
+                    return other, False
+            job = BuildJob(job_id=uuid.uuid4().hex, session_id=session_id, key=key, on_change=self._changed)
+            self._save(job)
+            self._prune_files(session_id)
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._active[(session_id, key)] = job
+            self._trim()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="build")
+            self._futures[job.job_id] = self._pool.submit(self._run, job, fn)
+        return job, True
+
+    def session_lock(self, session_id: str) -> FileLock:
+        """
+        Held while a build of the session runs (in any worker); take it for
+        other writes to the session index.
+        """
+        return FileLock(self.state_dir(session_id) / "build.lock")
+
+    def _run(self, job: BuildJob, fn: BuildFn) -> None:
+        try:
+            with self.session_lock(job.session_id):
+                job.status = RUNNING
+                job.started_at = time.time()
+                self._save(job)
+                try:
+                    job.result = fn(job)
+                    job.status = DONE
+                except Exception as e:
+                    job.error = getattr(e, "detail", None) or f"{type(e).__name__}: {e}"
+                    job.status = FAILED
+                    traceback.print_exc()
+        except Exception as e:  # the lock itself failed (state dir gone, ...)
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+            traceback.print_exc()
+        finally:
+            job.finished_at = time.time()
+            BUILD_DURATION.labels(job.status).observe(job.finished_at - (job.started_at or job.finished_at))
+            self._finish(job)
+
+    def _finish(self, job: BuildJob) -> None:
+        try:
+            self._save(job)
+        except OSError:
+            traceback.print_exc()
+        with self._lock:
+            if self._active.get((job.session_id, job.key)) is job:
+                del self._active[(job.session_id, job.key)]
+            self._saved_at.pop(job.job_id, None)
+            self._futures.pop(job.job_id, None)
+        job.finished.set()
+
+    def _changed(self, job: BuildJob, force: bool) -> None:
+        # Stage changes are saved at once, progress at most every progress_interval.
+        now = time.monotonic()
+        if not force and now - self._saved_at.get(job.job_id, 0.0) < self.progress_interval:
+            return
+        self._saved_at[job.job_id] = now
+        try:
+            self._save(job)
+        except OSError:
+            traceback.print_exc()
+
+    def _trim(self) -> None:
+        finished = [j for j in self._jobs.values() if not j.active]
+        for job in finished[: max(0, len(finished) - self.max_finished)]:
+            del self._jobs[job.job_id]
+
+    # ----------------------------
+    # Job state files
+    # ----------------------------
+    def _jobs_dir(self, session_id: str) -> Path:
+        return self.state_dir(session_id) / "jobs"
+
+    def _save(self, job: BuildJob) -> None:
+        d = self._jobs_dir(job.session_id)
+        d.mkdir(parents=True, exist_ok=True)
+        data = json.dumps(job.to_state()).encode("utf-8")
+        atomic_write(d / f"{job.job_id}.json", lambda f: f.write(data))
+
+    def _load(self, session_id: str, job_id: str) -> Optional[BuildJob]:
+        if not JOB_ID_RE.match(job_id):
+            return None
+        try:
+            state = json.loads((self._jobs_dir(session_id) / f"{job_id}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return BuildJob.from_state(state)
+
+    def _load_all(self, session_id: str) -> List[BuildJob]:
+        """
+        The session's jobs, oldest first; this worker's own jobs are the live objects.
+        """
+        d = self._jobs_dir(session_id)
+        jobs: List[BuildJob] = []
+        if d.is_dir():
+            for path in d.glob("*.json"):
+                with self._lock:
+                    local = self._jobs.get(path.stem)
+                job = local or self._load(session_id, path.stem)
+                if job is not None:
+                    jobs.append(job)
+        return sorted(jobs, key=lambda j: j.created_at)
+
+    def _prune_files(self, session_id: str) -> None:
+        finished = [j for j in self._load_all(session_id) if not j.active]
+        for job in finished[: max(0, len(finished) - self.keep_per_session)]:
+            (self._jobs_dir(session_id) / f"{job.job_id}.json").unlink(missing_ok=True)
+
+    # ----------------------------
+    # Lookup
+    # ----------------------------
+    def get(self, job_id: str, session_id: str) -> Optional[BuildJob]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job if job.session_id == session_id else None
+        return self._load(session_id, job_id)
+
+    def latest(self, session_id: str) -> Optional[BuildJob]:
+        jobs = self._load_all(session_id)
+        return jobs[-1] if jobs else None
+
+    def wait(self, job: BuildJob, poll: float = 0.5) -> BuildJob:
+        """
+        Blocks until job finishes; jobs of other workers are polled through their state file.
+        """
+        with self._lock:
+            local = self._jobs.get(job.job_id) is job
+        if local:
+            job.finished.wait()
+            return job
+        while job.active:
+            time.sleep(poll)
+            latest = self._load(job.session_id, job.job_id)
+            if latest is None:  # session cleared under it
+                job.status, job.error = FAILED, "Build state is gone (session cleared?)."
+                break
+            job = latest
+        return job
+
+    def shutdown(self) -> None:
+        # Queued builds are dropped (and marked failed); a running one finishes
+        # (its files are written atomically).
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            cancelled = [self._jobs[i] for i, f in self._futures.items() if f.cancelled() and i in self._jobs]
+        for job in cancelled:
+            job.status = FAILED
+            job.error = "Server shut down before the build started."
+            job.finished_at = time.time()
+            self._finish(job)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {"max_workers": self.max_workers, "jobs": counts}
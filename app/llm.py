@@ -1,11 +1,22 @@
+import json
 import os
-import httpx
+import time
+from typing import Dict, Any, Tuple, List, Union, Iterator, AsyncIterator, Optional
 
 from .config import settings
+from .clients import get_client, get_async_client
+from .tracing import record_usage, span, traced
+from .telemetry import LLM_ERRORS, LLM_LATENCY, LLM_TTFT, observe_chat_usage
 
-def chat(prompt: str)-> str:
+
+SYSTEM_PROMPT = "Follow instructions strictly and cite sources."
+
+Prompt = Union[str, List[Dict[str, str]]]
+
+
+def _chat_request(prompt: Prompt, stream: bool = False) -> Tuple[Dict[str, str], Dict[str, Any]]:
     """
-    NVIDIA chat wrapper. Always returns a STRING (never None).
+    prompt: a user prompt string, or a full messages list (system + history + user).
     """
     api_key = os.getenv("NVIDIA_API_KEY")
     if not api_key:
@@ -18,22 +29,148 @@ def chat(prompt: str)-> str:
     
     payload= {
         "model": settings.gen_model,
-        "messages":[
-            {"role": "system", "content": "Follow instructions strictly and cite sources."},
+        "messages": prompt if isinstance(prompt, list) else [
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt},
         ],
         "temperature": 0.2,
         "max_tokens": 700,
-        "stream": False,
+        "stream": stream,
     }
+    if stream and settings.stream_usage:
+        payload["stream_options"] = {"include_usage": True}
+    return headers, payload
+
+
+def _answer_text(data: Dict[str, Any]) -> str:
+    return data.get("choices", [{}])[0].get("message", {}).get("content") or "ERROR: Empty model response."
+
+
+@traced("chat")
+def chat(prompt: Prompt)-> str:
+    """
+    NVIDIA chat wrapper. Always returns a STRING (never None).
+    """
+    headers, payload = _chat_request(prompt)
     
+    t0 = time.perf_counter()
+    try:
+        r = get_client().post(f"{settings.base_url}/chat/completions", headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()
+        record_usage(data.get("usage"))
+        observe_chat_usage(data.get("usage"))
+        return _answer_text(data)
+
+    except Exception as e:
+        LLM_ERRORS.labels("chat").inc()
+        return f"ERROR: LLM call failed: {e}"
+
+    finally:
+        LLM_LATENCY.labels("chat").observe(time.perf_counter() - t0)
+
+
+async def achat(prompt: Prompt) -> str:
+    """
+    Async chat on the shared async client. Same contract as chat().
+    """
+    headers, payload = _chat_request(prompt)
+
+    t0 = time.perf_counter()
+    try:
+        with span("chat"):
+            r = await get_async_client().post(f"{settings.base_url}/chat/completions", headers=headers, json=payload)
+        r.raise_for_status()
+        data = r.json()
+        record_usage(data.get("usage"))
+        observe_chat_usage(data.get("usage"))
+        return _answer_text(data)
+
+    except Exception as e:
+        LLM_ERRORS.labels("chat").inc()
+        return f"ERROR: LLM call failed: {e}"
+
+    finally:
+        LLM_LATENCY.labels("chat").observe(time.perf_counter() - t0)
+
+
+def _sse_delta(line: str, usage: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """
+    Parses one line of an OpenAI-compatible SSE stream.
+    Returns the content delta, "" for lines without content, None at [DONE].
+    A token usage object on the line (the last chunk, with include_usage) is copied into usage.
+    """
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return None
+    obj = json.loads(data)
+    if usage is not None and obj.get("usage"):
+        usage.update(obj["usage"])
+    choices = obj.get("choices") or [{}]
+    return choices[0].get("delta", {}).get("content") or ""
+
+
+def chat_stream(prompt: Prompt, usage: Optional[Dict[str, Any]] = None) -> Iterator[str]:
+    """
+    Streaming chat: yields answer text deltas as the model produces them.
+    Like chat(), failures come out as a single "ERROR: ..." chunk, never an exception.
+    usage: filled with the upstream token usage, when the API reports it.
+    """
+    headers, payload = _chat_request(prompt, stream=True)
+    usage = {} if usage is None else usage
+
+    t0 = time.perf_counter()
+    first = True
     try:
-        with httpx.Client(timeout=60) as client:
-            r = client.post(f"{settings.base_url}/chat/completions", headers=headers, json=payload)
+        with get_client().stream("POST", f"{settings.base_url}/chat/completions", headers=headers, json=payload) as r:
             r.raise_for_status()
-            data = r.json()
+            for line in r.iter_lines():
+                delta = _sse_delta(line, usage)
+                if delta is None:
+                    break
+                if delta:
+                    if first:
+                        LLM_TTFT.labels("stream").observe(time.perf_counter() - t0)
+                        first = False
+                    yield delta
+
+    except Exception as e:
+        LLM_ERRORS.labels("stream").inc()
+        yield f"ERROR: LLM call failed: {e}"
 
-        return data.get("choices", [{}])[0].get("message", {}).get("content") or "ERROR: Empty model response."
+    finally:
+        LLM_LATENCY.labels("stream").observe(time.perf_counter() - t0)
+        observe_chat_usage(usage)
+
+
+async def achat_stream(prompt: Prompt, usage: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+    """
+    Async chat_stream on the shared async client.
+    """
+    headers, payload = _chat_request(prompt, stream=True)
+    usage = {} if usage is None else usage
+
+    t0 = time.perf_counter()
+    first = True
+    try:
+        async with get_async_client().stream("POST", f"{settings.base_url}/chat/completions", headers=headers, json=payload) as r:
+            r.raise_for_status()
+            async for line in r.aiter_lines():
+                delta = _sse_delta(line, usage)
+                if delta is None:
+                    break
+                if delta:
+                    if first:
+                        LLM_TTFT.labels("stream").observe(time.perf_counter() - t0)
+                        first = False
+                    yield delta
 
     except Exception as e:
-        return f"ERROR: LLM call failed: {e}"
\ No newline at end of file
+        LLM_ERRORS.labels("stream").inc()
+        yield f"ERROR: LLM call failed: {e}"
+
+    finally:
+        LLM_LATENCY.labels("stream").observe(time.perf_counter() - t0)
+        observe_chat_usage(usage)
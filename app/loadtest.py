@@ -0,0 +1,310 @@
+"""
+Load generator for the multi-session server workflow. Each virtual session
+uploads synthetic documents, starts a background build and polls it to
+completion, then asks a mix of /ask, /ask/stream and /chat questions.
+`users` sessions run at once until `sessions` have completed.
+
+With no --url, a fake NVIDIA backend and a server are started locally (see
+app.bench.bench_stack), with caches and sessions in a temporary directory.
+A sampler polls /health for server memory (RSS, SESSION_CACHE, build queue)
+while the load runs. The report gives per-endpoint throughput and latency
+percentiles plus the memory timeline. Current RSS needs Linux (or psutil);
+elsewhere only the server's peak RSS is reported, which can only grow:
+
+    rag loadtest --sessions 200 --users 32 --out load.json
+    rag loadtest --url http://127.0.0.1:8000 --mix ask=0.5,chat=0.5
+"""
+import itertools
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+from .bench import bench_stack, make_vocab, percentiles, synthetic_doc
+
+ENDPOINTS = {"ask": "/ask", "ask_stream": "/ask/stream", "chat": "/chat"}
+
+
+@dataclass
+class LoadConfig:
+    url: str = ""                    # running server; "" = start a local one on the fake backend
+    sessions: int = 100              # session workflows to complete
+    users: int = 16                  # sessions in flight at once
+    docs: int = 3                    # documents uploaded per session
+    doc_words: int = 1500
+    questions: int = 5               # questions per session
+    mix: Dict[str, float] = field(default_factory=lambda: {"ask": 0.5, "ask_stream": 0.2, "chat": 0.3})
+    poll_interval: float = 0.2       # GET /build/{job_id} period
+    sample_interval: float = 1.0     # /health sampling period
+    seed: int = 0
+    embed_latency_ms: float = 20.0
+    chat_ttft_ms: float = 100.0
+    chat_token_ms: float = 5.0
+
+
+def parse_mix(text: str) -> Dict[str, float]:
+    """
+    "ask=0.6,chat=0.4" -> {"ask": 0.6, "chat": 0.4}
+    """
+    mix: Dict[str, float] = {}
+    for part in text.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {name!r} in mix (choose from {', '.join(ENDPOINTS)})")
+        mix[name] = float(weight or 1.0)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError("The mix needs at least one endpoint with a positive weight.")
+    return mix
+
+
+class Recorder:
+    """
+    Thread-safe per-endpoint latency samples and error counts.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.statuses: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint: str, ms: float, status: Any, ok: bool = True) -> None:
+        with self._lock:
+            self.samples[endpoint].append(ms)
+            self.statuses[endpoint][str(status)] += 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def summary(self, wall_seconds: float) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                name: {
+                    "requests": len(samples),
+                    "errors": self.errors[name],
+                    "rps": round(len(samples) / wall_seconds, 2) if wall_seconds else 0.0,
+                    "statuses": dict(self.statuses[name]),
+                    **percentiles(samples),
+                }
+                for name, samples in sorted(self.samples.items())
+            }
+
+
+class HealthSampler(threading.Thread):
+    """
+    Polls /health every interval; keeps (elapsed seconds, memory and queue figures).
+    """
+
+    def __init__(self, client: httpx.Client, interval: float):
+        super().__init__(name="health-sampler", daemon=True)
+        self.client = client
+        self.interval = interval
+        self.samples: List[Dict[str, Any]] = []
+        self._halt = threading.Event()
+        self._t0 = time.perf_counter()
+
+    def sample(self) -> None:
+        try:
+            h = self.client.get("/health", timeout=10.0).json()
+        except (httpx.HTTPError, ValueError):
+            return
+        jobs = h.get("build_jobs", {}).get("jobs", {})
+        cache = h.get("session_cache", {})
+        rss, peak = h.get("rss_bytes"), h.get("peak_rss_bytes")
+        self.samples.append(
+            {
+                "t": round(time.perf_counter() - self._t0, 2),
+                "rss_mb": round(rss / 2**20, 1) if rss is not None else None,
+                "peak_rss_mb": round(peak / 2**20, 1) if peak is not None else None,
+                "sessions_cached": cache.get("sessions", h.get("sessions_cached_in_memory", 0)),
+                "session_cache_mb": round(cache.get("resident_bytes", 0) / 2**20, 2),
+                "session_evictions": cache.get("evictions", 0),
+                "chat_mb": round(h.get("session_chat", {}).get("resident_bytes", 0) / 2**20, 2),
+                "builds_queued": jobs.get("queued", 0),
+                "builds_running": jobs.get("running", 0),
+            }
+        )
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+        self.sample()
+
+
+def _timed(rec: Recorder, endpoint: str, fn) -> Optional[httpx.Response]:
+    t0 = time.perf_counter()
+    try:
+        r = fn()
+    except httpx.HTTPError as e:
+        rec.record(endpoint, (time.perf_counter() - t0) * 1000, type(e).__name__, ok=False)
+        return None
+    rec.record(endpoint, (time.perf_counter() - t0) * 1000, r.status_code, ok=r.status_code < 400)
+    return r
+
+
+def _stream(rec: Recorder, client: httpx.Client, path: str, body: Dict[str, Any], headers: Dict[str, str]) -> None:
+    """
+    One SSE request: records time to the first token event and to the end of the stream.
+    """
+    t0 = time.perf_counter()
+    ttft: Optional[float] = None
+    status: Any = "error"
+    ok = False
+    try:
+        with client.stream("POST", path, json=body, headers=headers) as r:
+            status = r.status_code
+            for line in r.iter_lines():
+                if ttft is None and line.startswith("event: token"):
+                    ttft = (time.perf_counter() - t0) * 1000
+            ok = r.status_code < 400
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    rec.record(f"POST {path}", (time.perf_counter() - t0) * 1000, status, ok=ok)
+    if ttft is not None:
+        rec.record(f"POST {path} (first token)", ttft, status)
+
+
+def run_session(cfg: LoadConfig, client: httpx.Client, rec: Recorder, index: int, run_id: str, vocab: List[str]) -> None:
+    rng = np.random.default_rng([cfg.seed, index])
+    session = f"load-{run_id}-{index:05d}"
+    headers = {"x-session-id": session}
+
+    files = [
+        ("files", (f"doc_{i}.txt", synthetic_doc(rng, vocab, cfg.doc_words).encode("utf-8"), "text/plain"))
+        for i in range(cfg.docs)
+    ]
+    if _timed(rec, "POST /upload", lambda: client.post("/upload", files=files, headers=headers)) is None:
+        return
+
+    t_build = time.perf_counter()
+    r = _timed(rec, "POST /build", lambda: client.post("/build", headers=headers))
+    if r is None or r.status_code >= 400:
+        return
+    job_id = r.json()["job_id"]
+    while True:
+        r = _timed(rec, "GET /build/{job_id}", lambda: client.get(f"/build/{job_id}", headers=headers))
+        if r is None or r.status_code >= 400:
+            return
+        status = r.json()["status"]
+        if status in ("done", "failed"):
+            break
+        time.sleep(cfg.poll_interval)
+    rec.record("build (upload done -> index ready)", (time.perf_counter() - t_build) * 1000, status, ok=status == "done")
+    if status != "done":
+        return
+
+    names = list(cfg.mix)
+    weights = np.asarray([cfg.mix[n] for n in names], dtype=np.float64)
+    for _ in range(cfg.questions):
+        kind = names[int(rng.choice(len(names), p=weights / weights.sum()))]
+        body = {"query": "what is " + " ".join(vocab[int(i)] for i in rng.integers(0, len(vocab), size=4)) + "?"}
+        path = ENDPOINTS[kind]
+        if kind == "ask_stream":
+            _stream(rec, client, path, body, headers)
+        else:
+            _timed(rec, f"POST {path}", lambda: client.post(path, json=body, headers=headers))
+
+
+def run_load(cfg: LoadConfig, log=print) -> Dict[str, Any]:
+    run_id = datetime.now().strftime("%H%M%S")
+    vocab = make_vocab(np.random.default_rng(cfg.seed))
+    rec = Recorder()
+
+    with ExitStack() as stack:
+        url = cfg.url
+        if not url:
+            tmp = stack.enter_context(tempfile.TemporaryDirectory(prefix="rag-load-"))
+            log("starting fake backend + server ...")
+            url = stack.enter_context(
+                bench_stack(Path(tmp), embed_latency_ms=cfg.embed_latency_ms, chat_ttft_ms=cfg.chat_ttft_ms, chat_token_ms=cfg.chat_token_ms)
+            )
+        limits = httpx.Limits(max_connections=cfg.users + 2, max_keepalive_connections=cfg.users + 2)
+        client = stack.enter_context(httpx.Client(base_url=url, timeout=600.0, limits=limits))
+
+        sampler = HealthSampler(client, cfg.sample_interval)
+        sampler.sample()
+        sampler.start()
+        log(f"{cfg.sessions} sessions, {cfg.users} concurrent, against {url} ...")
+
+        counter = itertools.count()
+        done = itertools.count(1)
+
+        def user() -> None:
+            while True:
+                i = next(counter)
+                if i >= cfg.sessions:
+                    return
+                run_session(cfg, client, rec, i, run_id, vocab)
+                n = next(done)
+                if n % max(1, cfg.sessions // 10) == 0:
+                    log(f"  {n}/{cfg.sessions} sessions done")
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=cfg.users) as pool:
+            for f in [pool.submit(user) for _ in range(cfg.users)]:
+                f.result()
+        wall = time.perf_counter() - t0
+        sampler.stop()
+
+    endpoints = rec.summary(wall)
+    requests = sum(e["requests"] for name, e in endpoints.items() if name.startswith(("GET ", "POST ")) and "(" not in name)
+    memory = sampler.samples
+    rss = [m["rss_mb"] for m in memory if m["rss_mb"] is not None]
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "config": asdict(cfg),
+        "wall_seconds": round(wall, 2),
+        "requests": requests,
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "sessions_per_s": round(cfg.sessions / wall, 3) if wall else 0.0,
+        "endpoints": endpoints,
+        "memory": {
+            # Current RSS (None where the server can only report its peak).
+            "rss_mb_start": rss[0] if rss else None,
+            "rss_mb_peak": max(rss, default=None),
+            "rss_mb_end": rss[-1] if rss else None,
+            "peak_rss_mb": memory[-1]["peak_rss_mb"] if memory else None,  # server's own high-water mark
+            "timeline": memory,
+        },
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"{report['requests']} requests in {report['wall_seconds']}s "
+        f"({report['throughput_rps']} req/s, {report['sessions_per_s']} sessions/s)",
+        "",
+        f"{'endpoint':40s} {'n':>6s} {'err':>5s} {'rps':>7s} {'p50 ms':>9s} {'p90 ms':>9s} {'p99 ms':>9s} {'max ms':>9s}",
+    ]
+    for name, e in report["endpoints"].items():
+        lines.append(
+            f"{name:40s} {e['requests']:6d} {e['errors']:5d} {e['rps']:7.2f} "
+            f"{e.get('p50_ms', 0):9.1f} {e.get('p90_ms', 0):9.1f} {e.get('p99_ms', 0):9.1f} {e.get('max_ms', 0):9.1f}"
+        )
+    mem = report["memory"]
+    if mem["rss_mb_end"] is not None:
+        lines += ["", f"server RSS: start {mem['rss_mb_start']} MB, peak {mem['rss_mb_peak']} MB, end {mem['rss_mb_end']} MB"]
+    else:
+        lines += ["", f"server RSS over time unavailable on the server's platform; peak RSS {mem['peak_rss_mb']} MB"]
+    for m in mem["timeline"][:: max(1, -(-len(mem["timeline"]) // 12))]:
+        rss = f"rss={m['rss_mb']:7.1f} MB" if m["rss_mb"] is not None else f"peak rss={m['peak_rss_mb'] or 0:7.1f} MB"
+        lines.append(
+            f"  t={m['t']:7.1f}s {rss} sessions={m['sessions_cached']:4d} "
+            f"cache={m['session_cache_mb']:7.2f} MB builds queued/running={m['builds_queued']}/{m['builds_running']}"
+        )
+    return "\n".join(lines)
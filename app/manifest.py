@@ -0,0 +1,115 @@
+import json
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .index import atomic_write
+
+# Bump when the manifest layout changes; older manifests then force a full rebuild.
+MANIFEST_VERSION = 1
+
+
+@dataclass
+class FileEntry:
+    """
+    One indexed document: its content hash and the half-open range of rows it
+    owns in chunks.json / vectors.npy (chunk rows == vector rows).
+    """
+    name: str
+    hash: str
+    chunk_start: int
+    chunk_end: int
+
+    @property
+    def rows(self) -> int:
+        return self.chunk_end - self.chunk_start
+
+
+@dataclass
+class RebuildPlan:
+    keep: List[FileEntry] = field(default_factory=list)   # unchanged: rows are reused as-is
+    changed: List[str] = field(default_factory=list)      # new or modified: chunk + embed
+    removed: List[str] = field(default_factory=list)      # gone from docs/: rows dropped
+
+
+def load_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def save_manifest(path: Path, entries: List[FileEntry], params: Dict[str, Any]) -> None:
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "params": params,
+        "num_rows": entries[-1].chunk_end if entries else 0,
+        "files": [asdict(e) for e in entries],
+    }
+    atomic_write(path, lambda f: f.write(json.dumps(manifest, indent=2).encode("utf-8")))
+
+
+def manifest_entries(manifest: Optional[Dict[str, Any]], params: Dict[str, Any], num_rows: int) -> List[FileEntry]:
+    """
+    The manifest's file entries, or [] when it can't be trusted for the index
+    on disk (missing, other version / chunking params / embed model, or a row
+    count that doesn't match the saved chunks and vectors).
+    """
+    if not manifest or manifest.get("version") != MANIFEST_VERSION or manifest.get("params") != params:
+        return []
+    if manifest.get("num_rows") != num_rows:
+        return []
+    return [FileEntry(**e) for e in manifest.get("files", [])]
+
+
+def plan_rebuild(entries: List[FileEntry], current: Dict[str, str]) -> RebuildPlan:
+    """
+    current: {file name: content hash} of the docs now in the session.
+    """
+    plan = RebuildPlan()
+    known = {e.name: e for e in entries}
+    for e in entries:
+        if current.get(e.name) == e.hash:
+            plan.keep.append(e)
+        else:
+            plan.removed.append(e.name)
+    plan.changed = sorted(name for name, h in current.items() if known.get(name) is None or known[name].hash != h)
+    # Modified files are re-added, not "removed"; only report files that are really gone.
+    plan.removed = [n for n in plan.removed if n not in current]
+    return plan
+
+
+def assemble(
+    old_chunks: List[Dict[str, Any]],
+    old_vectors: Optional[np.ndarray],
+    keep: List[FileEntry],
+    added: List[Tuple[str, str, List[Dict[str, Any]], np.ndarray]],
+) -> Tuple[List[Dict[str, Any]], np.ndarray, List[FileEntry]]:
+    """
+    New (chunks, vectors, entries): rows of kept files in their old order,
+    then the added files, each (name, hash, chunks, unit-normalized vectors).
+    Only row slices are copied; nothing is re-embedded.
+    """
+    chunks: List[Dict[str, Any]] = []
+    parts: List[np.ndarray] = []
+    entries: List[FileEntry] = []
+
+    for e in keep:
+        start = len(chunks)
+        chunks.extend(old_chunks[e.chunk_start:e.chunk_end])
+        parts.append(np.asarray(old_vectors[e.chunk_start:e.chunk_end]))
+        entries.append(FileEntry(e.name, e.hash, start, len(chunks)))
+
+    for name, hash_, file_chunks, vecs in added:
+        start = len(chunks)
+        chunks.extend(file_chunks)
+        parts.append(vecs)
+        entries.append(FileEntry(name, hash_, start, len(chunks)))
+
+    parts = [p for p in parts if len(p)]
+    vectors = np.concatenate(parts).astype(np.float32, copy=False) if parts else np.zeros((0, 0), dtype=np.float32)
+    return chunks, vectors, entries
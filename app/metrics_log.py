@@ -0,0 +1,358 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import settings
+
+METRICS_FILE = "rag_metrics.jsonl"
+# Rotated files: rag_metrics-<rotation time>[-<n>].jsonl[.gz]
+ROTATED_RE = re.compile(r"^rag_metrics-(\d{8}-\d{6})(?:-(\d+))?\.jsonl(?:\.gz)?$")
+
+_FLUSH = object()
+
+
+class MetricsWriter:
+    """
+    Appends metrics records to metrics_dir/rag_metrics.jsonl from a background
+    thread, in batches: callers only serialize and enqueue. The file is rotated
+    when it would grow past max_bytes or has been open longer than
+    rotate_seconds; rotated files are optionally gzipped and only the newest
+    `keep` are retained. With flush_seconds == 0 records are written inline.
+    """
+
+    def __init__(
+        self,
+        metrics_dir: Path,
+        flush_seconds: float = 1.0,
+        max_batch: int = 512,
+        max_queue: int = 100_000,
+        max_bytes: int = 64 * 2**20,
+        rotate_seconds: float = 0.0,
+        compress: bool = True,
+        keep: int = 10,
+    ):
+        self.metrics_dir = metrics_dir
+        self.path = metrics_dir / METRICS_FILE
+        self.flush_seconds = flush_seconds
+        self.max_batch = max_batch
+        self.max_bytes = max_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress = compress
+        self.keep = keep
+        self.written = 0
+        self.dropped = 0
+        self.rotations = 0
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._file_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._opened_at = time.time()
+
+    def write(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        if self.flush_seconds <= 0:
+            self._write_lines([line])
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            # The disk can't keep up; shed metrics rather than block a request.
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """
+        Blocks until everything enqueued so far is on disk (or timeout).
+        """
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put((_FLUSH, done))
+        done.wait(timeout)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def _run(self) -> None:
+        while True:
+            items = [self._queue.get()]
+            # Let a batch build up for flush_seconds before touching the file.
+            deadline = time.monotonic() + self.flush_seconds
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or isinstance(items[-1], tuple):
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            lines = [x for x in items if isinstance(x, str)]
+            try:
+                if lines:
+                    self._write_lines(lines)
+            except OSError:
+                self.dropped += len(lines)
+            for x in items:
+                if isinstance(x, tuple):
+                    x[1].set()
+
+    def _write_lines(self, lines: List[str]) -> None:
+        data = "".join(lines).encode("utf-8")
+        with self._file_lock:
+            self.metrics_dir.mkdir(parents=True, exist_ok=True)
+            size = self.path.stat().st_size if self.path.exists() else 0
+            if size and self._should_rotate(size + len(data)):
+                self._rotate()
+            with self.path.open("ab") as f:
+                f.write(data)
+            self.written += len(lines)
+
+    def _should_rotate(self, new_size: int) -> bool:
+        if self.max_bytes and new_size > self.max_bytes:
+            return True
+        return bool(self.rotate_seconds) and time.time() - self._opened_at >= self.rotate_seconds
+
+    def _rotate(self) -> None:
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        target = self.metrics_dir / f"rag_metrics-{stamp}.jsonl"
+        n = 1
+        while target.exists() or target.with_suffix(".jsonl.gz").exists():
+            target = self.metrics_dir / f"rag_metrics-{stamp}-{n}.jsonl"
+            n += 1
+        os.replace(self.path, target)
+        if self.compress:
+            with target.open("rb") as src, gzip.open(f"{target}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            target.unlink()
+        self._opened_at = time.time()
+        self.rotations += 1
+        if self.keep > 0:
+            for old in rotated_files(self.metrics_dir)[:-self.keep]:
+                old.unlink(missing_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rotations": self.rotations,
+        }
+
+
+_writers: Dict[Path, MetricsWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(metrics_dir: Path) -> MetricsWriter:
+    """
+    One writer per metrics directory, configured from settings.
+    """
+    with _writers_lock:
+        writer = _writers.get(metrics_dir)
+        if writer is None:
+            writer = _writers[metrics_dir] = MetricsWriter(
+                metrics_dir,
+                flush_seconds=settings.metrics_flush_seconds,
+                max_bytes=settings.metrics_max_bytes,
+                rotate_seconds=settings.metrics_rotate_seconds,
+                compress=settings.metrics_compress,
+                keep=settings.metrics_keep,
+            )
+        return writer
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def rotated_files(metrics_dir: Path) -> List[Path]:
+    """
+    Rotated metrics files, oldest first.
+    """
+    if not metrics_dir.exists():
+        return []
+    found = []
+    for p in metrics_dir.iterdir():
+        m = ROTATED_RE.match(p.name)
+        if m:
+            found.append(((m.group(1), int(m.group(2) or 0)), p))
+    return [p for _, p in sorted(found)]
+
+
+def _open_text(path: Path):
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8")
+    return path.open("r", encoding="utf-8")
+
+
+def count_records(path: Path, block: int = 1 << 20) -> int:
+    """
+    Newline count in fixed-size blocks: constant memory, no JSON parsing.
+    """
+    if not path.exists():
+        return 0
+    n = 0
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            n += chunk.count(b"\n")
+    return n
+
+
+def tail_lines(path: Path, n: int, block: int = 64 * 1024) -> List[str]:
+    """
+    The last n lines of path, read backwards from the end in blocks.
+    """
+    if n <= 0 or not path.exists():
+        return []
+    with path.open("rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= n:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return [x for x in lines if x.strip()][-n:]
+
+
+def tail_records(metrics_dir: Path, n: int) -> List[Dict[str, Any]]:
+    """
+    The last n records, newest last. Falls back to rotated files (newest first)
+    when the current file holds fewer than n; memory is bounded by n.
+    """
+    lines = tail_lines(metrics_dir / METRICS_FILE, n)
+    for path in reversed(rotated_files(metrics_dir)):
+        if len(lines) >= n:
+            break
+        with _open_text(path) as f:
+            older = deque((x for x in f if x.strip()), maxlen=n - len(lines))
+        lines = list(older) + lines
+    return [json.loads(x) for x in lines]
+
+
+def iter_records(metrics_dir: Path, since: Optional[datetime] = None) -> Iterator[Dict[str, Any]]:
+    """
+    All records, oldest first, streamed. With since, rotated files that were
+    closed before it are skipped without being opened.
+    """
+    cutoff = since.isoformat(timespec="seconds") if since else ""
+    paths = rotated_files(metrics_dir) + [metrics_dir / METRICS_FILE]
+    for path in paths:
+        m = ROTATED_RE.match(path.name)
+        if since and m and datetime.strptime(m.group(1), "%Y%m%d-%H%M%S") < since:
+            continue
+        if not path.exists():
+            continue
+        with _open_text(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                # Timestamps are local ISO strings: they compare in time order.
+                if cutoff and rec.get("timestamp", "") < cutoff:
+                    continue
+                yield rec
+
+
+class Quantiles:
+    """
+    Fixed-bin histogram over [lo, hi] for streaming percentiles in constant
+    memory; results are exact to one bin width.
+    """
+
+    def __init__(self, lo: float = -1.0, hi: float = 1.0, bins: int = 2000):
+        self.lo, self.hi, self.bins = lo, hi, bins
+        self.counts = [0] * bins
+        self.n = 0
+
+    def add(self, value: float) -> None:
+        i = int((value - self.lo) / (self.hi - self.lo) * self.bins)
+        self.counts[min(max(i, 0), self.bins - 1)] += 1
+        self.n += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        rank = q * (self.n - 1)
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen > rank:
+                return self.lo + (i + 0.5) * (self.hi - self.lo) / self.bins
+        return self.hi
+
+
+def aggregate(records: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    p50/p95 top_score, citation rate, error rate and estimated prompt tokens
+    (mean sent, total saved by packing) over a record stream, in one pass.
+    Exact-match (lexical fast path) records have no cosine top_score and are
+    left out of the top_score percentiles.
+    """
+    scores = Quantiles()
+    total = cited = errors = 0
+    prompts = prompt_tokens = prompt_saved = 0
+    first = last = None
+    for rec in records:
+        total += 1
+        if not rec.get("exact_match"):
+            scores.add(float(rec.get("top_score", 0.0)))
+        cited += bool(rec.get("has_citation"))
+        errors += bool(rec.get("error"))
+        prompt = rec.get("prompt") or {}
+        if prompt:
+            prompts += 1
+            prompt_tokens += sum(prompt.get(f"{part}_tokens", 0) for part in ("template", "context", "history"))
+            prompt_saved += prompt.get("context_tokens_saved", 0) + prompt.get("history_tokens_saved", 0)
+        first = first or rec.get("timestamp")
+        last = rec.get("timestamp") or last
+
+    def rate(x: int) -> Optional[float]:
+        return round(x / total, 4) if total else None
+
+    def q(p: float) -> Optional[float]:
+        v = scores.quantile(p)
+        return round(v, 4) if v is not None else None
+
+    return {
+        "records": total,
+        "first": first,
+        "last": last,
+        "top_score_p50": q(0.50),
+        "top_score_p95": q(0.95),
+        "citation_rate": rate(cited),
+        "error_rate": rate(errors),
+        "prompt_tokens_mean": round(prompt_tokens / prompts, 1) if prompts else None,
+        "prompt_tokens_saved": prompt_saved,
+    }
+
+
+WINDOW_RE = re.compile(r"^(\d+(?:\.\d+)?)([smhd])$")
+_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_window(window: str) -> timedelta:
+    """
+    "90s", "30m", "24h", "7d" -> timedelta.
+    """
+    m = WINDOW_RE.match(window.strip().lower())
+    if not m:
+        raise ValueError(f"Bad time window {window!r}; use e.g. 30m, 24h, 7d.")
+    return timedelta(**{_UNITS[m.group(2)]: float(m.group(1))})
@@ -0,0 +1,137 @@
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .index import VectorIndex, atomic_write, normalize_rows, top_k_indices
+
+# Rows converted to float32 at a time while scoring codes. Small enough that the
+# converted block is still in cache when the GEMV reads it.
+SCORE_BLOCK = 1024
+
+
+def quantize(vectors: np.ndarray, mode: str) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    float16: plain cast.
+    int8: per-dimension scalar quantization, x ~= offset + scale * (code + 128).
+    Returns: (codes, scale, offset); scale/offset are None for float16.
+    """
+    if mode == "float16":
+        return vectors.astype(np.float16), None, None
+    if mode != "int8":
+        raise ValueError(f"Unknown vector storage mode: {mode}")
+
+    lo = vectors.min(axis=0).astype(np.float32)
+    hi = vectors.max(axis=0).astype(np.float32)
+    scale = np.maximum(hi - lo, 1e-12) / 255.0
+    codes = np.empty(vectors.shape, dtype=np.int8)
+    for start in range(0, vectors.shape[0], SCORE_BLOCK):
+        block = vectors[start:start + SCORE_BLOCK]
+        codes[start:start + SCORE_BLOCK] = np.clip(np.rint((block - lo) / scale) - 128, -128, 127)
+    return codes, scale.astype(np.float32), lo
+
+
+class QuantizedIndex(VectorIndex):
+    """
+    Scores queries against compact float16/int8 codes, then rescores the best
+    k * rescore_factor candidates exactly against the float32 rows.
+
+    The float32 rows are expected to be memory-mapped, so only the codes
+    (2-4x smaller) stay resident; rescoring touches just the candidate rows.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        codes: np.ndarray,
+        scale: Optional[np.ndarray] = None,
+        offset: Optional[np.ndarray] = None,
+        rescore_factor: int = 10,
+    ):
+        super().__init__(vectors, normalized=True)
+        self.codes = codes
+        self.scale = scale
+        self.offset = offset
+        self.rescore_factor = rescore_factor
+
+    @property
+    def mode(self) -> str:
+        return "int8" if self.codes.dtype == np.int8 else "float16"
+
+    @property
+    def nbytes(self) -> int:
+        extra = 0 if self.scale is None else self.scale.nbytes + self.offset.nbytes
+        return int(self.codes.nbytes) + extra
+
+    @classmethod
+    def build(cls, base: VectorIndex, mode: str, rescore_factor: int = 10) -> "QuantizedIndex":
+        codes, scale, offset = quantize(base.vectors, mode)
+        q = cls(base.vectors, codes, scale, offset, rescore_factor=rescore_factor)
+        q.fingerprint = base.fingerprint
+        return q
+
+    def scores(self, query_vecs: np.ndarray) -> np.ndarray:
+        """
+        Approximate (Q, N) cosine scores computed from the codes only.
+        """
+        q = normalize_rows(query_vecs)
+        bias = np.zeros(q.shape[0], dtype=np.float32)
+        if self.scale is not None:
+            # q . (offset + scale * (code + 128)) = q.(offset + 128*scale) + (q*scale) . code
+            bias = q @ (self.offset + 128.0 * self.scale)
+            q = q * self.scale
+
+        out = np.empty((q.shape[0], len(self)), dtype=np.float32)
+        buf = np.empty((SCORE_BLOCK, self.codes.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), SCORE_BLOCK):
+            codes = self.codes[start:start + SCORE_BLOCK]
+            block = buf[:len(codes)]
+            np.copyto(block, codes, casting="unsafe")
+            out[:, start:start + len(codes)] = q @ block.T
+        out += bias[:, None]
+        return out
+
+    def search(self, query_vecs: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = normalize_rows(query_vecs)
+        approx = self.scores(q)
+        cands = top_k_indices(approx, max(k, k * self.rescore_factor))
+
+        k = min(k, len(self))
+        scores = np.empty((q.shape[0], k), dtype=np.float32)
+        ids = np.empty((q.shape[0], k), dtype=np.int64)
+        for qi in range(q.shape[0]):
+            cand = np.sort(cands[qi])  # sorted rows = sequential reads on a memmap
+            exact = self.vectors[cand] @ q[qi]
+            top = top_k_indices(exact, k)
+            scores[qi] = exact[top]
+            ids[qi] = cand[top]
+        return scores, ids
+
+    def save(self, path: Path) -> None:
+        arrays = {"codes": self.codes}
+        if self.scale is not None:
+            arrays.update(scale=self.scale, offset=self.offset)
+        atomic_write(path, lambda f: np.savez(f, **arrays))
+
+    @classmethod
+    def load(cls, path: Path, base: VectorIndex, rescore_factor: int = 10) -> "QuantizedIndex":
+        data = np.load(path)
+        scale = data["scale"] if "scale" in data else None
+        offset = data["offset"] if "offset" in data else None
+        q = cls(base.vectors, data["codes"], scale, offset, rescore_factor=rescore_factor)
+        q.fingerprint = base.fingerprint
+        return q
+
+
+def build_or_load_quantized(base: VectorIndex, path: Path, mode: str, rescore_factor: int = 10) -> QuantizedIndex:
+    """
+    Loads the codes saved at path if they match base and mode, else quantizes and saves them.
+    """
+    if path.exists():
+        q = QuantizedIndex.load(path, base, rescore_factor=rescore_factor)
+        if len(q.codes) == len(base) and q.mode == mode:
+            return q
+
+    q = QuantizedIndex.build(base, mode, rescore_factor=rescore_factor)
+    q.save(path)
+    return q
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .config import settings
+from .embed import embed_texts
+from .tracing import traced
+
+EmbedFn = Callable[[List[str], str], np.ndarray]
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace don't change what the user asked."""
+    return " ".join(query.split()).lower()
+
+
+class QueryEmbeddingCache:
+    """
+    Bounded in-process LRU of query embeddings keyed by (embed_model, normalized query),
+    with optional TTL (ttl <= 0 means entries never expire).
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float = 0.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data: "OrderedDict[Tuple[str, str], Tuple[float, np.ndarray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+
+    def get(self, key: Tuple[str, str]) -> Optional[np.ndarray]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and self.ttl > 0 and time.monotonic() - item[0] > self.ttl:
+                del self._data[key]
+                item = None
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        vec = np.array(vec, dtype=np.float32)
+        vec.flags.writeable = False
+        with self._lock:
+            self._data[key] = (time.monotonic(), vec)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def record_disk_hit(self) -> None:
+        with self._lock:
+            self.disk_hits += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+query_cache = QueryEmbeddingCache(max_size=settings.query_cache_size, ttl=settings.query_cache_ttl)
+
+
+@traced("embed")
+def embed_queries(queries: List[str], embed_fn: EmbedFn = embed_texts) -> np.ndarray:
+    """
+    Query embeddings through the cache tiers: in-process LRU, then (if
+    settings.query_cache_disk) the on-disk embedding store, then one
+    embed_fn call for whatever is left.
+    Returns: np.ndarray shape (Q, D) in input order.
+    """
+    model = settings.embed_model
+    keys = [(model, normalize_query(q)) for q in queries]
+    vecs: Dict[Tuple[str, str], np.ndarray] = {}
+    missing: Dict[Tuple[str, str], str] = {}
+
+    for key, q in zip(keys, queries):
+        if key in vecs or key in missing:
+            continue
+        hit = query_cache.get(key) if settings.query_cache_size > 0 else None
+        if hit is not None:
+            vecs[key] = hit
+        else:
+            missing[key] = q
+
+    if missing and settings.query_cache_disk:
+        from .embed_store import get_store, text_hash
+
+        hashes = {key: text_hash(key[1]) for key in missing}
+        stored = get_store().get_many(model, "query", list(hashes.values()))
+        for key, h in hashes.items():
+            if h in stored:
+                vecs[key] = stored[h]
+                query_cache.put(key, stored[h])
+                query_cache.record_disk_hit()
+                del missing[key]
+
+    if missing:
+        miss_keys = list(missing)
+        new_vecs = embed_fn([missing[k] for k in miss_keys], "query")
+        for key, v in zip(miss_keys, new_vecs):
+            vecs[key] = v
+            query_cache.put(key, v)
+        if settings.query_cache_disk:
+            from .embed_store import get_store, text_hash
+
+            get_store().put_many(model, "query", [text_hash(k[1]) for k in miss_keys], new_vecs)
+
+    if not queries:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack([vecs[k] for k in keys]).astype(np.float32, copy=False)
+
+
+def embed_query(query: str, embed_fn: EmbedFn = embed_texts) -> np.ndarray:
+    """
+    Single-query embed_queries. Returns: (1, D)
+    """
+    return embed_queries([query], embed_fn=embed_fn)
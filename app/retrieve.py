@@ -1,29 +1,188 @@
-from typing import List, Dict
+import re
+import time
+from typing import List, Dict, Union, Optional, Tuple
 import numpy as np
 
-from .embed import embed_texts
+from .config import settings
+from .query_cache import embed_query, embed_queries
+from .index import VectorIndex, as_index, normalize_rows
+from .bm25 import BM25Index, TOKEN_RE, tokenize
+from .tracing import span, traced
+from .telemetry import observe_retrieval
 
-def cosine_sim_matrix(query_vecs: np.ndarray, doc_vecs: np.ndarray) -> np.ndarray:
+def cosine_sim_matrix(query_vecs: np.ndarray, doc_vecs: Union[np.ndarray, VectorIndex]) -> np.ndarray:
+    # Pre-normalized index: no per-query pass over the corpus.
+    if isinstance(doc_vecs, VectorIndex):
+        return doc_vecs.scores(query_vecs).ravel()
     q = query_vecs / (np.linalg.norm(query_vecs, axis = 1, keepdims=True) + 1e-10)
     d = doc_vecs / (np.linalg.norm(doc_vecs, axis=1, keepdims=True) + 1e-12)
     return (q @ d.T).ravel()
 
-def top_k_retrieve(query: str, chunks: list[Dict], chunk_vecs: np.ndarray, k: int =  3)-> List[Dict]:
-    query_vec = embed_texts([query], input_type="query")
-    scores = cosine_sim_matrix(query_vec, chunk_vecs)
-    
-    ranked = np.argsort(scores)[::-1][:k]
+def _results_for(chunks: list[Dict], scores: np.ndarray, ids: np.ndarray) -> List[Dict]:
     results: List[Dict] = []
     
-    for idx in ranked:
+    for score, idx in zip(scores, ids):
+        if idx < 0:  # backend found fewer than k candidates
+            continue
         c= chunks[idx]
         results.append(
             {
-                "score": float(scores[idx]),
+                "score": float(score),
                 "doc_id": c["doc_id"],
                 "chunk_id": c["chunk_id"],
                 "text": c["text"],
                 "source": c["source"],
             }
         )
-    return results
\ No newline at end of file
+    return results
+
+# Identifier-like tokens: error codes, IDs, versions, snake/camelCase names. Plain words and
+# all-caps acronyms ("CEO", "API") are not: a query made of those is natural language.
+ID_TOKEN_RE = re.compile(r"^(?=[\w.\-:/#]*[\d_])[\w.\-:/#]{3,}$|^[a-z]+[A-Z]\w*$")
+
+
+def exact_match_terms(query: str) -> List[str]:
+    """
+    The tokens of a short query made only of identifiers ("ERR_4012",
+    "KB-1138 nv-embedqa-e5-v5"), or [] if any token reads like natural
+    language ("Who is the CEO?", "what happened in 2023").
+    """
+    tokens = [t.strip("\"'?!,;()[]") for t in query.split()]
+    tokens = [t for t in tokens if t]
+    if not tokens or len(tokens) > 4 or not all(ID_TOKEN_RE.match(t) for t in tokens):
+        return []
+    return tokens
+
+
+@traced("lexical")
+def lexical_only_retrieve(query: str, chunks: list[Dict], lexical: Optional[BM25Index], k: int = 3) -> Optional[List[Dict]]:
+    """
+    Fast path for exact-match queries: BM25 only, no embeddings call.
+    Returns the BM25 hits containing every identifier of the query as a whole
+    token, or None when the query doesn't qualify or nothing matches exactly,
+    in which case the caller falls back to dense/hybrid retrieval.
+
+    Hits are marked match "exact" and carry their BM25 score as "bm25". They
+    have no cosine similarity, so "score" is 0.0: confidence checks go by the
+    match (eval.is_confident), and metrics keep them out of top_score stats.
+    """
+    if lexical is None or not settings.lexical_fast_path or settings.retrieval_mode != "hybrid":
+        return None
+    terms = [tok for t in exact_match_terms(query) for tok in TOKEN_RE.findall(t.lower())]
+    if not terms:
+        return None
+
+    t0 = time.perf_counter()
+    bm25_scores, ids = lexical.search([query], max(k * 4, k))
+    exact = [
+        (i, s) for i, s in zip(ids[0], bm25_scores[0])
+        if i >= 0 and set(terms) <= set(tokenize(chunks[i]["text"]))
+    ][:k]
+    observe_retrieval("lexical", len(chunks), time.perf_counter() - t0)
+    if not exact:
+        return None
+    results = _results_for(chunks, np.zeros(len(exact), dtype=np.float32), np.asarray([i for i, _ in exact]))
+    for r, (_, s) in zip(results, exact):
+        r["match"] = "exact"
+        r["bm25"] = round(float(s), 4)
+    return results
+
+
+def rrf_fuse(rankings: List[np.ndarray], rrf_k: int = 60) -> List[Tuple[int, float]]:
+    """
+    Reciprocal-rank fusion of several best-first id lists (-1 = padding).
+    Returns [(id, fused score)] best first.
+    """
+    fused: Dict[int, float] = {}
+    for ids in rankings:
+        for rank, i in enumerate(ids):
+            if i >= 0:
+                fused[int(i)] = fused.get(int(i), 0.0) + 1.0 / (rrf_k + rank + 1)
+    return sorted(fused.items(), key=lambda x: -x[1])
+
+
+def hybrid_search(
+    query: str,
+    index: VectorIndex,
+    lexical: BM25Index,
+    query_vec: np.ndarray,
+    k: int,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Dense and BM25 candidates fused with RRF. Returns (cosine scores, ids) of
+    the fused top k, so "score" keeps its meaning for confidence thresholds.
+    """
+    n_cand = max(k, settings.hybrid_candidates)
+    dense_scores, dense_ids = index.search(query_vec, n_cand)
+    _, lex_ids = lexical.search([query], n_cand)
+    fused = rrf_fuse([dense_ids[0], lex_ids[0]], rrf_k=settings.rrf_k)[:k]
+
+    ids = np.asarray([i for i, _ in fused], dtype=np.int64)
+    known = {int(i): float(s) for i, s in zip(dense_ids[0], dense_scores[0]) if i >= 0}
+    # Lexical-only candidates have no dense score yet: one small exact dot product.
+    missing = [i for i in ids if int(i) not in known]
+    if missing:
+        exact = index.vectors[np.asarray(missing)] @ normalize_rows(query_vec)[0]
+        known.update({int(i): float(s) for i, s in zip(missing, exact)})
+    scores = np.asarray([known[int(i)] for i in ids], dtype=np.float32)
+    return scores, ids
+
+
+def top_k_retrieve(
+    query: str,
+    chunks: list[Dict],
+    chunk_vecs: Union[np.ndarray, VectorIndex],
+    k: int =  3,
+    query_vec: Optional[np.ndarray] = None,
+    lexical: Optional[BM25Index] = None,
+)-> List[Dict]:
+    """
+    query_vec: the query's (1, D) embedding if the caller already has it.
+    lexical: the chunks' BM25 index; with settings.retrieval_mode == "hybrid"
+    dense and lexical rankings are fused, and exact-match queries may be
+    answered from BM25 alone (when no query_vec was computed yet).
+    """
+    index = as_index(chunk_vecs)
+    hybrid = lexical is not None and settings.retrieval_mode == "hybrid"
+    if hybrid and query_vec is None:
+        fast = lexical_only_retrieve(query, chunks, lexical, k)
+        if fast is not None:
+            return fast
+    if query_vec is None:
+        query_vec = embed_query(query)
+    t0 = time.perf_counter()
+    with span("search"):
+        if hybrid:
+            scores, ids = hybrid_search(query, index, lexical, query_vec, k)
+            results = _results_for(chunks, scores, ids)
+        else:
+            scores, ids = index.search(query_vec, k)
+            results = _results_for(chunks, scores[0], ids[0])
+    observe_retrieval("hybrid" if hybrid else "dense", len(chunks), time.perf_counter() - t0)
+    return results
+
+def top_k_retrieve_batch(
+    queries: List[str],
+    chunks: list[Dict],
+    chunk_vecs: Union[np.ndarray, VectorIndex],
+    k: int = 3,
+    block_size: int = 256,
+) -> List[List[Dict]]:
+    """
+    Retrieval for many queries at once: one embeddings call for all uncached queries,
+    then one search per block of block_size queries (for the exact backend a
+    (Q x D) @ (D x N) matmul; blocking only bounds the score matrix).
+    Returns one result list per query, in input order.
+    """
+    if not queries:
+        return []
+
+    index = as_index(chunk_vecs)
+    query_vecs = embed_queries(list(queries))
+
+    out: List[List[Dict]] = []
+    for start in range(0, len(queries), block_size):
+        scores, ids = index.search(query_vecs[start:start + block_size], k)
+        for row_scores, row_ids in zip(scores, ids):
+            out.append(_results_for(chunks, row_scores, row_ids))
+    return out
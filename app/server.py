@@ -1,22 +1,41 @@
 from __future__ import annotations
 
 import json
-import re
 import shutil
+import time
 from pathlib import Path
-from typing import Dict, Any, List, Tuple, Optional
+from typing import Dict, Any, List, Tuple, Optional, Iterator, Callable, Sequence
 
 import numpy as np
 from fastapi import FastAPI, UploadFile, File, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 from .config import settings
 from .retrieve import top_k_retrieve
-from .prompt import build_prompt
-from .llm import chat
-from .embed import embed_texts  # <-- your NVIDIA embeddings wrapper
+from .query_cache import query_cache, embed_query
+from .answer_cache import answer_cache, answer_scope, invalidate_session
+from .prompt import build_prompt, fit_history
+from .llm import chat, chat_stream, Prompt, SYSTEM_PROMPT
+from .eval import evaluate, log_metrics, threshold_for
+from .metrics_log import get_writer
+from .embed import embed_texts, embed_texts_bulk  # <-- your NVIDIA embeddings wrapper
+from .embed_store import embed_cached
+from .ingest import extract_files
+from .extract_cache import cached_pieces, chunker_key, cached_file_hash
+from .manifest import FileEntry, load_manifest, save_manifest, manifest_entries, plan_rebuild, assemble
+from .clients import aclose_clients
+from .batcher import QueryBatcher
+from .index import VectorIndex, save_index, normalize_rows, atomic_write
+from .bm25 import BM25Index, build_or_load_bm25
+from .chunk_store import ChunkStore
+from .retrieve import lexical_only_retrieve
+from .cache import load_vectors, with_storage, chunks_fingerprint
+from .sessions import SessionStore, index_nbytes, chat_nbytes
+from .jobs import BuildJob, BuildJobManager, FAILED
+from .tracing import TraceMiddleware, current_trace
+from .telemetry import REGISTRY, CONTENT_TYPE, Collected, MetricsMiddleware, process_peak_rss_bytes, process_rss_bytes
 
 
 app = FastAPI(title="NVIDIA RAG Agent API", version="0.1.2")  # CORS enabled for all origins
@@ -28,6 +47,10 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Per-request stage timings, logged with the metrics record (settings.tracing).
+app.add_middleware(TraceMiddleware)
+# Request counts and latency histograms for GET /metrics.
+app.add_middleware(MetricsMiddleware)
 
 # Add explicit OPTIONS handler for CORS preflight
 @app.options("/{rest_of_path:path}")
@@ -40,17 +63,32 @@ async def preflight_handler(rest_of_path: str):
 SESSIONS_DIR = Path("cache/sessions")
 ALLOWED_EXT = {".pdf", ".txt", ".md"}
 
-# In-memory session cache: session_id -> (chunks, vectors)
-SESSION_CACHE: Dict[str, Tuple[List[Dict[str, Any]], np.ndarray]] = {}
+# (chunks (list or ChunkStore), normalized vector index, BM25 index)
+SessionIndex = Tuple[Sequence[Dict[str, Any]], VectorIndex, BM25Index]
 
-SESSION_CHAT: dict[str, list[dict]] = {}  # {session_id: [{"role":"user","content":"..."}, ...]}
+# In-memory session cache: session_id -> SessionIndex.
+# Bounded by settings.session_cache_bytes; evicted sessions reload from disk on next use.
+SESSION_CACHE: SessionStore[SessionIndex] = SessionStore(
+    index_nbytes,
+    max_bytes=settings.session_cache_bytes,
+    ttl=settings.session_ttl,
+    loader=lambda session_id: read_session_state(session_id),
+)
+
+# {session_id: [{"role":"user","content":"..."}, ...]}
+SESSION_CHAT: SessionStore[List[Dict[str, str]]] = SessionStore(
+    chat_nbytes,
+    max_bytes=settings.session_chat_bytes,
+    ttl=settings.session_chat_ttl,
+)
 MAX_TURNS = 12  # keep it short so prompts don’t explode
 
 
 def get_chat(session_id: str) -> list[dict]:
-    if session_id not in SESSION_CHAT:
-        SESSION_CHAT[session_id] = []
-    return SESSION_CHAT[session_id]
+    try:
+        return SESSION_CHAT[session_id]
+    except KeyError:
+        return []
 
 class ChatRequest(BaseModel):
     query: str
@@ -71,32 +109,6 @@ def session_dir(session_id: str) -> Path:
     return d
 
 
-def clean_text(text: str) -> str:
-    text = text.replace("\r", "\n")
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    text = re.sub(r"[ \t]{2,}", " ", text)
-    return text.strip()
-
-
-def read_file_text(file_path: Path) -> str:
-    ext = file_path.suffix.lower()
-
-    if ext in {".txt", ".md"}:
-        return file_path.read_text(encoding="utf-8", errors="ignore")
-
-    if ext == ".pdf":
-        # PyMuPDF required: pip install pymupdf
-        import fitz  # type: ignore
-
-        doc = fitz.open(file_path)
-        pages = []
-        for page in doc:
-            pages.append(page.get_text())
-        return "\n".join(pages)
-
-    raise ValueError(f"Unsupported file type: {ext}")
-
-
 def chunk_by_paragraphs(text: str, chunk_size: int = 450, overlap: int = 80) -> List[str]:
     """
     Chunk by paragraphs (better for PDFs) + overlap.
@@ -142,22 +154,36 @@ def chunk_by_paragraphs(text: str, chunk_size: int = 450, overlap: int = 80) ->
     return chunks
 
 
-def build_chunks_from_docs(docs_dir: Path, chunk_size: int = 450, overlap: int = 80) -> List[Dict[str, Any]]:
-    """
-    Reads all docs in docs_dir and returns chunks list.
-    """
+def session_doc_files(docs_dir: Path) -> List[Path]:
     files = []
     for ext in ("*.pdf", "*.txt", "*.md"):
         files.extend(docs_dir.glob(ext))
+    return sorted(files)
+
+
+def build_chunks_from_docs(
+    docs_dir: Path, chunk_size: int = 450, overlap: int = 80, files: Optional[List[Path]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Reads all docs in docs_dir (or just `files`) and returns chunks list.
+    """
+    if files is None:
+        files = session_doc_files(docs_dir)
 
     if not files:
         raise HTTPException(status_code=400, detail="No documents uploaded for this session.")
 
     all_chunks: List[Dict[str, Any]] = []
-    for file_path in sorted(files):
-        text = clean_text(read_file_text(file_path))
+    chunker = chunker_key("server.paragraphs", chunk_size, overlap)
+    # Text extraction (PDF parsing) runs on a process pool; output stays in sorted-file order.
+    # Unchanged files come straight from the extraction cache (text and chunks).
+    for extracted in extract_files(sorted(files), workers=settings.ingest_workers or None):
+        file_path = extracted.path
         doc_id = file_path.stem
-        pieces = chunk_by_paragraphs(text, chunk_size=chunk_size, overlap=overlap)
+        pieces = cached_pieces(
+            extracted.content_hash, chunker, extracted.text,
+            lambda text: chunk_by_paragraphs(text, chunk_size=chunk_size, overlap=overlap),
+        )
 
         for i, piece in enumerate(pieces):
             all_chunks.append(
@@ -172,35 +198,95 @@ def build_chunks_from_docs(docs_dir: Path, chunk_size: int = 450, overlap: int =
     return all_chunks
 
 
-def load_session_state(session_id: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+def load_session_state(session_id: str) -> SessionIndex:
     """
-    Load from memory cache first, otherwise from disk.
+    Load from memory cache first, otherwise from disk (via read_session_state).
     """
-    if session_id in SESSION_CACHE:
-        return SESSION_CACHE[session_id]
+    return SESSION_CACHE[session_id]
 
-    sdir = session_dir(session_id)
-    chunks_path = sdir / "chunks.json"
-    vecs_path = sdir / "vectors.npy"
 
-    if not chunks_path.exists() or not vecs_path.exists():
-        raise HTTPException(
-            status_code=400,
-            detail="Session index not built yet. Upload docs then call /build.",
-        )
+def session_lexical(sdir: Path, chunks: List[Dict[str, Any]], fingerprint: str) -> BM25Index:
+    # Rebuilt (and re-saved) when missing or built for other chunks, e.g. sessions from before BM25.
+    return build_or_load_bm25(
+        lambda: [c["text"] for c in chunks], sdir / "lexical.npz", fingerprint, k1=settings.bm25_k1, b=settings.bm25_b
+    )
 
-    chunks = json.loads(chunks_path.read_text(encoding="utf-8"))
-    vecs = np.load(vecs_path)
 
-    SESSION_CACHE[session_id] = (chunks, vecs)
-    return chunks, vecs
+def read_session_chunks(sdir: Path) -> Optional[Sequence[Dict[str, Any]]]:
+    """
+    The session's chunks: the memory-mapped chunks.bin store, or a legacy
+    chunks.json (converted to chunks.bin once when settings.chunk_store is on).
+    None if neither exists.
+    """
+    store_path, json_path = sdir / "chunks.bin", sdir / "chunks.json"
+    if store_path.exists():
+        return ChunkStore(store_path)
+    if not json_path.exists():
+        return None
+    chunks = json.loads(json_path.read_text(encoding="utf-8"))
+    if not settings.chunk_store:
+        return chunks
+    return write_session_chunks(sdir, chunks, chunks_fingerprint(chunks))
+
+
+def write_session_chunks(sdir: Path, chunks: Sequence[Dict[str, Any]], fingerprint: str) -> Sequence[Dict[str, Any]]:
+    if not settings.chunk_store:
+        atomic_write(sdir / "chunks.json", lambda f: f.write(json.dumps(list(chunks), ensure_ascii=False, indent=2).encode("utf-8")))
+        (sdir / "chunks.bin").unlink(missing_ok=True)
+        return chunks
+    ChunkStore.write(chunks, sdir / "chunks.bin", fingerprint=fingerprint)
+    (sdir / "chunks.json").unlink(missing_ok=True)
+    return ChunkStore(sdir / "chunks.bin")
+
+
+# A build (or a delete) replaces chunks, vectors and manifest one file at a time;
+# a reader that lands between those writes retries until the files agree.
+SESSION_READ_ATTEMPTS = 5
+
+
+def index_matches(chunks: Sequence[Dict[str, Any]], vecs: VectorIndex) -> bool:
+    """
+    Whether chunks and vectors come from the same write: same row count and,
+    where both record one (not legacy sessions), the same chunks fingerprint.
+    """
+    if len(chunks) != len(vecs):
+        return False
+    chunks_fp = getattr(chunks, "fingerprint", "")
+    return not (chunks_fp and vecs.fingerprint) or chunks_fp == vecs.fingerprint
+
+
+def read_session_state(session_id: str) -> SessionIndex:
+    sdir = session_dir(session_id)
+    vecs_path = sdir / "vectors.npy"
+    for attempt in range(SESSION_READ_ATTEMPTS):
+        chunks = read_session_chunks(sdir) if vecs_path.exists() else None
+        if chunks is None:
+            raise HTTPException(
+                status_code=400,
+                detail="Session index not built yet. Upload docs then call /build.",
+            )
+        try:
+            # Older sessions have raw vectors and no vectors.json; load_index upgrades them once.
+            vecs = load_vectors(vecs_path, sdir / "vectors.json")
+        except (OSError, ValueError):  # replaced or removed mid-read
+            vecs = None
+        if vecs is not None and index_matches(chunks, vecs):
+            break
+        time.sleep(0.05 * (attempt + 1))
+    else:
+        raise HTTPException(status_code=503, detail="Session index is being rewritten; try again.")
+
+    vecs = with_storage(vecs, vecs_path)
+    lexical = session_lexical(sdir, chunks, vecs.fingerprint or chunks_fingerprint(chunks))
+    return chunks, vecs, lexical
 
 
 # ----------------------------
 # Global dataset (optional)
 # ----------------------------
 global_chunks: List[Dict[str, Any]] = []
-global_vecs: Optional[np.ndarray] = None
+global_vecs: Optional[VectorIndex] = None
+global_lexical: Optional[BM25Index] = None
 
 
 @app.on_event("startup")
@@ -210,16 +296,152 @@ def startup() -> None:
     (from settings.chunks_file / cache logic).
     If you don't want this, you can remove it safely.
     """
-    global global_chunks, global_vecs
+    global global_chunks, global_vecs, global_lexical
     try:
-        from .cache import load_chunks, build_or_load_chunk_vectors
+        from .cache import load_chunks, build_or_load_chunk_vectors, build_or_load_lexical
 
         global_chunks = load_chunks()
         global_vecs = build_or_load_chunk_vectors(global_chunks)
+        global_lexical = build_or_load_lexical(global_chunks)
     except Exception:
         # Don't crash the server if global cache isn't present.
         global_chunks = []
         global_vecs = None
+        global_lexical = None
+
+
+@app.on_event("shutdown")
+async def shutdown() -> None:
+    query_batcher.stop()
+    get_writer(settings.metrics_dir).flush()
+    build_jobs.shutdown()
+    # Close the pooled HTTP clients (keep-alive connections to the NVIDIA API).
+    await aclose_clients()
+
+
+NO_INDEX_MSG = "No index available. Upload docs and build first."
+
+# Concurrent requests' query embeddings are coalesced into one embeddings call
+# (settings.query_batch_window_ms = 0 turns this off).
+query_batcher = QueryBatcher(
+    embed_fn=embed_texts,
+    max_wait_ms=settings.query_batch_window_ms,
+    max_batch=settings.query_batch_max,
+    max_in_flight=settings.query_batch_in_flight,
+)
+
+
+def query_embedding(query: str) -> np.ndarray:
+    """
+    (1, D) query embedding: query cache first, then the micro-batcher.
+    """
+    embed_fn = query_batcher.embed if settings.query_batch_window_ms > 0 else embed_texts
+    return embed_query(query, embed_fn=embed_fn)
+
+
+def resolve_index(session_id: str) -> Optional[SessionIndex]:
+    """
+    If session provided, use session workspace; else fallback to global.
+    None when there is no global index.
+    """
+    if session_id:
+        return load_session_state(session_id)
+    if not global_chunks or global_vecs is None:
+        return None
+    return global_chunks, global_vecs, global_lexical
+
+
+def remember_answer(
+    scope: str,
+    query: str,
+    query_vec: Optional[np.ndarray],
+    answer: str,
+    top_sources: List[Dict[str, Any]],
+    top_score: float,
+) -> None:
+    # Never cache failures; the next identical question should retry the LLM.
+    # No query_vec: answered on the lexical fast path, which is cheap to repeat.
+    if query_vec is not None and settings.answer_cache and not answer.startswith("ERROR:"):
+        answer_cache.put(scope, query, query_vec, answer, top_sources, top_score)
+
+
+def summarize_sources(retrieved: List[Dict[str, Any]]) -> Tuple[float, List[Dict[str, Any]]]:
+    top_score = float(retrieved[0]["score"]) if retrieved else 0.0
+    top_sources = [{"source": f"{r['doc_id']}#{r['chunk_id']}", "score": float(r["score"])} for r in retrieved]
+    return top_score, top_sources
+
+
+# ----------------------------
+# Streaming (SSE)
+# ----------------------------
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_message(
+    query: str,
+    message: str,
+    top_sources: Optional[List[Dict[str, Any]]] = None,
+    top_score: float = 0.0,
+    cached: bool = False,
+) -> StreamingResponse:
+    """
+    A complete event stream for answers that need no LLM call
+    (empty query, no index, answer cache hit...).
+    """
+    def events() -> Iterator[str]:
+        yield sse_event("sources", {"query": query, "top_sources": top_sources or [], "top_score": top_score})
+        yield sse_event("token", {"text": message})
+        yield sse_event("done", {"answer_len": len(message), "ttft_ms": None, "total_ms": 0.0, "cached": cached})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+def stream_answer(
+    query: str,
+    retrieved: List[Dict[str, Any]],
+    prompt: Prompt,
+    on_answer: Optional[Callable[[str], None]] = None,
+) -> StreamingResponse:
+    """
+    Sends the retrieved sources first, then model tokens as they arrive.
+    Time-to-first-token is logged with the evaluate() metrics once the stream ends.
+    """
+    top_score, top_sources = summarize_sources(retrieved)
+    # The body is iterated outside the endpoint's context: hand the request's trace over explicitly.
+    trace = current_trace()
+
+    def events() -> Iterator[str]:
+        yield sse_event("sources", {"query": query, "top_sources": top_sources, "top_score": top_score})
+
+        t0 = time.perf_counter()
+        ttft_ms: Optional[float] = None
+        parts: List[str] = []
+        usage: Dict[str, int] = {}
+        for delta in chat_stream(prompt, usage):
+            if ttft_ms is None:
+                ttft_ms = (time.perf_counter() - t0) * 1000
+            parts.append(delta)
+            yield sse_event("token", {"text": delta})
+        total_ms = (time.perf_counter() - t0) * 1000
+        if trace is not None:
+            trace.add("chat", total_ms)
+            trace.add_usage(usage)
+
+        answer = "".join(parts) or "ERROR: Empty model response."
+        if on_answer is not None:
+            on_answer(answer)
+
+        metrics = evaluate(query, retrieved, answer=answer, threshold_used=threshold_for(query))
+        metrics.update({"stream": True, "ttft_ms": ttft_ms, "total_ms": total_ms})
+        log_metrics(settings.metrics_dir, metrics, trace=trace)
+
+        yield sse_event("done", {"answer_len": len(answer), "ttft_ms": ttft_ms, "total_ms": total_ms, "cached": False})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 
 # ----------------------------
@@ -235,6 +457,7 @@ class AskResponse(BaseModel):
     answer: str
     top_sources: list[dict]
     top_score: float
+    cached: bool = False  # served from the semantic answer cache
 
 
 # ----------------------------
@@ -246,9 +469,13 @@ def root():
         "message": "NVIDIA RAG API is running ",
         "docs": "/docs",
         "health": "/health",
+        "metrics": "GET /metrics (Prometheus text format)",
         "upload": "POST /upload (x-session-id)",
-        "build": "POST /build (x-session-id)",
+        "build": "POST /build (x-session-id) -> job_id",
+        "build_status": "GET /build/{job_id} (x-session-id)",
+        "delete_file": "DELETE /files/{name} (x-session-id)",
         "ask": "POST /ask (x-session-id)",
+        "ask_stream": "POST /ask/stream (x-session-id, text/event-stream)",
     }
 
 
@@ -256,14 +483,61 @@ def root():
 def health() -> Dict[str, Any]:
     return {
         "status": "ok",
+        "rss_bytes": process_rss_bytes(),           # None where only the peak is known
+        "peak_rss_bytes": process_peak_rss_bytes(),
         "global_chunks": len(global_chunks),
         "global_cached_vectors": bool(global_vecs is not None),
         "sessions_cached_in_memory": len(SESSION_CACHE),
+        "session_cache": SESSION_CACHE.stats(),
+        "session_chat": SESSION_CHAT.stats(),
+        "query_embedding_cache": query_cache.stats(),
+        "answer_cache": answer_cache.stats(),
+        "query_batcher": query_batcher.stats(),
+        "build_jobs": build_jobs.stats(),
+        "metrics_writer": get_writer(settings.metrics_dir).stats(),
         "embed_model": settings.embed_model,
         "gen_model": settings.gen_model,
     }
 
 
+# Cache and job state is read from the stores' own stats at scrape time.
+def _stat(stats: Callable[[], Dict[str, Any]], key: str) -> Callable[[], float]:
+    return lambda: stats()[key]
+
+
+def _lookups(stats: Callable[[], Dict[str, Any]]) -> Callable[[], Dict[Tuple[str, ...], float]]:
+    def collect() -> Dict[Tuple[str, ...], float]:
+        st = stats()
+        return {("hit",): st["hits"], ("miss",): st["misses"]}
+
+    return collect
+
+
+Collected("rag_session_cache_sessions", "Sessions resident in SESSION_CACHE.", _stat(SESSION_CACHE.stats, "sessions"))
+Collected("rag_session_cache_bytes", "Estimated resident bytes of SESSION_CACHE.", _stat(SESSION_CACHE.stats, "resident_bytes"))
+Collected("rag_session_cache_max_bytes", "SESSION_CACHE byte budget.", _stat(SESSION_CACHE.stats, "max_bytes"))
+Collected("rag_session_cache_evictions_total", "Sessions evicted from SESSION_CACHE.", _stat(SESSION_CACHE.stats, "evictions"), kind="counter")
+Collected("rag_session_cache_loads_total", "Session indexes loaded from disk.", _stat(SESSION_CACHE.stats, "loads"), kind="counter")
+Collected("rag_session_chat_bytes", "Estimated resident bytes of chat histories.", _stat(SESSION_CHAT.stats, "resident_bytes"))
+Collected(
+    "rag_query_cache_lookups_total", "Query embedding cache lookups.", _lookups(query_cache.stats), kind="counter", labelnames=("result",)
+)
+Collected(
+    "rag_answer_cache_lookups_total", "Semantic answer cache lookups.", _lookups(answer_cache.stats), kind="counter", labelnames=("result",)
+)
+Collected(
+    "rag_build_jobs",
+    "Tracked build jobs by status.",
+    lambda: {(status,): n for status, n in build_jobs.stats()["jobs"].items()},
+    labelnames=("status",),
+)
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/upload")
 async def upload_files(
     files: List[UploadFile] = File(...),
@@ -285,6 +559,7 @@ async def upload_files(
 
     # If user uploads new docs, invalidate built index in memory + disk vectors
     SESSION_CACHE.pop(x_session_id, None)
+    invalidate_session(x_session_id)
     # (optional) keep old chunks/vectors, or delete to force rebuild:
     # for p in [sdir/"chunks.json", sdir/"vectors.npy"]:
     #     if p.exists(): p.unlink()
@@ -292,49 +567,209 @@ async def upload_files(
     return {"status": "ok", "session_id": x_session_id, "saved": saved}
 
 
-@app.post("/build")
-def build_session_index(
-    x_session_id: str = Header(default="", alias="x-session-id"),
-):
+# Builds run in the background on a capped pool; /ask keeps the request threads.
+# Job state and the per-session build lock live in the session directory, so
+# every uvicorn worker sees the same jobs.
+build_jobs = BuildJobManager(lambda session_id: SESSIONS_DIR / session_id, max_workers=settings.build_workers)
+
+BUILD_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "x-session-id, Content-Type",
+}
+
+
+def docs_signature(docs_dir: Path) -> str:
     """
-    Creates:
-      cache/sessions/<id>/chunks.json
-      cache/sessions/<id>/vectors.npy
+    Cheap identity of the uploaded docs (name, size, mtime). Two /build calls
+    over the same docs share one job.
     """
-    sdir = session_dir(x_session_id)
+    files = sorted(p for p in docs_dir.iterdir() if p.is_file()) if docs_dir.exists() else []
+    return json.dumps([[p.name, p.stat().st_size, p.stat().st_mtime_ns] for p in files])
+
+
+# Reduced chunk size to ~300 chars (~75-90 tokens) to stay well under NVIDIA's 512 token limit
+SESSION_CHUNK_SIZE = 300
+SESSION_CHUNK_OVERLAP = 50
+
+
+def index_params() -> Dict[str, Any]:
+    # A manifest is only reused for the same chunking and embedding model.
+    return {"chunk_size": SESSION_CHUNK_SIZE, "overlap": SESSION_CHUNK_OVERLAP, "embed_model": settings.embed_model}
+
+
+def read_session_index(sdir: Path) -> Tuple[List[Dict[str, Any]], Optional[np.ndarray], List[FileEntry]]:
+    """
+    The session's saved (chunks, normalized vectors, manifest entries), or
+    ([], None, []) if there is no index or its manifest doesn't match it.
+    """
+    vecs_path = sdir / "vectors.npy"
+    manifest = load_manifest(sdir / "manifest.json")
+    chunks = read_session_chunks(sdir) if manifest is not None and vecs_path.exists() else None
+    if chunks is None:
+        return [], None, []
+    vectors = load_vectors(vecs_path, sdir / "vectors.json").vectors
+    if len(vectors) != len(chunks):
+        return [], None, []
+    entries = manifest_entries(manifest, index_params(), len(chunks))
+    return (chunks, vectors, entries) if entries else ([], None, [])
+
+
+def write_session_index(
+    session_id: str, sdir: Path, chunks: List[Dict[str, Any]], vectors: np.ndarray, entries: List[FileEntry]
+) -> VectorIndex:
+    """
+    Persists chunks.bin / vectors.npy / vectors.json / manifest.json and swaps
+    the result into SESSION_CACHE. vectors must already be unit-normalized.
+    """
+    fingerprint = chunks_fingerprint(chunks)
+    lexical = BM25Index.build([c["text"] for c in chunks], k1=settings.bm25_k1, b=settings.bm25_b, fingerprint=fingerprint)
+    lexical.save(sdir / "lexical.npz")
+    chunks = write_session_chunks(sdir, chunks, fingerprint)
+    save_index(
+        VectorIndex(vectors, normalized=True, fingerprint=fingerprint),
+        sdir / "vectors.npy",
+        sdir / "vectors.json",
+    )
+    save_manifest(sdir / "manifest.json", entries, index_params())
+    # Reload the way load_session_state would: memory-mapped, quantized if configured.
+    index = with_storage(load_vectors(sdir / "vectors.npy", sdir / "vectors.json"), sdir / "vectors.npy", rebuild=True)
+
+    # Put into memory cache; answers cached against the old index are stale now
+    SESSION_CACHE[session_id] = (chunks, index, lexical)
+    invalidate_session(session_id)
+    return index
+
+
+def clear_session_index(session_id: str, sdir: Path) -> None:
+    for name in ("chunks.bin", "chunks.json", "vectors.npy", "vectors.json", "manifest.json", "lexical.npz"):
+        (sdir / name).unlink(missing_ok=True)
+    for p in sdir.glob("vectors.*.npz"):
+        p.unlink()
+    SESSION_CACHE.pop(session_id, None)
+    invalidate_session(session_id)
+
+
+def run_build(session_id: str, job: BuildJob) -> Dict[str, Any]:
+    """
+    Creates / updates:
+      cache/sessions/<id>/chunks.bin    (compact chunk store; chunks.json with settings.chunk_store off)
+      cache/sessions/<id>/vectors.npy   (unit-normalized float32)
+      cache/sessions/<id>/vectors.json
+      cache/sessions/<id>/manifest.json (per file: content hash + chunk/vector row range)
+
+    Incremental: rows of files whose hash is unchanged are reused, rows of
+    deleted files are dropped, and only new or modified files are chunked
+    and embedded.
+    """
+    sdir = session_dir(session_id)
     docs_dir = sdir / "docs"
-    
-    # Reduced chunk size to ~300 chars (~75-90 tokens) to stay well under NVIDIA's 512 token limit
-    chunks = build_chunks_from_docs(docs_dir, chunk_size=300, overlap=50)
-    (sdir / "chunks.json").write_text(json.dumps(chunks, ensure_ascii=False, indent=2), encoding="utf-8")
+    files = session_doc_files(docs_dir)
+    if not files:
+        raise HTTPException(status_code=400, detail="No documents uploaded for this session.")
+
+    job.set_stage("scanning", total=len(files))
+    current = {p.name: cached_file_hash(p) for p in files}
+    old_chunks, old_vectors, entries = read_session_index(sdir)
+    plan = plan_rebuild(entries, current)
+
+    job.set_stage("chunking", total=len(plan.changed))
+    new_chunks = build_chunks_from_docs(
+        docs_dir, chunk_size=SESSION_CHUNK_SIZE, overlap=SESSION_CHUNK_OVERLAP, files=[docs_dir / n for n in plan.changed]
+    ) if plan.changed else []
 
-    texts = [c["text"] for c in chunks]
+    texts = [c["text"] for c in new_chunks]
+    job.set_stage("embedding", total=len(texts))
+
+    def embed_fn(batch: List[str], input_type: str) -> np.ndarray:
+        # Only chunks missing from the store get here; count the reused ones as done.
+        reused = len(texts) - len(batch)
+        return embed_texts_bulk(batch, input_type, progress=lambda done, _: job.progress(reused + done, len(texts)))
 
     # Embedding API has token limits. Chunking above should keep it safe,
-    # but we also embed in batches to be robust.
-    vectors_list: List[np.ndarray] = []
-    batch_size = 32
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i : i + batch_size]
-        vecs = embed_texts(batch, input_type="passage")
-        vectors_list.append(vecs)
+    # and the bulk pipeline sends settings.embed_batch_size texts per request
+    # with settings.embed_concurrency requests in flight. Unchanged chunks come from the store.
+    new_vectors = normalize_rows(embed_cached(texts, input_type="passage", embed_fn=embed_fn)) if texts else None
+
+    job.set_stage("saving", total=len(texts))
+    job.progress(len(texts), len(texts))
+    rows_by_file: Dict[str, List[int]] = {}
+    for i, c in enumerate(new_chunks):
+        rows_by_file.setdefault(Path(c["source"]).name, []).append(i)
+    added = []
+    for name in plan.changed:
+        rows = rows_by_file.get(name, [])
+        added.append((name, current[name], [new_chunks[i] for i in rows], new_vectors[rows] if rows else np.zeros((0, 0), np.float32)))
+    chunks, vectors, entries = assemble(old_chunks, old_vectors, plan.keep, added)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="No text could be extracted from the uploaded documents.")
+    index = write_session_index(session_id, sdir, chunks, vectors, entries)
 
-    vectors = np.vstack(vectors_list).astype(np.float32)
-    np.save(sdir / "vectors.npy", vectors)
+    return {
+        "session_id": session_id,
+        "chunks": len(chunks),
+        "vectors_shape": list(index.shape),
+        "files_reused": len(plan.keep),
+        "files_embedded": len(plan.changed),
+        "files_removed": len(plan.removed),
+        "chunks_embedded": len(texts),
+    }
 
-    # Put into memory cache
-    SESSION_CACHE[x_session_id] = (chunks, vectors)
+
+@app.post("/build", status_code=202)
+def build_session_index(
+    wait: bool = False,
+    x_session_id: str = Header(default="", alias="x-session-id"),
+):
+    """
+    Starts (or joins) a background build of the session index and returns its
+    job id; poll GET /build/{job_id} for progress. wait=true blocks until the
+    build finishes and returns the old synchronous response.
+    """
+    sdir = session_dir(x_session_id)
+    job, created = build_jobs.submit(
+        x_session_id, docs_signature(sdir / "docs"), lambda job: run_build(x_session_id, job)
+    )
+
+    if wait:
+        job = build_jobs.wait(job)
+        if job.status == FAILED:
+            raise HTTPException(status_code=500, detail=f"Build failed: {job.error}")
+        return JSONResponse(content={"status": "ok", "job_id": job.job_id, **job.result}, headers=BUILD_CORS_HEADERS)
 
     return JSONResponse(
-        content={"status": "ok", "session_id": x_session_id, "chunks": len(chunks), "vectors_shape": list(vectors.shape)},
-        headers={
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "POST, OPTIONS",
-            "Access-Control-Allow-Headers": "x-session-id, Content-Type",
-        }
+        status_code=202,
+        content={
+            "status": job.status,
+            "job_id": job.job_id,
+            "session_id": x_session_id,
+            "deduplicated": not created,
+            "status_url": f"/build/{job.job_id}",
+        },
+        headers=BUILD_CORS_HEADERS,
     )
 
 
+@app.get("/build")
+def latest_build_status(x_session_id: str = Header(default="", alias="x-session-id")):
+    """
+    Status of the most recent build job of this session.
+    """
+    job = build_jobs.latest(x_session_id) if x_session_id else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="No build job for this session.")
+    return JSONResponse(content=job.to_dict(), headers=BUILD_CORS_HEADERS)
+
+
+@app.get("/build/{job_id}")
+def build_status(job_id: str, x_session_id: str = Header(default="", alias="x-session-id")):
+    # Job ids are only visible to the session that started them.
+    job = build_jobs.get(job_id, x_session_id) if x_session_id else None
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown build job.")
+    return JSONResponse(content=job.to_dict(), headers=BUILD_CORS_HEADERS)
+
+
 @app.post("/ask", response_model=AskResponse)
 def ask(
     req: AskRequest,
@@ -350,15 +785,21 @@ def ask(
     if not query:
         return AskResponse(query=req.query, answer="Query is empty.", top_sources=[], top_score=0.0)
 
-    # If session provided, use session workspace; else fallback to global
-    if x_session_id:
-        chunks, vecs = load_session_state(x_session_id)
-    else:
-        if not global_chunks or global_vecs is None:
-            return AskResponse(query=query, answer="No index available. Upload docs and build first.", top_sources=[], top_score=0.0)
-        chunks, vecs = global_chunks, global_vecs
-
-    retrieved = top_k_retrieve(query, chunks, vecs, k=req.k)  # type: ignore[arg-type]
+    index = resolve_index(x_session_id)
+    if index is None:
+        return AskResponse(query=query, answer=NO_INDEX_MSG, top_sources=[], top_score=0.0)
+    chunks, vecs, lexical = index
+
+    scope = answer_scope(x_session_id, vecs.fingerprint, req.k)
+    # Exact-match queries (IDs, error codes) are answered from BM25 without an embeddings call.
+    retrieved = lexical_only_retrieve(query, chunks, lexical, k=req.k)
+    query_vec = None
+    if retrieved is None:
+        query_vec = query_embedding(query)
+        hit = answer_cache.lookup(scope, query_vec) if settings.answer_cache else None
+        if hit is not None:
+            return AskResponse(query=query, answer=hit.answer, top_sources=hit.top_sources, top_score=hit.top_score, cached=True)
+        retrieved = top_k_retrieve(query, chunks, vecs, k=req.k, query_vec=query_vec, lexical=lexical)  # type: ignore[arg-type]
     if not retrieved:
         return AskResponse(query=query, answer="I don't know.", top_sources=[], top_score=0.0)
 
@@ -369,16 +810,61 @@ def ask(
     if not answer:
         answer = "ERROR: Empty model response."
 
-    top_score = float(retrieved[0]["score"]) if retrieved else 0.0
-    top_sources = [{"source": f"{r['doc_id']}#{r['chunk_id']}", "score": float(r["score"])} for r in retrieved]
+    top_score, top_sources = summarize_sources(retrieved)
+    remember_answer(scope, query, query_vec, answer, top_sources, top_score)
+
+    metrics = evaluate(query, retrieved, answer=answer, threshold_used=threshold_for(query))
+    metrics["stream"] = False
+    log_metrics(settings.metrics_dir, metrics)
 
     return AskResponse(query=query, answer=answer, top_sources=top_sources, top_score=top_score)
 
+
+@app.post("/ask/stream")
+def ask_stream(
+    req: AskRequest,
+    x_session_id: str = Header(default="", alias="x-session-id"),
+) -> StreamingResponse:
+    """
+    Streaming /ask over Server-Sent Events:
+      event: sources  {"query", "top_sources", "top_score"}   (right after retrieval)
+      event: token    {"text"}                                 (one per model delta)
+      event: done     {"answer_len", "ttft_ms", "total_ms"}
+    """
+    query = req.query.strip()
+    if not query:
+        return stream_message(req.query, "Query is empty.")
+
+    index = resolve_index(x_session_id)
+    if index is None:
+        return stream_message(query, NO_INDEX_MSG)
+    chunks, vecs, lexical = index
+
+    scope = answer_scope(x_session_id, vecs.fingerprint, req.k)
+    retrieved = lexical_only_retrieve(query, chunks, lexical, k=req.k)
+    query_vec = None
+    if retrieved is None:
+        query_vec = query_embedding(query)
+        hit = answer_cache.lookup(scope, query_vec) if settings.answer_cache else None
+        if hit is not None:
+            return stream_message(query, hit.answer, hit.top_sources, hit.top_score, cached=True)
+        retrieved = top_k_retrieve(query, chunks, vecs, k=req.k, query_vec=query_vec, lexical=lexical)  # type: ignore[arg-type]
+    if not retrieved:
+        return stream_message(query, "I don't know.")
+
+    top_score, top_sources = summarize_sources(retrieved)
+    return stream_answer(
+        query,
+        retrieved,
+        build_prompt(query, retrieved),
+        on_answer=lambda answer: remember_answer(scope, query, query_vec, answer, top_sources, top_score),
+    )
+
 @app.get("/status")
 def status(x_session_id: str = Header(default="", alias="x-session-id")):
     sdir = session_dir(x_session_id)
     has_docs = (sdir / "docs").exists() and any((sdir / "docs").iterdir())
-    has_chunks = (sdir / "chunks.json").exists()
+    has_chunks = (sdir / "chunks.bin").exists() or (sdir / "chunks.json").exists()
     has_vecs = (sdir / "vectors.npy").exists()
 
     return {
@@ -400,37 +886,112 @@ def list_files(x_session_id: str = Header(default="", alias="x-session-id")):
             files.append({"name": p.name, "size": p.stat().st_size})
     return {"session_id": x_session_id, "files": files}
 
+
+@app.delete("/files/{name}")
+def delete_file(name: str, x_session_id: str = Header(default="", alias="x-session-id")):
+    """
+    Removes one document. With a manifest this only drops the file's rows from
+    the session index (no re-chunking, no embedding); otherwise the index is
+    discarded and the next /build starts fresh.
+    """
+    sdir = session_dir(x_session_id)
+    path = sdir / "docs" / Path(name).name
+    if not path.is_file():
+        raise HTTPException(status_code=404, detail=f"No such file: {name}")
+
+    # Don't race a running build of this session.
+    with build_jobs.session_lock(x_session_id):
+        old_chunks, old_vectors, entries = read_session_index(sdir)
+        path.unlink()
+        keep = [e for e in entries if e.name != path.name]
+        if entries and keep:
+            chunks, vectors, new_entries = assemble(old_chunks, old_vectors, keep, [])
+            write_session_index(x_session_id, sdir, chunks, vectors, new_entries)
+            return {"status": "ok", "session_id": x_session_id, "deleted": path.name, "chunks": len(chunks)}
+
+        clear_session_index(x_session_id, sdir)
+        return {"status": "ok", "session_id": x_session_id, "deleted": path.name, "chunks": 0}
+
+def chat_messages(session_id: str, context_prompt: str) -> List[Dict[str, str]]:
+    """
+    system + recent history + current user prompt. Trims stored history to MAX_TURNS;
+    only the newest turns within settings.history_token_budget are sent.
+    """
+    history = get_chat(session_id)
+    # keep last turns only
+    history = history[-(MAX_TURNS*2):]
+    SESSION_CHAT[session_id] = history
+
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+    messages += fit_history(history)
+    messages += [{"role": "user", "content": context_prompt}]
+    return messages
+
+
+def remember_turn(session_id: str, query: str, answer: str) -> None:
+    # update memory (store plain query + answer); re-put so the store re-sizes the history
+    SESSION_CHAT[session_id] = get_chat(session_id) + [
+        {"role": "user", "content": query},
+        {"role": "assistant", "content": answer},
+    ]
+
+
 @app.post("/chat", response_model=ChatResponse)
 def chat_endpoint(req: ChatRequest, x_session_id: str = Header(default="", alias="x-session-id")):
     query = req.query.strip()
     if not query:
         return ChatResponse(answer="Query is empty.", top_sources=[], top_score=0.0, history_len=0)
 
+    index = resolve_index(x_session_id)
+    if index is None:
+        return ChatResponse(answer=NO_INDEX_MSG, top_sources=[], top_score=0.0, history_len=len(get_chat(x_session_id)))
+    chunks, vecs, lexical = index
+
     # retrieve
-    retrieved = top_k_retrieve(query, chunks, chunk_vecs, k=req.k)  # global shared index OR session index, your choice
+    retrieved = lexical_only_retrieve(query, chunks, lexical, k=req.k) or top_k_retrieve(
+        query, chunks, vecs, k=req.k, query_vec=query_embedding(query), lexical=lexical  # type: ignore[arg-type]
+    )
     if not retrieved:
         return ChatResponse(answer="I don't know.", top_sources=[], top_score=0.0, history_len=len(get_chat(x_session_id)))
 
-    # build context prompt as before
-    context_prompt = build_prompt(query, retrieved)
+    # build context prompt as before, then add history
+    messages = chat_messages(x_session_id, build_prompt(query, retrieved))
+    answer = chat(messages)
 
-    #  Add history
-    history = get_chat(x_session_id)
-    # keep last turns only
-    history = history[-(MAX_TURNS*2):]
-    SESSION_CHAT[x_session_id] = history
+    remember_turn(x_session_id, query, answer)
 
-    # We’ll send: system + history + current user prompt
-    messages = [{"role": "system", "content": "Follow instructions strictly and cite sources."}]
-    messages += history
-    messages += [{"role": "user", "content": context_prompt}]
+    metrics = evaluate(query, retrieved, answer=answer, threshold_used=threshold_for(query))
+    metrics["stream"] = False
+    log_metrics(settings.metrics_dir, metrics)
 
-    answer = chat(messages)  # you may need chat() to accept messages list (see below)
+    top_score, top_sources = summarize_sources(retrieved)
+    return ChatResponse(answer=answer, top_sources=top_sources, top_score=top_score, history_len=len(get_chat(x_session_id)))
 
-    # update memory (store plain query + answer)
-    SESSION_CHAT[x_session_id].append({"role": "user", "content": query})
-    SESSION_CHAT[x_session_id].append({"role": "assistant", "content": answer})
 
-    top_score = float(retrieved[0]["score"]) if retrieved else 0.0
-    top_sources = [{"source": f"{r['doc_id']}#{r['chunk_id']}", "score": float(r["score"])} for r in retrieved]
+@app.post("/chat/stream")
+def chat_stream_endpoint(req: ChatRequest, x_session_id: str = Header(default="", alias="x-session-id")) -> StreamingResponse:
+    """
+    Streaming /chat; same event protocol as /ask/stream.
+    """
+    query = req.query.strip()
+    if not query:
+        return stream_message(req.query, "Query is empty.")
+
+    index = resolve_index(x_session_id)
+    if index is None:
+        return stream_message(query, NO_INDEX_MSG)
+    chunks, vecs, lexical = index
 
+    retrieved = lexical_only_retrieve(query, chunks, lexical, k=req.k) or top_k_retrieve(
+        query, chunks, vecs, k=req.k, query_vec=query_embedding(query), lexical=lexical  # type: ignore[arg-type]
+    )
+    if not retrieved:
+        return stream_message(query, "I don't know.")
+
+    messages = chat_messages(x_session_id, build_prompt(query, retrieved))
+    return stream_answer(
+        query,
+        retrieved,
+        messages,
+        on_answer=lambda answer: remember_turn(x_session_id, query, answer),
+    )
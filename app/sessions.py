@@ -0,0 +1,178 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Generic, List, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+# Evicted session ids remembered (oldest forgotten first) to tell reloads from first loads.
+EVICTED_TRACKED = 4096
+
+
+def index_nbytes(value: Tuple[Any, ...]) -> int:
+    """
+    Approximate resident size of a (chunks, vectors, *other indexes) session entry:
+    index bytes + chunk text + a rough per-chunk dict overhead.
+    """
+    chunks, *indexes = value
+    indexed = sum(int(getattr(ix, "nbytes", 0)) for ix in indexes)
+    if hasattr(chunks, "nbytes"):  # ChunkStore: texts stay on disk
+        return indexed + chunks.nbytes
+    text = sum(len(c.get("text", "")) + len(c.get("source", "")) + len(str(c.get("doc_id", ""))) for c in chunks)
+    return indexed + text + 240 * len(chunks)
+
+
+def chat_nbytes(history: List[Dict[str, str]]) -> int:
+    return sum(len(m.get("content", "")) + 120 for m in history)
+
+
+class SessionStore(Generic[V]):
+    """
+    Dict-like per-session cache with a byte budget and LRU / idle-TTL eviction.
+
+    On a miss, `loader(session_id)` (if given) rebuilds the entry, e.g. from
+    cache/sessions/<id>, so evicting only costs a reload on the next access.
+    Without a loader a miss raises KeyError. A load that a put() or pop() of
+    the same session overtakes is discarded, so a finished build is never
+    replaced by the older files read before it.
+    """
+
+    def __init__(
+        self,
+        sizeof: Callable[[V], int],
+        max_bytes: int,
+        ttl: float = 0.0,
+        loader: Optional[Callable[[str], V]] = None,
+    ):
+        self.sizeof = sizeof
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.loader = loader
+        self._data: "OrderedDict[str, Tuple[V, int, float]]" = OrderedDict()  # id -> (value, nbytes, last_access)
+        self._evicted: "OrderedDict[str, None]" = OrderedDict()
+        # Loads in flight per session, and the write sequence number of the last
+        # put/pop of a session while one was (entries only live during loads).
+        self._loading: Dict[str, int] = {}
+        self._written: Dict[str, int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.evictions = 0
+        self.loads = 0
+        self.reloads = 0
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._data
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._data)
+
+    def __getitem__(self, session_id: str) -> V:
+        return self.get(session_id)
+
+    def __setitem__(self, session_id: str, value: V) -> None:
+        self.put(session_id, value)
+
+    def get(self, session_id: str) -> V:
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            item = self._data.get(session_id)
+            if item is not None:
+                self._data[session_id] = (item[0], item[1], now)
+                self._data.move_to_end(session_id)
+                return item[0]
+
+        if self.loader is None:
+            raise KeyError(session_id)
+        while True:
+            with self._lock:
+                started = self._seq
+                self._loading[session_id] = self._loading.get(session_id, 0) + 1
+            # Load outside the lock: a slow disk read must not block other sessions.
+            try:
+                value = self.loader(session_id)
+                nbytes = self.sizeof(value)
+            finally:
+                with self._lock:
+                    self._loading[session_id] -= 1
+                    overtaken = self._written.get(session_id, -1) > started
+                    if not self._loading[session_id]:
+                        del self._loading[session_id]
+                        self._written.pop(session_id, None)
+            with self._lock:
+                self.loads += 1
+                if session_id in self._evicted:
+                    del self._evicted[session_id]
+                    self.reloads += 1
+                if not overtaken:
+                    self._store(session_id, value, nbytes, time.monotonic())
+                    return value
+                item = self._data.get(session_id)
+                if item is not None:
+                    return item[0]
+            # Popped while loading (index cleared or rewritten): read the disk again.
+
+    def put(self, session_id: str, value: V) -> None:
+        nbytes = self.sizeof(value)
+        now = time.monotonic()
+        with self._lock:
+            self._wrote(session_id)
+            self._store(session_id, value, nbytes, now)
+
+    def pop(self, session_id: str, default: Optional[V] = None) -> Optional[V]:
+        with self._lock:
+            self._wrote(session_id)
+            item = self._data.pop(session_id, None)
+            self._evicted.pop(session_id, None)
+            if item is None:
+                return default
+            self.bytes -= item[1]
+            return item[0]
+
+    def _wrote(self, session_id: str) -> None:
+        self._seq += 1
+        if session_id in self._loading:
+            self._written[session_id] = self._seq
+
+    def _store(self, session_id: str, value: V, nbytes: int, now: float) -> None:
+        old = self._data.pop(session_id, None)
+        if old is not None:
+            self.bytes -= old[1]
+        self._data[session_id] = (value, nbytes, now)
+        self.bytes += nbytes
+        self._expire(now)
+        # Always keep the entry just stored, even if it alone exceeds the budget.
+        while self.bytes > self.max_bytes and len(self._data) > 1:
+            self._evict(next(iter(self._data)))
+
+    def _expire(self, now: float) -> None:
+        if self.ttl <= 0:
+            return
+        # Oldest access first, so stop at the first entry still within TTL.
+        for session_id, (_, _, last) in list(self._data.items()):
+            if now - last <= self.ttl:
+                break
+            self._evict(session_id)
+
+    def _evict(self, session_id: str) -> None:
+        _, nbytes, _ = self._data.pop(session_id)
+        self.bytes -= nbytes
+        self.evictions += 1
+        self._evicted[session_id] = None
+        self._evicted.move_to_end(session_id)
+        while len(self._evicted) > EVICTED_TRACKED:
+            self._evicted.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._data),
+                "resident_bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "loads": self.loads,
+                "reloads": self.reloads,
+            }
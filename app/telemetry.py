@@ -0,0 +1,362 @@
+import bisect
+import os
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Prometheus text exposition format, version 0.0.4.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SEARCH_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+BUILD_BUCKETS = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _CounterValue:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeValue(_CounterValue):
+    __slots__ = ()
+
+    def set(self, value: float) -> None:
+        self.value = float(value)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.inc(-amount)
+
+
+class _HistogramValue:
+    __slots__ = ("bounds", "counts", "sum", "_lock")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last slot: above the largest bound (+Inf)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+
+class Metric:
+    """
+    A named metric family with fixed label names. labels(*values) returns the
+    child for one label combination (created on first use); metrics without
+    labels are used directly (inc / set / observe on the metric itself).
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Labels, Any] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _new_child(self) -> Any:
+        raise NotImplementedError
+
+    def labels(self, *values: str) -> Any:
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _items(self) -> List[Tuple[Labels, Any]]:
+        with self._lock:
+            return sorted(self._children.items())
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in self._items():
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def _new_child(self) -> _CounterValue:
+        return _CounterValue()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeValue:
+        return _GaugeValue()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram: observe() is one bisect and two adds under a lock.
+    Rendered as cumulative _bucket{le=...}, _sum and _count series.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+        registry: Optional["Registry"] = None,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in self._items():
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, values, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, values)} {cumulative}"
+
+
+class Collected(Metric):
+    """
+    A gauge or counter read at scrape time from fn(): a number, or a dict of
+    label values -> number. For state that already keeps its own counts
+    (cache stats), so the hot path pays nothing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        fn: Callable[[], Union[float, Dict[Labels, float]]],
+        kind: str = "gauge",
+        labelnames: Sequence[str] = (),
+        registry: Optional["Registry"] = None,
+    ):
+        self.kind = kind
+        self.fn = fn
+        super().__init__(name, help, labelnames, registry)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} {self.kind}"
+        value = self.fn()
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for values, v in items:
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(v)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> None:
+        with self._lock:
+            # Re-registering a name replaces it (module reloads, a restarted server in one process).
+            self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:  # a broken collector must not take the whole scrape down
+                lines.append(f"# {metric.name}: collection failed: {type(e).__name__}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+HTTP_REQUESTS = Counter(
+    "rag_http_requests_total", "HTTP requests by route template, method and status.", ("route", "method", "status")
+)
+HTTP_LATENCY = Histogram(
+    "rag_http_request_duration_seconds",
+    "HTTP request latency by route template (streams: until the last byte).",
+    ("route", "method"),
+)
+
+EMBED_LATENCY = Histogram(
+    "rag_embed_request_duration_seconds", "Embeddings API latency per attempt.", ("input_type",)
+)
+EMBED_RETRIES = Counter("rag_embed_retries_total", "Embeddings API attempts retried, by reason.", ("reason",))
+EMBED_ERRORS = Counter("rag_embed_errors_total", "Embeddings calls that failed after retries.", ("reason",))
+
+LLM_LATENCY = Histogram("rag_llm_request_duration_seconds", "Chat completion latency (streams: to the last token).", ("mode",))
+LLM_TTFT = Histogram("rag_llm_time_to_first_token_seconds", "Streamed chat time to first token.", ("mode",))
+LLM_ERRORS = Counter("rag_llm_errors_total", "Chat completion calls that failed.", ("mode",))
+LLM_TOKENS = Counter("rag_llm_tokens_total", "Chat tokens reported by the API.", ("kind",))
+
+PROMPT_TOKENS = Counter("rag_prompt_tokens_estimated_total", "Estimated prompt tokens sent, by part (template, context, history).", ("part",))
+PROMPT_TOKENS_SAVED = Counter(
+    "rag_prompt_tokens_saved_total",
+    "Estimated prompt tokens not sent (overlap removed, token budget), by part.",
+    ("part",),
+)
+
+RETRIEVAL_LATENCY = Histogram(
+    "rag_retrieval_duration_seconds",
+    "Search time (after the query embedding) by mode and corpus size (chunks, upper bound).",
+    ("mode", "corpus"),
+    buckets=SEARCH_BUCKETS,
+)
+
+BUILD_DURATION = Histogram("rag_build_duration_seconds", "Background index build duration.", ("status",), buckets=BUILD_BUCKETS)
+
+_CORPUS_BOUNDS = ((1_000, "1k"), (10_000, "10k"), (100_000, "100k"), (1_000_000, "1M"), (10_000_000, "10M"))
+
+
+def process_rss_bytes() -> Optional[int]:
+    """
+    Current resident set size of this process: Linux /proc, else psutil if
+    installed. None when neither is available (macOS / Windows without psutil).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return int(psutil.Process().memory_info().rss)
+
+
+def process_peak_rss_bytes() -> Optional[int]:
+    """
+    Peak resident set size so far (getrusage; only ever grows). None on Windows.
+    """
+    try:
+        import resource  # Unix only
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _known(fn: Callable[[], Optional[int]]) -> Callable[[], Dict[Labels, float]]:
+    # No sample at all (rather than a misleading 0) where the platform can't tell.
+    return lambda: {(): v} if (v := fn()) is not None else {}
+
+
+Collected("rag_process_resident_bytes", "Current resident memory of the server process.", _known(process_rss_bytes))
+Collected("rag_process_peak_resident_bytes", "Peak resident memory of the server process.", _known(process_peak_rss_bytes))
+
+
+def corpus_size_label(num_chunks: int) -> str:
+    """
+    Decade bucket of a corpus size, so the retrieval histogram stays low-cardinality.
+    """
+    for bound, label in _CORPUS_BOUNDS:
+        if num_chunks <= bound:
+            return label
+    return "+Inf"
+
+
+def observe_retrieval(mode: str, num_chunks: int, seconds: float) -> None:
+    RETRIEVAL_LATENCY.labels(mode, corpus_size_label(num_chunks)).observe(seconds)
+
+
+def observe_chat_usage(usage: Optional[Dict[str, Any]]) -> None:
+    for kind in ("prompt", "completion"):
+        n = (usage or {}).get(f"{kind}_tokens")
+        if isinstance(n, (int, float)) and n > 0:
+            LLM_TOKENS.labels(kind).inc(n)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware counting and timing every HTTP request. Routes are labelled
+    by their template ("/build/{job_id}"), never the raw path, to bound cardinality.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router records the matched route in the (shared) scope.
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUESTS.labels(route, scope["method"], str(status)).inc()
+            HTTP_LATENCY.labels(route, scope["method"]).observe(time.perf_counter() - t0)
@@ -0,0 +1,146 @@
+import functools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+from .config import settings
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Trace:
+    """
+    Per-request timings: stage name -> accumulated milliseconds, plus upstream
+    token usage and the prompt builder's token estimates. Stages that run more
+    than once in a request add up.
+    """
+
+    __slots__ = ("stages", "usage", "prompt", "t0")
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self.usage: Dict[str, int] = {}
+        self.prompt: Dict[str, int] = {}
+        self.t0 = time.perf_counter()
+
+    def add(self, stage: str, ms: float) -> None:
+        self.stages[stage] = self.stages.get(stage, 0.0) + ms
+
+    def add_usage(self, usage: Optional[Dict[str, Any]], prefix: str = "") -> None:
+        for key, value in (usage or {}).items():
+            if isinstance(value, (int, float)):
+                self.usage[prefix + key] = self.usage.get(prefix + key, 0) + int(value)
+
+    def add_prompt(self, counts: Dict[str, int]) -> None:
+        for key, value in counts.items():
+            self.prompt[key] = self.prompt.get(key, 0) + int(value)
+
+    def to_record(self) -> Dict[str, Any]:
+        return {
+            "stages_ms": {k: round(v, 3) for k, v in self.stages.items()},
+            "usage": dict(self.usage),
+            "prompt": dict(self.prompt),
+            "traced_ms": round((time.perf_counter() - self.t0) * 1000, 3),
+        }
+
+
+# The active request's trace. Unset (None) means tracing is off: every span is a no-op
+# costing one ContextVar lookup. Worker threads (bulk embedding, query batcher) don't
+# inherit it, so their time shows up in the caller's span instead.
+_trace: ContextVar[Optional[Trace]] = ContextVar("rag_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+@contextmanager
+def request_trace() -> Iterator[Optional[Trace]]:
+    """
+    Scope of one request (or one agent turn). Yields None when settings.tracing is off.
+    """
+    if not settings.tracing:
+        yield None
+        return
+    trace = Trace()
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def start_trace() -> Optional[Trace]:
+    """
+    Starts a fresh trace in the current context, replacing the previous one, for
+    loops that own their thread (the CLI agent: one trace per turn). None when tracing is off.
+    """
+    trace = Trace() if settings.tracing else None
+    _trace.set(trace)
+    return trace
+
+
+class span:
+    """
+    with span("search"): ...  -- adds the block's wall time to the current trace, if any.
+    """
+
+    __slots__ = ("name", "trace", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self.trace = _trace.get()
+        if self.trace is not None:
+            self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        if self.trace is not None:
+            self.trace.add(self.name, (time.perf_counter() - self.t0) * 1000)
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """
+    Decorator form of span for whole functions.
+    """
+    def decorate(fn: F) -> F:
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            trace = _trace.get()
+            if trace is None:
+                return fn(*args, **kwargs)
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                trace.add(name, (time.perf_counter() - t0) * 1000)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorate
+
+
+def record_usage(usage: Optional[Dict[str, Any]], prefix: str = "") -> None:
+    trace = _trace.get()
+    if trace is not None and usage:
+        trace.add_usage(usage, prefix)
+
+
+class TraceMiddleware:
+    """
+    ASGI middleware giving every HTTP request its own trace. Sync endpoints run
+    in a thread pool with a copy of this context, so their spans land here too.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not settings.tracing:
+            await self.app(scope, receive, send)
+            return
+        with request_trace():
+            await self.app(scope, receive, send)
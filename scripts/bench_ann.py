@@ -0,0 +1,59 @@
+"""
+Recall@k vs. latency of the IVF backend against exact search, on synthetic
+clustered vectors (no API key needed). Use it to pick ivf_nlist / ivf_nprobe.
+
+    python -m scripts.bench_ann --n 200000 --dim 1024 --nprobe 1 4 8 16 32
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.index import VectorIndex
+from app.ivf import IVFIndex, default_nlist
+
+
+def synthetic_corpus(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    # Real embeddings are clustered by topic; uniform noise would make every ANN look bad.
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=0, help="0 = auto (~4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    exact = VectorIndex(synthetic_corpus(args.n, args.dim, clusters=max(16, args.n // 500), rng=rng))
+    queries = exact.vectors[rng.choice(args.n, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(exact, nlist=args.nlist or default_nlist(args.n))
+    build_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    truth = [exact.search(q[None, :], args.k)[1][0] for q in queries]
+    exact_ms = (time.perf_counter() - t0) * 1000 / args.queries
+
+    print(f"N={args.n} D={args.dim} k={args.k} nlist={ivf.nlist} (built in {build_s:.1f}s)")
+    print(f"{'backend':<16}{'recall@k':>10}{'ms/query':>12}{'speedup':>10}")
+    print(f"{'exact':<16}{1.0:>10.3f}{exact_ms:>12.2f}{1.0:>10.1f}")
+
+    for nprobe in args.nprobe:
+        t0 = time.perf_counter()
+        found = [ivf.search(q[None, :], args.k, nprobe=nprobe)[1][0] for q in queries]
+        ms = (time.perf_counter() - t0) * 1000 / args.queries
+        recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+        print(f"{'ivf nprobe=' + str(nprobe):<16}{recall:>10.3f}{ms:>12.2f}{exact_ms / ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Accuracy, latency and resident memory of float16 / int8 vector storage
+(with float32 rescoring) against plain float32, on synthetic clustered vectors.
+
+    python -m scripts.bench_quant --n 200000 --dim 1024 --rescore 4 10
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.index import VectorIndex, load_index, save_index
+from app.quant import QuantizedIndex
+
+
+def synthetic_corpus(n: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((max(16, n // 500), dim), dtype=np.float32)
+    labels = rng.integers(0, len(centers), size=n)
+    return centers[labels] + 0.6 * rng.standard_normal((n, dim), dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rescore", type=int, nargs="+", default=[1, 4, 10])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    tmp = Path(tempfile.mkdtemp())
+    save_index(VectorIndex(synthetic_corpus(args.n, args.dim, rng)), tmp / "v.npy", tmp / "v.json")
+    exact = load_index(tmp / "v.npy", tmp / "v.json")
+    mapped = load_index(tmp / "v.npy", tmp / "v.json", mmap=True)
+
+    queries = exact.vectors[rng.choice(args.n, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+    def run(index):
+        t0 = time.perf_counter()
+        found = [index.search(q[None, :], args.k) for q in queries]
+        return found, (time.perf_counter() - t0) * 1000 / args.queries
+
+    truth, exact_ms = run(exact)
+    print(f"N={args.n} D={args.dim} k={args.k}")
+    print(f"{'storage':<22}{'resident MB':>12}{'recall@k':>10}{'max |dscore|':>14}{'ms/query':>10}")
+    print(f"{'float32':<22}{exact.nbytes / 2**20:>12.1f}{1.0:>10.3f}{0.0:>14.2e}{exact_ms:>10.2f}")
+
+    for mode in ("float16", "int8"):
+        built = QuantizedIndex.build(mapped, mode)
+        for factor in args.rescore:
+            built.rescore_factor = factor
+            found, ms = run(built)
+            recall = np.mean([len(set(f[1][0]) & set(t[1][0])) / args.k for f, t in zip(found, truth)])
+            err = max(float(np.max(np.abs(f[0][0] - t[0][0]))) for f, t in zip(found, truth))
+            label = f"{mode} rescore x{factor}"
+            print(f"{label:<22}{built.nbytes / 2**20:>12.1f}{recall:>10.3f}{err:>14.2e}{ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Retrieval latency on synthetic vectors (no API key needed):
+- per-query scoring: raw vectors (renormalized every query) vs. VectorIndex
+- top-k selection: full argsort vs. argpartition
+- Q queries: one GEMV per query vs. one batched matmul
+
+    python -m scripts.bench_retrieval --n 200000 --dim 1024
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.index import VectorIndex, top_k_indices
+from app.retrieve import cosine_sim_matrix
+
+
+def time_ms(fn, repeats: int) -> float:
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=100_000, help="Number of chunk vectors")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimension")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=64, help="Batch size for the multi-query comparison")
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    raw = rng.standard_normal((args.n, args.dim), dtype=np.float32)
+    query = rng.standard_normal((1, args.dim), dtype=np.float32)
+    index = VectorIndex(raw)
+
+    np.testing.assert_allclose(cosine_sim_matrix(query, raw), cosine_sim_matrix(query, index), atol=1e-4)
+
+    before = time_ms(lambda: cosine_sim_matrix(query, raw), args.repeats)
+    after = time_ms(lambda: cosine_sim_matrix(query, index), args.repeats)
+
+    print(f"N={args.n} D={args.dim}")
+    print(f"raw ndarray (renormalize per query): {before:8.2f} ms/query")
+    print(f"VectorIndex (single GEMV):           {after:8.2f} ms/query")
+    print(f"speedup: {before / after:.1f}x")
+
+    scores = cosine_sim_matrix(query, index)
+    full_sort = time_ms(lambda: np.argsort(scores)[::-1][:args.k], args.repeats)
+    partial = time_ms(lambda: top_k_indices(scores, args.k), args.repeats)
+    print(f"\ntop-{args.k} full argsort:     {full_sort:8.2f} ms/query")
+    print(f"top-{args.k} argpartition:     {partial:8.2f} ms/query")
+
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    looped = time_ms(lambda: [top_k_indices(index.scores(q[None, :]), args.k) for q in queries], 1)
+    batched = time_ms(lambda: top_k_indices(index.scores(queries), args.k), 1)
+    print(f"\n{args.queries} queries, one GEMV each: {looped:8.2f} ms total")
+    print(f"{args.queries} queries, batched matmul: {batched:8.2f} ms total")
+
+
+if __name__ == "__main__":
+    main()
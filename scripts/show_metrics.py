@@ -1,18 +1,21 @@
-import json
-from nvidia_rag.app.config import settings
+from app.config import settings
+from app.metrics_log import METRICS_FILE, aggregate, count_records, iter_records, rotated_files, tail_records
 
 def main():
-    path = settings.metrics_dir / "rag_metrics.jsonl"
-    if not path.exists():
+    path = settings.metrics_dir / METRICS_FILE
+    last = tail_records(settings.metrics_dir, 1)
+    if not last:
         print("No metrics file found yet.")
         return
 
-    lines = path.read_text(encoding="utf-8").splitlines()
-    print(f"Total records: {len(lines)}")
+    print(f"Records in {path.name}: {count_records(path)} (+{len(rotated_files(settings.metrics_dir))} rotated files)")
 
-    last = json.loads(lines[-1])
     print("\nLast record:")
-    for k, v in last.items():
+    for k, v in last[-1].items():
+        print(f"{k}: {v}")
+
+    print("\nAll records:")
+    for k, v in aggregate(iter_records(settings.metrics_dir)).items():
         print(f"{k}: {v}")
 
 if __name__ == "__main__":